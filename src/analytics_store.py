@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Embedded analytical store (DuckDB) for artifacts passed between stages.
+
+Stages used to hand data to each other only through CSVs, so every reader
+re-parsed and re-typed them (and re-merged questions). Now each stage
+saves its frame here as a typed table and, as the last step, exports the
+same CSV it always wrote:
+
+    questions    id, question, surveys, survey_count, primary_survey, question_length
+    comparison   full_comparison.csv        (compare_llm_results.py)
+    resolutions  all_disagreement_resolutions.csv (arbitrate_final.py);
+                 all_relevant_subtopics is a VARCHAR[] here, JSON text in the CSV
+    master       master_dataset.csv         (create_final_outputs.py)
+    cube, cube_facts  coverage cube and its per-question coordinates (coverage_cube.py)
+    results_openai / results_claude  views over results_store.py's Parquet files
+
+Readers ask for only the columns they use and push filters into SQL;
+iter_table() streams a table in fixed-size chunks for exporters.
+Without duckdb installed, read_table() falls back to the exported CSV
+(projection still applies; `where` is skipped, so callers keep their own
+pandas filter and treat `where` as a prefilter).
+
+Usage:
+    python analytics_store.py --tables
+    python analytics_store.py --query "SELECT final_topic, count(*) FROM master GROUP BY 1"
+    python analytics_store.py --export         # Re-export every CSV from the store
+"""
+
+import argparse
+import json
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from typing import Iterator, List
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Configuration
+DB_FILE = Path('../output/pipeline.duckdb')
+RAW_QUESTIONS = Path('../data/raw/PublicSurveyQuestionsMap.csv')
+CHUNK_ROWS = 10000
+
+# Table -> CSV export (the files run_pipeline and analysts expect)
+EXPORTS = {
+    'questions': Path('../output/questions.csv'),
+    'comparison': Path('../output/comparison/full_comparison.csv'),
+    'resolutions': Path('../output/arbitration_final/all_disagreement_resolutions.csv'),
+    'master': Path('../output/final/master_dataset.csv'),
+    'cube': Path('../output/cube/coverage_cube.csv'),
+    'cube_facts': Path('../output/cube/cube_facts.csv'),
+}
+
+# Columns held as JSON text in pandas/CSV but as typed lists in the store
+JSON_LIST_COLUMNS = {
+    'resolutions': ['all_relevant_subtopics'],
+}
+
+RESULTS_VIEWS = {
+    'results_openai': Path('../output/results/results_openai.parquet'),
+    'results_claude': Path('../output/results/results_claude.parquet'),
+}
+
+def available() -> bool:
+    return duckdb is not None
+
+def connect(read_only: bool = False):
+    DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    return duckdb.connect(str(DB_FILE), read_only=read_only)
+
+def has_table(name: str) -> bool:
+    if not available() or not DB_FILE.exists():
+        return False
+    with connect(read_only=True) as con:
+        found = con.execute(
+            "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [name]
+        ).fetchone()[0]
+    return found > 0
+
+def _parse_json_list(value):
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+            return parsed if isinstance(parsed, list) else None
+        except json.JSONDecodeError:
+            return None
+    return None
+
+def save_table(name: str, df: pd.DataFrame, export: bool = True, **csv_kwargs):
+    """
+    Replace table `name` with df and (by default) write its CSV export.
+
+    The CSV is written from df itself, so exports keep the exact format
+    the stage always produced.
+    """
+    if available():
+        stored = df
+        list_columns = [c for c in JSON_LIST_COLUMNS.get(name, []) if c in df.columns]
+        if list_columns:
+            stored = df.assign(**{c: df[c].map(_parse_json_list) for c in list_columns})
+        with connect() as con:
+            con.register('frame', stored)
+            con.execute(f'CREATE OR REPLACE TABLE "{name}" AS SELECT * FROM frame')
+            con.unregister('frame')
+    if export:
+        path = EXPORTS[name]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(path, index=False, **csv_kwargs)
+
+def _lists_to_python(df: pd.DataFrame) -> pd.DataFrame:
+    """DuckDB returns LIST columns as numpy arrays; callers expect lists."""
+    for column in df.columns:
+        if df[column].dtype == object:
+            sample = df[column].dropna()
+            if len(sample) > 0 and isinstance(sample.iloc[0], np.ndarray):
+                df[column] = [v.tolist() if isinstance(v, np.ndarray) else v for v in df[column]]
+    return df
+
+def query(sql: str, params: list = None) -> pd.DataFrame:
+    """Run SQL against the store (duckdb required)."""
+    with connect(read_only=True) as con:
+        return _lists_to_python(con.execute(sql, params or []).df())
+
+def read_table(name: str, columns: List[str] = None, where: str = None, params: list = None) -> pd.DataFrame:
+    """
+    Read `columns` of a table, optionally prefiltered by a SQL `where`.
+
+    Falls back to the CSV export (without the `where`) if duckdb or the
+    table is missing.
+    """
+    if has_table(name):
+        select = ', '.join(f'"{c}"' for c in columns) if columns else '*'
+        sql = f'SELECT {select} FROM "{name}"' + (f' WHERE {where}' if where else '')
+        return query(sql, params)
+    return pd.read_csv(EXPORTS[name], usecols=columns)
+
+def iter_table(name: str, columns: List[str] = None, order_by: str = None,
+               chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Read a table in frames of at most chunk_rows rows (memory bounded by
+    the chunk, not the table). Falls back to chunked reads of the CSV
+    export, in file order (order_by needs the store).
+    """
+    if has_table(name):
+        select = ', '.join(f'"{c}"' for c in columns) if columns else '*'
+        sql = f'SELECT {select} FROM "{name}"' + (f' ORDER BY "{order_by}"' if order_by else '')
+        with connect(read_only=True) as con:
+            cursor = con.execute(sql)
+            names = [d[0] for d in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    return
+                yield _lists_to_python(pd.DataFrame(rows, columns=names))
+    else:
+        yield from pd.read_csv(EXPORTS[name], usecols=columns, chunksize=chunk_rows)
+
+def build_questions(raw_path: Path = RAW_QUESTIONS) -> pd.DataFrame:
+    """One row per raw question (id = row position), with the surveys that ask it."""
+    raw = pd.read_csv(raw_path)
+    survey_columns = [c for c in raw.columns if c != 'Question']
+    asked = raw[survey_columns].notna().to_numpy()
+    names = np.array(survey_columns, dtype=object)
+    surveys = [list(names[row]) for row in asked]
+
+    return pd.DataFrame({
+        'id': np.arange(len(raw)),
+        'question': raw['Question'],
+        'surveys': [','.join(s) for s in surveys],
+        'survey_count': asked.sum(axis=1),
+        'primary_survey': [s[0] if s else 'Unknown' for s in surveys],
+        'question_length': raw['Question'].astype(str).str.len(),
+    })
+
+def ensure_questions():
+    """Build and store the questions table from the raw CSV if it is not there yet."""
+    if not has_table('questions'):
+        save_table('questions', build_questions())
+
+def load_questions(columns: List[str] = None) -> pd.DataFrame:
+    """Questions table (built on first use)."""
+    ensure_questions()
+    return read_table('questions', columns)
+
+def register_results_views():
+    """Expose the results Parquet files as views (results_openai, results_claude)."""
+    if not available():
+        return
+    with connect() as con:
+        for view, path in RESULTS_VIEWS.items():
+            if path.exists():
+                con.execute(f"CREATE OR REPLACE VIEW {view} AS "
+                            f"SELECT * FROM read_parquet('{path.resolve()}')")
+
+def export_all():
+    """Rewrite every CSV export from the store."""
+    for name, path in EXPORTS.items():
+        if not has_table(name):
+            continue
+        df = read_table(name)
+        for column in JSON_LIST_COLUMNS.get(name, []):
+            df[column] = df[column].map(lambda v: json.dumps(v) if isinstance(v, list) else v)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(path, index=False)
+        print(f"  ✓ {name} -> {path} ({len(df):,} rows)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Query or export the pipeline analytical store')
+    parser.add_argument('--tables', action='store_true', help='List tables and row counts')
+    parser.add_argument('--query', metavar='SQL', help='Run an ad-hoc query')
+    parser.add_argument('--export', action='store_true', help='Re-export all CSVs from the store')
+    args = parser.parse_args()
+
+    if not available():
+        print("duckdb is not installed; stages fall back to CSV hand-off.")
+        return
+
+    if args.tables:
+        with connect(read_only=True) as con:
+            for (name,) in con.execute("SELECT table_name FROM information_schema.tables ORDER BY 1").fetchall():
+                count = con.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+                print(f"  {name:<20} {count:>10,} rows")
+    if args.query:
+        with pd.option_context('display.max_rows', 100, 'display.width', 200):
+            print(query(args.query))
+    if args.export:
+        export_all()
+
+if __name__ == '__main__':
+    main()
@@ -8,26 +8,17 @@ Investigates:
 3. Candidates for arbitration
 """
 
-import json
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import matplotlib.pyplot as plt
 import seaborn as sns
+from results_store import load_merged
 
 # Configuration
-RESULTS_DIR = Path('../output/results')
 OUTPUT_DIR = Path('../output/analysis')
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def load_results(model: str) -> pd.DataFrame:
-    """Load results from JSONL file."""
-    results = []
-    with open(RESULTS_DIR / f'results_{model}.jsonl', 'r') as f:
-        for line in f:
-            results.append(json.loads(line))
-    return pd.DataFrame(results)
-
 def load_questions() -> pd.DataFrame:
     """Load original questions."""
     df = pd.read_csv('../data/raw/PublicSurveyQuestionsMap.csv')
@@ -54,12 +45,10 @@ def main():
     
     # Load data
     print("\n1. Loading data...")
-    openai_df = load_results('openai')
-    claude_df = load_results('claude')
     questions_df = load_questions()
     
-    # Merge all
-    merged = openai_df.merge(claude_df, on='id', suffixes=('_openai', '_claude'))
+    # Merge all (reasoning text is never used here, so it is not read)
+    merged = load_merged(['id', 'primary_topic', 'primary_subtopic', 'confidence', 'secondary_concepts'])
     merged = merged.merge(questions_df, on='id')
     
     print(f"   Total questions: {len(merged)}")
@@ -157,7 +146,7 @@ def main():
         # Show top patterns
         print("\nTop disagreement patterns in candidates:")
         patterns = arbitration_candidates.groupby(
-            ['primary_topic_openai', 'primary_topic_claude']
+            ['primary_topic_openai', 'primary_topic_claude'], observed=True
         ).size().sort_values(ascending=False).head(10)
         
         for (openai_topic, claude_topic), count in patterns.items():
@@ -5,8 +5,7 @@ Simple smoke test for API connectivity.
 
 import os
 from dotenv import load_dotenv
-import anthropic
-from openai import OpenAI
+from llm_providers import complete
 
 load_dotenv()
 
@@ -23,15 +22,10 @@ try:
     else:
         print(f"  ✓ Key found: {openai_key[:10]}...")
         
-        client = OpenAI(api_key=openai_key)
-        response = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[{"role": "user", "content": "What is 2+2? Answer with just the number."}],
-            max_completion_tokens=50
-        )
+        reply = complete("What is 2+2? Answer with just the number.", model_role='categorize_openai',
+                         max_tokens=50)
         
-        result = response.choices[0].message.content
-        print(f"  ✓ Response: {result}")
+        print(f"  ✓ Response ({reply['model']}, {reply['latency']:.1f}s): {reply['text']}")
         print(f"  ✓ OpenAI API working!")
         
 except Exception as e:
@@ -46,15 +40,10 @@ try:
     else:
         print(f"  ✓ Key found: {claude_key[:10]}...")
         
-        client = anthropic.Anthropic(api_key=claude_key)
-        response = client.messages.create(
-            model="claude-haiku-4-5",
-            max_tokens=50,
-            messages=[{"role": "user", "content": "What is 2+2? Answer with just the number."}]
-        )
+        reply = complete("What is 2+2? Answer with just the number.", model_role='categorize_claude',
+                         max_tokens=50)
         
-        result = response.content[0].text
-        print(f"  ✓ Response: {result}")
+        print(f"  ✓ Response ({reply['model']}, {reply['latency']:.1f}s): {reply['text']}")
         print(f"  ✓ Claude API working!")
         
 except Exception as e:
@@ -16,10 +16,10 @@ import numpy as np
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
 from dotenv import load_dotenv
-import anthropic
-from openai import OpenAI
 from tqdm import tqdm
 import time
+from llm_providers import complete
+from taxonomy import load_taxonomy
 
 load_dotenv()
 
@@ -31,58 +31,41 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 MAX_ROUNDS = 3
 BATCH_SIZE = 5  # Smaller batches since we're doing multiple rounds
 
+DECISIONS = ['pick_gpt5mini', 'pick_haiku45', 'combine', 'new_concept']
+
+# Expected replies (parsed and checked by llm_providers.complete)
+DECISION_SCHEMA = {  # Rounds 1 and 3
+    'type': 'object',
+    'required': ['decision', 'final_topic', 'final_subtopic', 'reasoning'],
+    'properties': {
+        'decision': {'type': 'string', 'enum': DECISIONS},
+        'final_topic': {'type': 'string', 'examples': ['Economic']},
+        'final_subtopic': {'type': 'string', 'examples': ['Income']},
+        'additional_concepts': {'type': 'array'},
+        'reasoning': {'type': 'string'},
+        'changed_from_round1': {'type': 'boolean'},
+        'confidence': {'type': 'number'}
+    }
+}
+
+REVIEW_SCHEMA = {  # Round 2
+    'type': 'object',
+    'required': ['agrees', 'feedback'],
+    'properties': {
+        'agrees': {'type': 'boolean'},
+        'feedback': {'type': 'string'},
+        'suggested_decision': {'type': 'string', 'enum': DECISIONS},
+        'suggested_topic': {'type': 'string', 'examples': ['Economic']},
+        'suggested_subtopic': {'type': 'string', 'examples': ['Income']},
+        'reasoning': {'type': 'string'},
+        'confidence': {'type': 'number'}
+    }
+}
+
 def load_arbitration_candidates() -> pd.DataFrame:
     """Load candidates that need arbitration."""
     return pd.read_csv(ANALYSIS_DIR / 'arbitration_candidates.csv')
 
-def load_taxonomy() -> Dict[str, List[str]]:
-    """Load Census taxonomy."""
-    taxonomy_path = Path('../data/raw/census_survey_explorer_taxonomy.json')
-    with open(taxonomy_path, 'r') as f:
-        data = json.load(f)
-    return data['taxonomy']
-
-def extract_json_robust(content: str) -> dict:
-    """Robustly extract JSON from LLM response."""
-    
-    # Strategy 1: Direct parse
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        pass
-    
-    # Strategy 2: Strip markdown
-    if '```json' in content:
-        content = content.split('```json')[1]
-    if '```' in content:
-        content = content.split('```')[0]
-    content = content.strip()
-    
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        pass
-    
-    # Strategy 3: Find first complete JSON object
-    try:
-        start = content.find('{')
-        if start == -1:
-            raise ValueError("No JSON object found")
-        
-        brace_count = 0
-        for i, char in enumerate(content[start:], start):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    json_str = content[start:i+1]
-                    return json.loads(json_str)
-        
-        raise ValueError("No complete JSON object found")
-    except (ValueError, json.JSONDecodeError) as e:
-        raise ValueError(f"Could not extract valid JSON: {e}")
-
 def create_round1_prompt(row: pd.Series, taxonomy: Dict[str, List[str]]) -> str:
     """Round 1: Sonnet's initial arbitration."""
     
@@ -213,20 +196,11 @@ This is your FINAL decision. Use ONLY taxonomy concepts.
     return prompt
 
 def call_sonnet(prompt: str, max_retries: int = 5) -> Dict[str, Any]:
-    """Call claude-sonnet-4-5."""
-    client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-    
+    """Call the arbitrator (claude-sonnet-4-5)."""
     for attempt in range(max_retries):
         try:
-            response = client.messages.create(
-                model="claude-sonnet-4-5",
-                max_tokens=2048,
-                temperature=0,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            content = response.content[0].text
-            return extract_json_robust(content)
+            reply = complete(prompt, schema=DECISION_SCHEMA, model_role='arbitrator', max_tokens=2048)
+            return reply['parsed']
             
         except Exception as e:
             if attempt < max_retries - 1:
@@ -236,21 +210,12 @@ def call_sonnet(prompt: str, max_retries: int = 5) -> Dict[str, Any]:
                 raise e
 
 def call_gpt52(prompt: str, max_retries: int = 5) -> Dict[str, Any]:
-    """Call gpt-5.2."""
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    
+    """Call the reviewer (gpt-5.2)."""
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                model="gpt-5.2",
-                messages=[
-                    {"role": "system", "content": "You are a quality control validator for data categorization."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            content = response.choices[0].message.content
-            return extract_json_robust(content)
+            reply = complete(prompt, schema=REVIEW_SCHEMA, model_role='qc',
+                             system="You are a quality control validator for data categorization.")
+            return reply['parsed']
             
         except Exception as e:
             if attempt < max_retries - 1:
@@ -402,5 +367,4 @@ def main():
     print(f"\nResults: {OUTPUT_DIR}")
 
 if __name__ == '__main__':
-    import os
     main()
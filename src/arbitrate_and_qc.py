@@ -7,10 +7,15 @@ Phase 1: Arbitration (234 disagreements)
 - Track decision method
 - Generate reconciled dataset
 
-Phase 2: QC Validation (10% random sample)
-- Send same questions to gpt-5-2
-- Compare decisions
+Phase 2: QC Validation (stratified, sequential sample)
+- Starts on questions as soon as their arbitration is done
+- Stratify by arbitrator decision x confidence tier
+- Send sampled questions to gpt-5-2 in rounds
+- Stop once the agreement confidence interval is narrow enough
 - Validate arbitration quality
+
+Both phases share one bounded executor: every question is its own API call
+with its own retries, so a failing question never stalls its neighbours.
 """
 
 import json
@@ -19,10 +24,13 @@ import numpy as np
 from pathlib import Path
 from typing import List, Dict, Any
 from dotenv import load_dotenv
-import anthropic
-from openai import OpenAI
 from tqdm import tqdm
-import time
+from concurrent.futures import as_completed
+from retrying_executor import RetryingExecutor
+from llm_providers import complete
+from taxonomy import load_taxonomy
+from llm_telemetry import current_run_id, session_calls, summarize_calls
+from sequential_qc import EarlySampler, build_strata, run_sequential_qc
 
 load_dotenv()
 
@@ -31,20 +39,45 @@ ANALYSIS_DIR = Path('../output/analysis')
 OUTPUT_DIR = Path('../output/arbitration')
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-BATCH_SIZE = 10
-QC_SAMPLE_RATE = 0.10  # 10% for QC validation
+BATCH_SIZE = 10             # Progress checkpoint interval (results saved every N)
+MAX_IN_FLIGHT = 8           # Concurrent API calls shared by arbitration and QC
+MAX_RETRIES = 5
+QC_TARGET_CI_WIDTH = 0.10   # Stop QC once the 95% CI on agreement is <= 10 points wide
+QC_CONFIDENCE = 0.95
+QC_INITIAL_RATE = 0.05      # First QC round validates 5% of arbitrated questions
+QC_MAX_RATE = 0.30          # Escalation never validates more than 30%
+
+DECISIONS = ['pick_gpt5mini', 'pick_haiku45', 'combine', 'new_concept']
+
+# Expected replies (parsed and checked by llm_providers.complete)
+ARBITRATION_SCHEMA = {
+    'type': 'object',
+    'required': ['decision', 'final_primary_topic', 'final_primary_subtopic', 'reasoning'],
+    'properties': {
+        'decision': {'type': 'string', 'enum': DECISIONS},
+        'final_primary_topic': {'type': 'string', 'examples': ['Economic']},
+        'final_primary_subtopic': {'type': 'string', 'examples': ['Income']},
+        'additional_concepts': {'type': 'array'},
+        'reasoning': {'type': 'string'}
+    }
+}
+
+QC_SCHEMA = {
+    'type': 'object',
+    'required': ['agrees_with_arbitrator', 'your_choice', 'your_topic', 'your_subtopic'],
+    'properties': {
+        'agrees_with_arbitrator': {'type': 'boolean'},
+        'your_choice': {'type': 'string', 'enum': DECISIONS},
+        'your_topic': {'type': 'string', 'examples': ['Economic']},
+        'your_subtopic': {'type': 'string', 'examples': ['Income']},
+        'reasoning': {'type': 'string'}
+    }
+}
 
 def load_arbitration_candidates() -> pd.DataFrame:
     """Load candidates that need arbitration."""
     return pd.read_csv(ANALYSIS_DIR / 'arbitration_candidates.csv')
 
-def load_taxonomy() -> Dict[str, List[str]]:
-    """Load Census taxonomy."""
-    taxonomy_path = Path('../data/raw/census_survey_explorer_taxonomy.json')
-    with open(taxonomy_path, 'r') as f:
-        data = json.load(f)
-    return data['taxonomy']
-
 def create_arbitration_prompt(row: pd.Series, taxonomy: Dict[str, List[str]]) -> str:
     """Create prompt for arbitrator."""
     
@@ -92,113 +125,26 @@ If decision is "new_concept", provide your own categorization in final_primary_t
     
     return prompt
 
-def extract_json_robust(content: str) -> dict:
-    """Robustly extract JSON from LLM response with multiple strategies."""
-    
-    # Strategy 1: Direct parse
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        pass
+def arbitrate_row(row: pd.Series, taxonomy: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Send one question to the arbitrator (claude-sonnet-4-5); raises on failure."""
+    prompt = create_arbitration_prompt(row, taxonomy)
     
-    # Strategy 2: Strip markdown
-    if '```json' in content:
-        content = content.split('```json')[1]
-    if '```' in content:
-        content = content.split('```')[0]
-    content = content.strip()
+    reply = complete(prompt, schema=ARBITRATION_SCHEMA, model_role='arbitrator', max_tokens=2048)
     
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        pass
+    result = reply['parsed']
+    result['id'] = row['id']
+    result['original_openai_topic'] = row['primary_topic_openai']
+    result['original_openai_subtopic'] = row['primary_subtopic_openai']
+    result['original_claude_topic'] = row['primary_topic_claude']
+    result['original_claude_subtopic'] = row['primary_subtopic_claude']
     
-    # Strategy 3: Find first complete JSON object
-    try:
-        # Find opening brace
-        start = content.find('{')
-        if start == -1:
-            raise ValueError("No JSON object found")
-        
-        # Count braces to find matching close
-        brace_count = 0
-        for i, char in enumerate(content[start:], start):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    # Found complete object
-                    json_str = content[start:i+1]
-                    return json.loads(json_str)
-        
-        raise ValueError("No complete JSON object found")
-    except (ValueError, json.JSONDecodeError) as e:
-        raise ValueError(f"Could not extract valid JSON: {e}")
+    return result
 
-def arbitrate_batch(batch: pd.DataFrame, taxonomy: Dict[str, List[str]], 
-                   max_retries: int = 5) -> List[Dict[str, Any]]:
-    """Send batch to claude-sonnet-4-5 for arbitration."""
-    
-    client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-    results = []
+def qc_validate_row(row: pd.Series, arbitration: Dict[str, Any],
+                    taxonomy: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Send one arbitrated question to the QC validator (gpt-5-2); raises on failure."""
     
-    for idx, row in batch.iterrows():
-        prompt = create_arbitration_prompt(row, taxonomy)
-        
-        for attempt in range(max_retries):
-            try:
-                response = client.messages.create(
-                    model="claude-sonnet-4-5",
-                    max_tokens=2048,
-                    temperature=0,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                
-                content = response.content[0].text
-                
-                # Use robust JSON extraction
-                result = extract_json_robust(content)
-                result['id'] = row['id']
-                result['original_openai_topic'] = row['primary_topic_openai']
-                result['original_openai_subtopic'] = row['primary_subtopic_openai']
-                result['original_claude_topic'] = row['primary_topic_claude']
-                result['original_claude_subtopic'] = row['primary_subtopic_claude']
-                
-                results.append(result)
-                break
-                
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"  Error on question {row['id']}: {e}. Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"  Failed question {row['id']} after {max_retries} attempts")
-                    results.append({
-                        'id': row['id'],
-                        'decision': 'failed',
-                        'error': str(e)
-                    })
-    
-    return results
-
-def qc_validate_batch(batch: pd.DataFrame, arbitration_results: pd.DataFrame,
-                     taxonomy: Dict[str, List[str]], max_retries: int = 5) -> List[Dict[str, Any]]:
-    """Send batch to gpt-5-2 for QC validation."""
-    
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    results = []
-    
-    # Merge to get arbitration decisions
-    batch_with_arb = batch.merge(
-        arbitration_results[['id', 'decision', 'final_primary_topic', 'final_primary_subtopic', 'reasoning']], 
-        on='id'
-    )
-    
-    for idx, row in batch_with_arb.iterrows():
-        # Create QC prompt
-        prompt = f"""You are validating an arbitration decision for a federal survey question categorization.
+    prompt = f"""You are validating an arbitration decision for a federal survey question categorization.
 
 TAXONOMY:
 {json.dumps(taxonomy, indent=2)}
@@ -211,9 +157,9 @@ ORIGINAL CATEGORIZATIONS:
 2. claude-haiku-4-5: {row['primary_topic_claude']} / {row['primary_subtopic_claude']} (confidence: {row['confidence_claude']:.2f})
 
 ARBITRATOR DECISION (claude-sonnet-4-5):
-- Decision: {row['decision']}
-- Final: {row['final_primary_topic']} / {row['final_primary_subtopic']}
-- Reasoning: {row['reasoning']}
+- Decision: {arbitration['decision']}
+- Final: {arbitration['final_primary_topic']} / {arbitration['final_primary_subtopic']}
+- Reasoning: {arbitration['reasoning']}
 
 YOUR TASK:
 Evaluate if the arbitrator's decision is correct. What would you have chosen?
@@ -227,43 +173,17 @@ Return JSON:
   "reasoning": "Why you agree/disagree (1-2 sentences)"
 }}
 """
-        
-        for attempt in range(max_retries):
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-5.2",
-                    messages=[
-                        {"role": "system", "content": "You are a quality control validator for data categorization."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                
-                content = response.choices[0].message.content
-                
-                # Use robust JSON extraction
-                result = extract_json_robust(content)
-                result['id'] = row['id']
-                result['arbitrator_decision'] = row['decision']
-                result['arbitrator_topic'] = row['final_primary_topic']
-                result['arbitrator_subtopic'] = row['final_primary_subtopic']
-                
-                results.append(result)
-                break
-                
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"  QC Error on question {row['id']}: {e}. Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"  QC Failed question {row['id']} after {max_retries} attempts")
-                    results.append({
-                        'id': row['id'],
-                        'qc_failed': True,
-                        'error': str(e)
-                    })
     
-    return results
+    reply = complete(prompt, schema=QC_SCHEMA, model_role='qc',
+                     system="You are a quality control validator for data categorization.")
+    
+    result = reply['parsed']
+    result['id'] = row['id']
+    result['arbitrator_decision'] = arbitration['decision']
+    result['arbitrator_topic'] = arbitration['final_primary_topic']
+    result['arbitrator_subtopic'] = arbitration['final_primary_subtopic']
+    
+    return result
 
 def main():
     print("="*70)
@@ -276,71 +196,111 @@ def main():
     taxonomy = load_taxonomy()
     print(f"   Candidates for arbitration: {len(candidates)}")
     
-    # === PHASE 1: ARBITRATION ===
-    print("\n" + "="*70)
-    print("PHASE 1: ARBITRATION (claude-sonnet-4-5)")
-    print("="*70)
-    
-    arbitration_results = []
+    early_sampler = EarlySampler(QC_INITIAL_RATE)
     
-    print(f"\nProcessing {len(candidates)} questions in batches of {BATCH_SIZE}...")
-    for i in tqdm(range(0, len(candidates), BATCH_SIZE), desc="Arbitrating"):
-        batch = candidates.iloc[i:i+BATCH_SIZE]
-        results = arbitrate_batch(batch, taxonomy)
-        arbitration_results.extend(results)
+    # One executor for both phases: arbitration and QC share the in-flight budget
+    with RetryingExecutor(max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES) as executor:
         
-        # Save incremental results
-        pd.DataFrame(arbitration_results).to_csv(
-            OUTPUT_DIR / 'arbitration_results.csv', 
-            index=False
-        )
-    
-    arb_df = pd.DataFrame(arbitration_results)
-    print(f"\nArbitration complete! {len(arb_df)} decisions made.")
-    
-    # Decision breakdown
-    print("\nDecision breakdown:")
-    decision_counts = arb_df['decision'].value_counts()
-    for decision, count in decision_counts.items():
-        print(f"  {decision}: {count} ({count/len(arb_df)*100:.1f}%)")
-    
-    # === PHASE 2: QC VALIDATION ===
-    print("\n" + "="*70)
-    print("PHASE 2: QC VALIDATION (gpt-5-2)")
-    print("="*70)
-    
-    # Random sample for QC
-    qc_sample_size = int(len(candidates) * QC_SAMPLE_RATE)
-    qc_sample = candidates.sample(n=qc_sample_size, random_state=42)
-    print(f"\nQC sample: {len(qc_sample)} questions ({QC_SAMPLE_RATE*100:.0f}%)")
-    
-    qc_results = []
-    
-    print(f"\nProcessing QC validation...")
-    for i in tqdm(range(0, len(qc_sample), BATCH_SIZE), desc="QC Validating"):
-        batch = qc_sample.iloc[i:i+BATCH_SIZE]
-        results = qc_validate_batch(batch, arb_df, taxonomy)
-        qc_results.extend(results)
+        # === PHASE 1: ARBITRATION ===
+        print("\n" + "="*70)
+        print("PHASE 1: ARBITRATION (claude-sonnet-4-5)")
+        print("="*70)
+        
+        arbitration_results = []
+        early_qc = {}  # id -> QC future started before phase 1 finished
+        
+        print(f"\nProcessing {len(candidates)} questions ({MAX_IN_FLIGHT} in flight)...")
+        future_to_row = {
+            executor.submit(arbitrate_row, row, taxonomy,
+                            description=f"question {row['id']}"): row
+            for _, row in candidates.iterrows()
+        }
         
-        # Save incremental results
-        pd.DataFrame(qc_results).to_csv(
-            OUTPUT_DIR / 'qc_validation_results.csv',
-            index=False
+        for future in tqdm(as_completed(future_to_row), total=len(future_to_row), desc="Arbitrating"):
+            row = future_to_row[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'id': row['id'], 'decision': 'failed', 'error': str(e)}
+            arbitration_results.append(result)
+            
+            # Start QC on a first-round share of each stratum as soon as its questions are arbitrated
+            stratum = build_strata(pd.Series([result['decision']]), pd.Series([row['min_confidence']])).iloc[0]
+            if result['decision'] != 'failed' and early_sampler.pick(stratum):
+                early_qc[row['id']] = executor.submit(
+                    qc_validate_row, row, result, taxonomy,
+                    description=f"QC question {row['id']}"
+                )
+            
+            # Save incremental results
+            if len(arbitration_results) % BATCH_SIZE == 0:
+                pd.DataFrame(arbitration_results).to_csv(
+                    OUTPUT_DIR / 'arbitration_results.csv', 
+                    index=False
+                )
+        
+        arb_df = pd.DataFrame(arbitration_results)
+        arb_df.to_csv(OUTPUT_DIR / 'arbitration_results.csv', index=False)
+        print(f"\nArbitration complete! {len(arb_df)} decisions made.")
+        
+        # Decision breakdown
+        print("\nDecision breakdown:")
+        decision_counts = arb_df['decision'].value_counts()
+        for decision, count in decision_counts.items():
+            print(f"  {decision}: {count} ({count/len(arb_df)*100:.1f}%)")
+        
+        # === PHASE 2: QC VALIDATION ===
+        print("\n" + "="*70)
+        print("PHASE 2: QC VALIDATION (gpt-5-2)")
+        print("="*70)
+        
+        # Only successfully arbitrated questions can be validated
+        arb_by_id = {r['id']: r for r in arbitration_results if r['decision'] != 'failed'}
+        qc_population = candidates[candidates['id'].isin(arb_by_id)]
+        decisions = qc_population['id'].map(lambda qid: arb_by_id[qid]['decision'])
+        strata = build_strata(decisions, qc_population['min_confidence'])
+        
+        print(f"\nQC population: {len(qc_population)} arbitrated questions in {strata.nunique()} strata")
+        print(f"Already validating during phase 1: {len(early_qc)}")
+        print(f"Target: {QC_CONFIDENCE*100:.0f}% CI width <= {QC_TARGET_CI_WIDTH*100:.0f} points "
+              f"(start {QC_INITIAL_RATE*100:.0f}%, cap {QC_MAX_RATE*100:.0f}%)")
+        
+        print(f"\nProcessing QC validation...")
+        qc_df, qc_summary = run_sequential_qc(
+            qc_population,
+            strata,
+            lambda row: qc_validate_row(row, arb_by_id[row['id']], taxonomy),
+            executor,
+            prevalidated=early_qc,
+            target_width=QC_TARGET_CI_WIDTH,
+            confidence=QC_CONFIDENCE,
+            initial_rate=QC_INITIAL_RATE,
+            max_rate=QC_MAX_RATE
         )
     
-    qc_df = pd.DataFrame(qc_results)
-    print(f"\nQC validation complete! {len(qc_df)} questions validated.")
+    qc_df.to_csv(OUTPUT_DIR / 'qc_validation_results.csv', index=False)
+    qc_summary['strata'].to_csv(OUTPUT_DIR / 'qc_strata_summary.csv', index=False)
+    qc_summary['rounds'].to_csv(OUTPUT_DIR / 'qc_rounds.csv', index=False)
+    print(f"\nQC validation complete! {len(qc_df)} questions validated "
+          f"in {len(qc_summary['rounds'])} rounds ({qc_summary['stop_reason']}).")
     
     # QC analysis
     print("\n" + "="*70)
     print("QC VALIDATION RESULTS")
     print("="*70)
     
-    agreement_rate = qc_df['agrees_with_arbitrator'].sum() / len(qc_df) * 100
-    print(f"\nAgreement with arbitrator: {agreement_rate:.1f}%")
+    agreement_rate = qc_summary['estimate'] * 100
+    print(f"\nAgreement with arbitrator (stratified): {agreement_rate:.1f}% "
+          f"[{qc_summary['ci_low']*100:.1f}, {qc_summary['ci_high']*100:.1f}] "
+          f"at {qc_summary['confidence']*100:.0f}% confidence")
+    
+    print("\nAgreement by stratum (decision | confidence tier):")
+    for _, row in qc_summary['strata'].iterrows():
+        if row['n'] > 0:
+            print(f"  {row['qc_stratum']}: {row['agree']}/{row['n']} of {row['N']}")
     
     print("\ngpt-5-2 choices (when disagreeing):")
-    disagreements = qc_df[~qc_df['agrees_with_arbitrator']]
+    disagreements = qc_df[qc_df['agrees_with_arbitrator'].eq(False)]
     if len(disagreements) > 0:
         choice_counts = disagreements['your_choice'].value_counts()
         for choice, count in choice_counts.items():
@@ -352,11 +312,20 @@ def main():
     print(f"\nResults saved to: {OUTPUT_DIR}")
     print(f"  - arbitration_results.csv ({len(arb_df)} decisions)")
     print(f"  - qc_validation_results.csv ({len(qc_df)} validations)")
+    print(f"  - qc_strata_summary.csv, qc_rounds.csv")
     print(f"\nKey metrics:")
     print(f"  - Arbitration decisions made: {len(arb_df)}")
     print(f"  - QC agreement rate: {agreement_rate:.1f}%")
-    print(f"  - Cost estimate: ${(len(candidates)/10)*0.05 + (len(qc_sample)/10)*0.15:.2f}")
+    
+    # Actual spend from per-call telemetry (this process's calls in the current pipeline run)
+    spend = summarize_calls(session_calls(), by=['model_role'], run_id=current_run_id())
+    if len(spend) > 0:
+        print(f"  - Cost: ${spend['cost_usd'].sum():.2f} "
+              f"({spend['input_tokens'].sum():,} input / {spend['output_tokens'].sum():,} output tokens, "
+              f"{spend['retries'].sum()} retries)")
+        for _, row in spend.iterrows():
+            print(f"      {row['model_role']}: {row['calls']} calls, ${row['cost_usd']:.2f}, "
+                  f"p95 latency {row['p95_latency_s']:.1f}s")
 
 if __name__ == '__main__':
-    import os
     main()
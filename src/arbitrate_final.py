@@ -23,10 +23,14 @@ import numpy as np
 from pathlib import Path
 from typing import List, Dict, Any
 from dotenv import load_dotenv
-import anthropic
-from openai import OpenAI
 from tqdm import tqdm
 import time
+from llm_providers import complete
+from taxonomy import Taxonomy, load_taxonomy
+from disagreement_resolution import (
+    find_disagreements, resolve_auto_dual_modal, to_resolution_frame, combine_resolutions
+)
+import analytics_store
 
 load_dotenv()
 
@@ -40,106 +44,62 @@ CONFIDENCE_THRESHOLD = 0.90
 MAX_ROUNDS = 3
 BATCH_SIZE = 5
 MAX_WORKERS = 3  # Parallel arbitration workers
+RESULT_PACING = 0.2  # Seconds paused per collected result (rate-limit courtesy)
 
-def load_taxonomy() -> Dict[str, List[str]]:
-    """Load Census taxonomy."""
-    taxonomy_path = Path('../data/raw/census_survey_explorer_taxonomy.json')
-    with open(taxonomy_path, 'r') as f:
-        data = json.load(f)
-    return data['taxonomy']
+# Expected arbitrator reply (parsed and checked by llm_providers.complete)
+ARBITRATION_SCHEMA = {
+    'type': 'object',
+    'required': ['decision', 'primary_topic', 'primary_subtopic', 'primary_confidence', 'reasoning'],
+    'properties': {
+        'decision': {'type': 'string', 'enum': ['pick_gpt5mini', 'pick_haiku45', 'dual_modal', 'new_concept']},
+        'primary_topic': {'type': 'string', 'examples': ['Economic']},
+        'primary_subtopic': {'type': 'string', 'examples': ['Income']},
+        'primary_confidence': {'type': 'number'},
+        'secondary_primary_topic': {'type': 'string', 'examples': ['Economic']},
+        'secondary_primary_subtopic': {'type': 'string', 'examples': ['Employment Status']},
+        'secondary_primary_confidence': {'type': 'number'},
+        'all_relevant_subtopics': {'type': 'array', 'items': {'type': 'string', 'examples': ['Economic.Income']}},
+        'reasoning': {'type': 'string'},
+        'is_dual_modal': {'type': 'boolean'}
+    }
+}
+
+# Comparison columns arbitration uses (prompt + resolution rows)
+COMPARISON_COLUMNS = [
+    'id',
+    'primary_topic_openai', 'primary_subtopic_openai', 'confidence_openai',
+    'primary_topic_claude', 'primary_subtopic_claude', 'confidence_claude',
+]
+
+# Same rows as ~agreement_mask: a NULL on either side counts as disagreement
+DISAGREEMENT_SQL = """NOT coalesce(
+    c.primary_topic_openai = c.primary_topic_claude AND c.primary_subtopic_openai = c.primary_subtopic_claude,
+    false)"""
 
 def load_questions() -> pd.DataFrame:
-    """Load original questions."""
-    df = pd.read_csv('../data/raw/PublicSurveyQuestionsMap.csv')
-    
-    questions = []
-    for idx, row in df.iterrows():
-        question = row['Question']
-        surveys = [col for col in df.columns if col != 'Question' and pd.notna(row[col])]
-        
-        questions.append({
-            'id': idx,
-            'question': question,
-            'primary_survey': surveys[0] if surveys else 'Unknown'
-        })
-    
-    return pd.DataFrame(questions)
+    """Load original questions (id, question, primary_survey)."""
+    return analytics_store.load_questions(['id', 'question', 'primary_survey'])
 
 def load_disagreements() -> pd.DataFrame:
     """Load comparison results and identify disagreements."""
-    comp_df = pd.read_csv(COMPARISON_DIR / 'full_comparison.csv')
-    
-    # Load original questions to get question text
-    questions_df = load_questions()
-    comp_df = comp_df.merge(questions_df[['id', 'question', 'primary_survey']], on='id', how='left')
-    
-    # Find disagreements (topic OR subtopic)
-    disagreements = comp_df[
-        (comp_df['primary_topic_openai'] != comp_df['primary_topic_claude']) |
-        (comp_df['primary_subtopic_openai'] != comp_df['primary_subtopic_claude'])
-    ].copy()
-    
-    # Calculate min confidence and tier
-    disagreements['min_confidence'] = disagreements[
-        ['confidence_openai', 'confidence_claude']
-    ].min(axis=1)
-    
-    def assign_tier(conf):
-        if conf < 0.60:
-            return 'very_low'
-        elif conf < 0.75:
-            return 'low'
-        elif conf < 0.90:
-            return 'medium'
-        elif conf < 0.95:
-            return 'high'
-        else:
-            return 'very_high'
-    
-    disagreements['confidence_tier'] = disagreements['min_confidence'].apply(assign_tier)
-    
-    return disagreements
-
-def extract_json_robust(content: str) -> dict:
-    """Robustly extract JSON from LLM response."""
-    
-    # Strategy 1: Direct parse
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        pass
-    
-    # Strategy 2: Strip markdown
-    if '```json' in content:
-        content = content.split('```json')[1]
-    if '```' in content:
-        content = content.split('```')[0]
-    content = content.strip()
-    
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        pass
-    
-    # Strategy 3: Find first complete JSON object
-    try:
-        start = content.find('{')
-        if start == -1:
-            raise ValueError("No JSON object found")
-        
-        brace_count = 0
-        for i, char in enumerate(content[start:], start):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    json_str = content[start:i+1]
-                    return json.loads(json_str)
+    if analytics_store.has_table('comparison'):
+        # Filter and question join run inside the store; only disagreement rows come back
+        analytics_store.ensure_questions()
+        columns = ', '.join(f'c.{c}' for c in COMPARISON_COLUMNS)
+        comp_df = analytics_store.query(
+            f"SELECT {columns}, q.question, q.primary_survey "
+            f"FROM comparison c LEFT JOIN questions q USING (id) "
+            f"WHERE {DISAGREEMENT_SQL} ORDER BY c.id"
+        )
+    else:
+        comp_df = pd.read_csv(COMPARISON_DIR / 'full_comparison.csv', usecols=COMPARISON_COLUMNS)
         
-        raise ValueError("No complete JSON object found")
-    except (ValueError, json.JSONDecodeError) as e:
-        raise ValueError(f"Could not extract valid JSON: {e}")
+        # Load original questions to get question text
+        questions_df = load_questions()
+        comp_df = comp_df.merge(questions_df[['id', 'question', 'primary_survey']], on='id', how='left')
+    
+    # Find disagreements (topic OR subtopic) with min confidence and tier
+    return find_disagreements(comp_df)
 
 def create_arbitration_prompt(row: pd.Series, taxonomy: Dict[str, List[str]]) -> str:
     """Create arbitration prompt with dual-modal support."""
@@ -217,20 +177,11 @@ CRITICAL:
     return prompt
 
 def call_sonnet(prompt: str, max_retries: int = 5) -> Dict[str, Any]:
-    """Call claude-sonnet-4-5 with retry logic."""
-    client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-    
+    """Call the arbitrator (claude-sonnet-4-5) with retry logic."""
     for attempt in range(max_retries):
         try:
-            response = client.messages.create(
-                model="claude-sonnet-4-5",
-                max_tokens=2048,
-                temperature=0,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            content = response.content[0].text
-            return extract_json_robust(content)
+            reply = complete(prompt, schema=ARBITRATION_SCHEMA, model_role='arbitrator', max_tokens=2048)
+            return reply['parsed']
             
         except Exception as e:
             if attempt < max_retries - 1:
@@ -239,8 +190,8 @@ def call_sonnet(prompt: str, max_retries: int = 5) -> Dict[str, Any]:
             else:
                 raise e
 
-def arbitrate_question(row: pd.Series, taxonomy: Dict[str, List[str]]) -> Dict[str, Any]:
-    """Arbitrate a single question."""
+def arbitrate_question(row: pd.Series, taxonomy: Taxonomy) -> Dict[str, Any]:
+    """Arbitrate a single question (near-miss answers are snapped onto the taxonomy)."""
     
     result = {
         'id': row['id'],
@@ -269,6 +220,12 @@ def arbitrate_question(row: pd.Series, taxonomy: Dict[str, List[str]]) -> Dict[s
         result['is_dual_modal'] = arb_result.get('is_dual_modal', False)
         result['status'] = 'arbitrated'
         
+        for topic_key, subtopic_key in [('primary_topic', 'primary_subtopic'),
+                                        ('secondary_primary_topic', 'secondary_primary_subtopic')]:
+            snapped = taxonomy.snap(result[topic_key], result[subtopic_key])
+            if snapped is not None:
+                result[topic_key], result[subtopic_key] = snapped.topic, snapped.subtopic
+        
     except Exception as e:
         result['status'] = 'failed'
         result['error'] = str(e)
@@ -284,7 +241,6 @@ def main():
     # Load data
     print("\n1. Loading data...")
     taxonomy = load_taxonomy()
-    questions_df = load_questions()
     disagreements = load_disagreements()
     
     print(f"   Total disagreements: {len(disagreements):,}")
@@ -332,65 +288,22 @@ def main():
                         pd.DataFrame(results).to_csv(OUTPUT_DIR / 'arbitration_results.csv', index=False)
                 
                 pbar.update(1)
-                time.sleep(0.2)  # Small delay to avoid rate limits
+                time.sleep(RESULT_PACING)  # Small delay to avoid rate limits
     
-    arb_df = pd.DataFrame(results)
+    arb_df = to_resolution_frame(results)
     arb_df.to_csv(OUTPUT_DIR / 'arbitration_results.csv', index=False)
     print(f"   ✓ Saved arbitration results")
     
     # Process auto dual-modal cases
     print(f"\n4. Processing {len(auto_dual_modal)} auto dual-modal cases...")
     
-    auto_results = []
-    for idx, row in auto_dual_modal.iterrows():
-        # Pick higher confidence as primary, other as secondary
-        if row['confidence_openai'] >= row['confidence_claude']:
-            primary_topic = row['primary_topic_openai']
-            primary_subtopic = row['primary_subtopic_openai']
-            primary_conf = row['confidence_openai']
-            secondary_topic = row['primary_topic_claude']
-            secondary_subtopic = row['primary_subtopic_claude']
-            secondary_conf = row['confidence_claude']
-        else:
-            primary_topic = row['primary_topic_claude']
-            primary_subtopic = row['primary_subtopic_claude']
-            primary_conf = row['confidence_claude']
-            secondary_topic = row['primary_topic_openai']
-            secondary_subtopic = row['primary_subtopic_openai']
-            secondary_conf = row['confidence_openai']
-        
-        auto_results.append({
-            'id': row['id'],
-            'question': row['question'],
-            'original_gpt5mini': f"{row['primary_topic_openai']}.{row['primary_subtopic_openai']}",
-            'original_haiku45': f"{row['primary_topic_claude']}.{row['primary_subtopic_claude']}",
-            'original_gpt_confidence': row['confidence_openai'],
-            'original_claude_confidence': row['confidence_claude'],
-            'min_confidence': row['min_confidence'],
-            'confidence_tier': row['confidence_tier'],
-            'decision': 'auto_dual_modal',
-            'primary_topic': primary_topic,
-            'primary_subtopic': primary_subtopic,
-            'primary_confidence': primary_conf,
-            'secondary_primary_topic': secondary_topic,
-            'secondary_primary_subtopic': secondary_subtopic,
-            'secondary_primary_confidence': secondary_conf,
-            'all_relevant_subtopics': json.dumps([
-                f"{primary_topic}.{primary_subtopic}",
-                f"{secondary_topic}.{secondary_subtopic}"
-            ]),
-            'reasoning': f"Both models highly confident (min={row['min_confidence']:.2f}) but chose different topics. Auto-marked as dual-modal.",
-            'is_dual_modal': True,
-            'status': 'auto_dual_modal'
-        })
-    
-    auto_df = pd.DataFrame(auto_results)
+    auto_df = resolve_auto_dual_modal(auto_dual_modal)
     auto_df.to_csv(OUTPUT_DIR / 'auto_dual_modal_results.csv', index=False)
     print(f"   ✓ Saved auto dual-modal results")
     
     # Combined results
-    all_results = pd.concat([arb_df, auto_df], ignore_index=True)
-    all_results.to_csv(OUTPUT_DIR / 'all_disagreement_resolutions.csv', index=False)
+    all_results = combine_resolutions([arb_df, auto_df])
+    analytics_store.save_table('resolutions', all_results)
     
     # Summary statistics
     print("\n" + "="*70)
@@ -424,5 +337,4 @@ def main():
     print(f"  - all_disagreement_resolutions.csv ({len(all_results)} questions)")
 
 if __name__ == '__main__':
-    import os
     main()
@@ -4,18 +4,37 @@ Assemble the complete report from individual sections.
 
 This script:
 1. Regenerates required figures from source data
-2. Copies figures to final_report/figures/
-3. Copies data files to final_report/data/
+2. Publishes figures to final_report/figures/
+3. Publishes data files to final_report/data/
 4. Assembles all sections into FULL_REPORT.md
 
+Builds are incremental: content hashes of figures, data files and
+sections are kept in final_report/.build_manifest.json. Unchanged
+artifacts are left alone, changed ones are reflinked or hard-linked
+from output/ (copied only if neither works), and FULL_REPORT.md is
+rewritten only when a section changed. Hashes are reused while a file's
+size and mtime are unchanged, so an unchanged multi-megabyte CSV is not
+even re-read.
+
+Note: a hard-linked artifact shares its file with output/, so a stage
+rewriting that output in place also updates the report copy; the next
+build records the new hash.
+
 Run from src/ directory:
     python assemble_report.py
+    python assemble_report.py --force    # Republish and reassemble everything
 """
 
+import argparse
+import errno
+import fcntl
+import hashlib
+import json
+import os
 import shutil
-import subprocess
-import sys
+import time
 from pathlib import Path
+from figure_build import build_figures
 
 # Base paths (script runs from src/)
 BASE_DIR = Path(__file__).parent.parent
@@ -26,11 +45,14 @@ SECTIONS_DIR = FINAL_REPORT_DIR / 'sections'
 FIGURES_DIR = FINAL_REPORT_DIR / 'figures'
 DATA_DIR = FINAL_REPORT_DIR / 'data'
 OUTPUT_FILE = FINAL_REPORT_DIR / 'FULL_REPORT.md'
+MANIFEST_FILE = FINAL_REPORT_DIR / '.build_manifest.json'
+FICLONE = 0x40049409  # Linux ioctl: reflink (copy-on-write clone)
+HASH_BLOCK = 1 << 20
 
-# Scripts that generate figures (run in order)
-FIGURE_SCRIPTS = [
-    'create_figure_02_agreement.py',      # Figure 2: Model agreement
-    'generate_coverage_analysis.py',       # Figure 4: Horizontal bars + others
+# Figures to regenerate (figure_build.py names; rebuilt in parallel, skipped if inputs unchanged)
+REPORT_FIGURES = [
+    'figure_02_model_agreement',        # Figure 2: Model agreement
+    'horizontal_bars_all_subtopics',    # Figure 4: Horizontal bars
 ]
 
 # Figures to include in report (source -> destination name)
@@ -66,91 +88,146 @@ SECTIONS = [
 ]
 
 
-def run_figure_scripts():
-    """Run scripts to regenerate figures from source data."""
+def run_figure_scripts(force=False):
+    """Regenerate report figures from source data (only those whose inputs changed)."""
     print("\n[1/4] Regenerating figures from source data...")
     print("-" * 50)
     
-    success_count = 0
-    for script in FIGURE_SCRIPTS:
-        script_path = SRC_DIR / script
-        if not script_path.exists():
-            print(f"  ⚠️  MISSING SCRIPT: {script}")
-            continue
-        
-        print(f"  Running {script}...")
-        try:
-            result = subprocess.run(
-                [sys.executable, str(script_path)],
-                cwd=str(SRC_DIR),
-                capture_output=True,
-                text=True,
-                timeout=120  # 2 minute timeout
-            )
-            if result.returncode == 0:
-                print(f"    ✓ {script} completed")
-                success_count += 1
-            else:
-                print(f"    ✗ {script} failed:")
-                print(f"      {result.stderr[:200]}")
-        except subprocess.TimeoutExpired:
-            print(f"    ✗ {script} timed out")
-        except Exception as e:
-            print(f"    ✗ {script} error: {e}")
-    
-    print(f"\n  Ran {success_count}/{len(FIGURE_SCRIPTS)} scripts successfully")
-    return success_count == len(FIGURE_SCRIPTS)
-
-
-def copy_figures():
-    """Copy figures from output/ to final_report/figures/."""
-    print("\n[2/4] Copying figures to final_report/figures/...")
-    print("-" * 50)
+    try:
+        ok = build_figures(REPORT_FIGURES, force=force)
+    except Exception as e:
+        print(f"    ✗ figure build error: {e}")
+        return False
     
-    # Ensure figures directory exists
-    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"\n  Figures {'up to date' if ok else 'built with failures'}")
+    return ok
+
+
+def load_manifest():
+    if MANIFEST_FILE.exists():
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest):
+    tmp = MANIFEST_FILE.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp.replace(MANIFEST_FILE)
+
+
+def file_hash(path, known=None):
+    """sha256 of a file, reusing `known` (a manifest entry) while size and mtime match."""
+    stat = path.stat()
+    if known and known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns:
+        return known
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return {'sha256': digest.hexdigest(), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def link_or_copy(source, dest):
+    """Place source at dest: reflink, else hard link, else copy. Returns the method used."""
+    tmp = dest.with_name(dest.name + '.tmp')
+    if tmp.exists():
+        tmp.unlink()
+    method = 'copy'
+    try:
+        with open(source, 'rb') as src, open(tmp, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, tmp)
+        method = 'reflink'
+    except OSError as e:
+        if tmp.exists():
+            tmp.unlink()
+        if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+            raise
+        try:
+            os.link(source, tmp)
+            method = 'hardlink'
+        except OSError:
+            shutil.copy2(source, tmp)
+    tmp.replace(dest)
+    return method
+
+
+def publish_files(files, dest_dir, kind, manifest, force=False):
+    """
+    Publish {source: dest name} into dest_dir, skipping files whose content
+    hash matches the manifest and whose published copy is still there.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    entries = manifest.setdefault(kind, {})
     
-    copied = 0
-    for source, dest_name in FIGURES.items():
-        dest = FIGURES_DIR / dest_name
+    published = skipped = 0
+    for source, dest_name in files.items():
+        dest = dest_dir / dest_name
         if not source.exists():
             print(f"  ⚠️  MISSING: {source.name}")
             continue
-        shutil.copy2(source, dest)
-        print(f"  ✓ {source.name} → {dest_name}")
-        copied += 1
+        
+        previous = entries.get(dest_name)
+        current = file_hash(source, previous and previous.get('source'))
+        if not force and previous and previous['source']['sha256'] == current['sha256'] and dest.exists() \
+                and dest.stat().st_size == current['size']:
+            entries[dest_name]['source'] = current
+            print(f"  = {dest_name} (unchanged)")
+            skipped += 1
+            continue
+        
+        method = link_or_copy(source, dest)
+        entries[dest_name] = {'source': current, 'from': str(source.relative_to(BASE_DIR)), 'method': method}
+        print(f"  ✓ {source.name} → {dest_name} ({method})")
+        published += 1
     
-    print(f"\n  Copied {copied}/{len(FIGURES)} figures")
-    return copied == len(FIGURES)
+    print(f"\n  {published} published, {skipped} unchanged of {len(files)} {kind}")
+    return published + skipped == len(files)
 
 
-def copy_data_files():
-    """Copy data files from output/ to final_report/data/."""
-    print("\n[3/4] Copying data files to final_report/data/...")
+def copy_figures(manifest, force=False):
+    """Publish figures from output/ to final_report/figures/."""
+    print("\n[2/4] Publishing figures to final_report/figures/...")
     print("-" * 50)
-    
-    # Ensure data directory exists
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    
-    copied = 0
-    for source, dest_name in DATA_FILES.items():
-        dest = DATA_DIR / dest_name
-        if not source.exists():
-            print(f"  ⚠️  MISSING: {source.name}")
-            continue
-        shutil.copy2(source, dest)
-        print(f"  ✓ {source.name} → {dest_name}")
-        copied += 1
-    
-    print(f"\n  Copied {copied}/{len(DATA_FILES)} data files")
-    return copied == len(DATA_FILES)
+    return publish_files(FIGURES, FIGURES_DIR, 'figures', manifest, force)
+
 
+def copy_data_files(manifest, force=False):
+    """Publish data files from output/ to final_report/data/."""
+    print("\n[3/4] Publishing data files to final_report/data/...")
+    print("-" * 50)
+    return publish_files(DATA_FILES, DATA_DIR, 'data', manifest, force)
 
-def assemble_report():
-    """Assemble all sections into complete report."""
+
+def assemble_report(manifest, force=False):
+    """Assemble all sections into complete report (rewritten only if a section changed)."""
     print("\n[4/4] Assembling report sections...")
     print("-" * 50)
     
+    # Which sections changed since the last build
+    entries = manifest.setdefault('sections', {})
+    hashes = {}
+    for i, section_file in enumerate(SECTIONS, 1):
+        section_path = SECTIONS_DIR / section_file
+        if not section_path.exists():
+            print(f"  ⚠️  MISSING: {section_file}")
+            continue
+        hashes[section_file] = file_hash(section_path, entries.get(section_file))
+        changed = entries.get(section_file, {}).get('sha256') != hashes[section_file]['sha256']
+        print(f"  [{i:2d}/{len(SECTIONS)}] {section_file}{' (changed)' if changed else ''}")
+    
+    report = manifest.get('report', {})
+    unchanged = (not force and OUTPUT_FILE.exists()
+                 and report.get('sections') == [f for f in SECTIONS if f in hashes]
+                 and all(entries.get(f, {}).get('sha256') == h['sha256'] for f, h in hashes.items())
+                 and report.get('sha256') == file_hash(OUTPUT_FILE)['sha256'])
+    manifest['sections'] = hashes
+    if unchanged:
+        print(f"\n  {OUTPUT_FILE.name} unchanged ({len(hashes)}/{len(SECTIONS)} sections)")
+        return len(hashes) == len(SECTIONS), report['characters']
+    
     # Start with title page
     content = []
     content.append("# From Weeks to Hours: Automated Concept Mapping for Federal Survey Analysis")
@@ -189,14 +266,12 @@ def assemble_report():
     
     # Append each section
     sections_found = 0
-    for i, section_file in enumerate(SECTIONS, 1):
+    for section_file in SECTIONS:
         section_path = SECTIONS_DIR / section_file
         
-        if not section_path.exists():
-            print(f"  ⚠️  MISSING: {section_file}")
+        if section_file not in hashes:
             continue
         
-        print(f"  [{i:2d}/{len(SECTIONS)}] {section_file}")
         sections_found += 1
         
         with open(section_path, 'r', encoding='utf-8') as f:
@@ -215,6 +290,11 @@ def assemble_report():
     
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         f.write(full_content)
+    manifest['report'] = {
+        'sha256': file_hash(OUTPUT_FILE)['sha256'],
+        'sections': [f for f in SECTIONS if f in hashes],
+        'characters': len(full_content),
+    }
     
     print(f"\n  Assembled {sections_found}/{len(SECTIONS)} sections")
     return sections_found == len(SECTIONS), len(full_content)
@@ -222,19 +302,29 @@ def assemble_report():
 
 def main():
     """Run complete report build."""
+    parser = argparse.ArgumentParser(description='Assemble the report (incrementally)')
+    parser.add_argument('--force', action='store_true', help='Rebuild figures, republish files and reassemble')
+    args = parser.parse_args()
+    
     print("=" * 70)
     print("FEDERAL SURVEY CONCEPT MAPPING - REPORT BUILD")
     print("=" * 70)
     
-    scripts_ok = run_figure_scripts()
-    figures_ok = copy_figures()
-    data_ok = copy_data_files()
-    sections_ok, char_count = assemble_report()
+    start = time.time()
+    manifest = load_manifest()
+    scripts_ok = run_figure_scripts(args.force)
+    figures_ok = copy_figures(manifest, args.force)
+    data_ok = copy_data_files(manifest, args.force)
+    sections_ok, char_count = assemble_report(manifest, args.force)
+    manifest['built_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    manifest['build_seconds'] = round(time.time() - start, 2)
+    save_manifest(manifest)
     
     print("\n" + "=" * 70)
     print("BUILD COMPLETE")
     print("=" * 70)
     print(f"\nOutput: {OUTPUT_FILE}")
+    print(f"Manifest: {MANIFEST_FILE}")
     print(f"Total length: {char_count:,} characters")
     print(f"Estimated pages: ~{char_count // 3000} pages")
     
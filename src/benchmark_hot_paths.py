@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the pandas/numpy hot paths of the analysis stages.
+
+Runs each function on synthetic corpora scaled from the current inventory
+(6,987 questions across 46 surveys, 152 taxonomy concepts) and records
+wall time and peak traced memory:
+
+- generate_survey_tables.calculate_concept_overlap
+- generate_survey_tables.create_survey_profile_table
+- create_final_outputs.reconcile_categorizations
+- similarity_stats.normalize_similarity_distributions / concepts_needed_for_mass
+  (the explore_similarity_* per-question normalization loops)
+
+Scales run smallest first. When a case's growth so far predicts it would
+take longer than --budget seconds at the next scale, that scale is
+skipped and reported with the predicted time - which shows which stage
+breaks first as the inventory grows. Scales over --max-questions are
+skipped outright (the synthetic corpus alone would not fit in memory).
+
+Baseline gating:
+    python benchmark_hot_paths.py --save-baseline   # record the baseline
+    python benchmark_hot_paths.py                   # compare; exits 1 on regression
+
+Usage:
+    python benchmark_hot_paths.py --scales 1 10 100 1000
+    python benchmark_hot_paths.py --cases reconcile_categorizations --scales 10
+
+Results: ../output/benchmarks/hot_paths.csv
+Baseline: ../output/benchmarks/hot_paths_baseline.json
+"""
+
+import io
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Any, Callable, Tuple
+
+import generate_survey_tables
+import create_final_outputs
+from similarity_stats import normalize_similarity_distributions, concepts_needed_for_mass
+from disagreement_resolution import find_disagreements, resolve_auto_dual_modal
+
+# Configuration
+OUTPUT_DIR = Path('../output/benchmarks')
+BASELINE_FILE = OUTPUT_DIR / 'hot_paths_baseline.json'
+TAXONOMY_FILE = Path('../data/raw/census_survey_explorer_taxonomy.json')
+
+BASE_QUESTIONS = 6987
+BASE_SURVEYS = 46
+AGREEMENT_RATE = 0.68        # Share of questions where both models agree
+CONCEPTS_PER_SURVEY = 19     # Mean distinct concepts per survey in the real matrix
+
+DEFAULT_SCALES = [1, 10, 100]
+BUDGET_SECONDS = 120.0
+MAX_QUESTIONS = 1_000_000
+REPEATS = 3
+TIME_TOLERANCE = 0.20        # Regression if >20% slower than baseline
+MEMORY_TOLERANCE = 0.10      # Regression if >10% more peak memory
+
+def load_concepts() -> pd.DataFrame:
+    """Taxonomy (topic, subtopic) pairs."""
+    with open(TAXONOMY_FILE, 'r') as f:
+        taxonomy = json.load(f)['taxonomy']
+    return pd.DataFrame([(t, s) for t, subs in taxonomy.items() for s in subs], columns=['topic', 'subtopic'])
+
+def make_corpus(scale: int, concepts: pd.DataFrame, seed: int = 42) -> Dict[str, Any]:
+    """
+    Synthetic pipeline data at `scale` x the current inventory.
+
+    Surveys get skewed sizes and a sparse concept mix (like the real
+    survey x concept matrix); the second model agrees AGREEMENT_RATE of
+    the time and disagreements are resolved by the auto dual-modal rule.
+    """
+    rng = np.random.default_rng(seed)
+    n_questions = BASE_QUESTIONS * scale
+    n_surveys = BASE_SURVEYS * scale
+    n_concepts = len(concepts)
+
+    # Skewed survey sizes, each survey drawing from its own handful of concepts
+    survey_of_question = rng.choice(n_surveys, size=n_questions, p=rng.dirichlet(np.full(n_surveys, 0.5)))
+    concept_sets = [rng.choice(n_concepts, size=min(n_concepts, max(1, int(rng.exponential(CONCEPTS_PER_SURVEY)))),
+                               replace=False) for _ in range(n_surveys)]
+    offsets = rng.random(n_questions)
+    concept_of_question = np.array([concept_sets[s][int(o * len(concept_sets[s]))]
+                                    for s, o in zip(survey_of_question, offsets)])
+
+    surveys = np.array([f"Survey {i:05d}" for i in range(n_surveys)], dtype=object)
+    topics = concepts['topic'].to_numpy(dtype=object)
+    subtopics = concepts['subtopic'].to_numpy(dtype=object)
+
+    ids = np.arange(n_questions)
+    master_df = pd.DataFrame({
+        'id': ids,
+        'primary_survey': surveys[survey_of_question],
+        'final_topic': topics[concept_of_question],
+        'final_subtopic': subtopics[concept_of_question],
+    })
+
+    disagree = rng.random(n_questions) >= AGREEMENT_RATE
+    claude_concept = np.where(disagree, rng.integers(0, n_concepts, size=n_questions), concept_of_question)
+    initial_df = pd.DataFrame({
+        'id': ids,
+        'primary_topic_openai': topics[concept_of_question],
+        'primary_subtopic_openai': subtopics[concept_of_question],
+        'confidence_openai': rng.choice([0.6, 0.75, 0.85, 0.9, 0.95], size=n_questions),
+        'secondary_concepts_openai': '[]',
+        'reasoning_openai': 'Synthetic reasoning.',
+        'primary_topic_claude': topics[claude_concept],
+        'primary_subtopic_claude': subtopics[claude_concept],
+        'confidence_claude': rng.choice([0.6, 0.75, 0.85, 0.9, 0.95], size=n_questions),
+        'secondary_concepts_claude': '[]',
+        'reasoning_claude': 'Synthetic reasoning.',
+    })
+    disagreements = find_disagreements(initial_df)
+    disagreements['question'] = 'Question ' + disagreements['id'].astype(str)
+    arbitration_df = resolve_auto_dual_modal(disagreements)
+
+    matrix_df = (master_df.assign(concept=master_df['final_topic'] + '.' + master_df['final_subtopic'])
+                 .groupby(['primary_survey', 'concept']).size().unstack(fill_value=0))
+
+    return {
+        'questions': n_questions,
+        'surveys': n_surveys,
+        'master_df': master_df,
+        'initial_df': initial_df,
+        'arbitration_df': arbitration_df,
+        'matrix_df': matrix_df,
+        'similarity_matrix': rng.uniform(0.2, 0.9, size=(n_questions, n_concepts)),
+    }
+
+def _profile_table(corpus):
+    """create_survey_profile_table writes a CSV and prints; keep both out of the way."""
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        viz_dir = generate_survey_tables.VIZ_DIR
+        generate_survey_tables.VIZ_DIR = Path(tmp)
+        try:
+            generate_survey_tables.create_survey_profile_table(corpus['master_df'])
+        finally:
+            generate_survey_tables.VIZ_DIR = viz_dir
+
+def _normalization(corpus):
+    normalized, _ = normalize_similarity_distributions(corpus['similarity_matrix'])
+    for threshold in [0.80, 0.85, 0.90, 0.95, 0.975, 0.99]:
+        concepts_needed_for_mass(normalized, threshold)
+
+CASES: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    'calculate_concept_overlap':
+        lambda corpus: generate_survey_tables.calculate_concept_overlap(corpus['matrix_df']),
+    'create_survey_profile_table': _profile_table,
+    'reconcile_categorizations':
+        lambda corpus: create_final_outputs.reconcile_categorizations(corpus['initial_df'], corpus['arbitration_df']),
+    'similarity_normalization': _normalization,
+}
+
+def measure(fn: Callable, corpus: Dict[str, Any], repeats: int) -> Tuple[float, float]:
+    """Best-of-N wall time (seconds), then peak traced memory (MB) from one extra run."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(corpus)
+        times.append(time.perf_counter() - start)
+        if times[-1] > 5:
+            break  # Slow cases: one timing is enough
+
+    tracemalloc.start()
+    try:
+        fn(corpus)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak / 1024 ** 2
+
+def predict_time(history: list, scale: int) -> float:
+    """Extrapolate a case's time to `scale` from the growth exponent seen so far (linear if one point)."""
+    if not history:
+        return 0.0
+    (s1, t1) = history[-1]
+    exponent = 1.0
+    if len(history) >= 2:
+        (s0, t0) = history[-2]
+        if t0 > 0 and s1 > s0:
+            exponent = max(1.0, math.log(t1 / t0) / math.log(s1 / s0))
+    return t1 * (scale / s1) ** exponent
+
+def compare_to_baseline(results_df: pd.DataFrame, baseline: Dict[str, Dict[str, float]],
+                        time_tolerance: float, memory_tolerance: float) -> pd.DataFrame:
+    """Add baseline columns and a regression flag per measured (case, scale)."""
+    keys = results_df['case'] + '@' + results_df['scale'].astype(str)
+    results_df['baseline_time_s'] = keys.map(lambda k: baseline.get(k, {}).get('time_s', np.nan))
+    results_df['baseline_peak_mb'] = keys.map(lambda k: baseline.get(k, {}).get('peak_mb', np.nan))
+    results_df['time_ratio'] = (results_df['time_s'] / results_df['baseline_time_s']).round(2)
+    results_df['memory_ratio'] = (results_df['peak_mb'] / results_df['baseline_peak_mb']).round(2)
+    results_df['regression'] = (
+        (results_df['time_ratio'] > 1 + time_tolerance) |
+        (results_df['memory_ratio'] > 1 + memory_tolerance)
+    )
+    return results_df
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for analysis hot paths')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='Multiples of the current inventory (e.g. 1 10 100 1000)')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--budget', type=float, default=BUDGET_SECONDS,
+                        help='Skip a scale when its predicted time exceeds this (seconds)')
+    parser.add_argument('--max-questions', type=int, default=MAX_QUESTIONS,
+                        help='Skip scales whose synthetic corpus exceeds this many questions')
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args()
+
+    print("="*70)
+    print("HOT PATH MICRO-BENCHMARKS")
+    print("="*70)
+
+    concepts = load_concepts()
+    history = {case: [] for case in args.cases}
+    rows = []
+
+    for scale in sorted(args.scales):
+        n_questions = BASE_QUESTIONS * scale
+        print(f"\n{scale}x: {n_questions:,} questions, {BASE_SURVEYS * scale:,} surveys")
+        if n_questions > args.max_questions:
+            print(f"   Skipped: corpus over --max-questions ({args.max_questions:,})")
+            rows.extend({'case': case, 'scale': scale, 'questions': n_questions,
+                         'status': 'skipped_size'} for case in args.cases)
+            continue
+
+        corpus = make_corpus(scale, concepts)
+        for case in args.cases:
+            predicted = predict_time(history[case], scale)
+            row = {'case': case, 'scale': scale, 'questions': corpus['questions'], 'surveys': corpus['surveys']}
+            if predicted > args.budget:
+                print(f"   {case}: skipped (predicted {predicted:,.0f}s > budget {args.budget:.0f}s)")
+                row.update({'status': 'skipped_budget', 'predicted_s': round(predicted, 1)})
+            else:
+                elapsed, peak_mb = measure(CASES[case], corpus, args.repeats)
+                history[case].append((scale, elapsed))
+                print(f"   {case}: {elapsed:.3f}s, peak {peak_mb:,.1f} MB")
+                row.update({'status': 'ok', 'time_s': round(elapsed, 4), 'peak_mb': round(peak_mb, 2)})
+            rows.append(row)
+        del corpus
+
+    results_df = pd.DataFrame(rows)
+    for column in ['time_s', 'peak_mb', 'predicted_s', 'surveys']:
+        if column not in results_df:
+            results_df[column] = np.nan
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    measured = results_df[results_df['status'] == 'ok']
+    if args.save_baseline:
+        baseline = {f"{r['case']}@{r['scale']}": {'time_s': r['time_s'], 'peak_mb': r['peak_mb']}
+                    for r in measured.to_dict('records')}
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nSaved baseline: {BASELINE_FILE} ({len(baseline)} entries)")
+        regressions = pd.DataFrame()
+    elif BASELINE_FILE.exists():
+        with open(BASELINE_FILE, 'r') as f:
+            baseline = json.load(f)
+        results_df = compare_to_baseline(results_df, baseline, args.time_tolerance, args.memory_tolerance)
+        regressions = results_df[results_df['regression'].fillna(False).astype(bool)]
+    else:
+        print(f"\nNo baseline at {BASELINE_FILE} (run with --save-baseline to create one)")
+        regressions = pd.DataFrame()
+
+    results_df.to_csv(OUTPUT_DIR / 'hot_paths.csv', index=False)
+
+    print("\n" + "="*70)
+    print("RESULTS")
+    print("="*70)
+    print("\n" + results_df.drop(columns=['surveys']).to_string(index=False))
+    print(f"\nSaved: {OUTPUT_DIR / 'hot_paths.csv'}")
+
+    if len(regressions) > 0:
+        print(f"\n✗ {len(regressions)} regression(s) against baseline "
+              f"(time +{args.time_tolerance:.0%}, memory +{args.memory_tolerance:.0%}):")
+        for _, r in regressions.iterrows():
+            print(f"   {r['case']} @ {r['scale']}x: time x{r['time_ratio']}, memory x{r['memory_ratio']}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
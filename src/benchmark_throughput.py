@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark on recorded responses.
+
+Replays the pipeline's recorded LLM outputs through its real call paths
+behind MockProvider (llm_providers.py), so worker counts, batch size and
+the retry policy can be tuned offline before a production run:
+
+- results_openai.jsonl / results_claude.jsonl answer categorization batches
+  (llm_categorization.call_openai / call_claude)
+- arbitration_final/arbitration_results.csv answers arbitration prompts
+  (arbitrate_final.arbitrate_question)
+- Anything not recorded gets a schema-generated reply
+
+Latency comes from a configurable distribution, rate limits from a
+per-model requests/minute bucket (429s), plus optional injected 500s and
+malformed JSON. Retries and backoff are the scripts' own; retries are
+counted from telemetry (attempts beyond the first per prompt), so an
+off-taxonomy re-ask is a new call, not a retry. Telemetry goes to a
+separate store (TELEMETRY_FILE), never the pipeline's.
+
+Stages:
+1. Categorization - both models at once, MAX_WORKERS threads each (as llm_categorization.py)
+2. Arbitration - low-confidence disagreements on MAX_WORKERS threads,
+   including arbitrate_final.py's per-result pacing
+3. Final outputs - load, reconcile, survey x concept matrix on the full
+   recorded data (no LLM calls; create_final_outputs.py)
+
+Usage:
+    python benchmark_throughput.py
+    python benchmark_throughput.py --workers 3 6 12 --batch-size 10 20
+    python benchmark_throughput.py --latency lognormal:2.0:0.6 --rpm 300 --rate-500 0.01
+    python benchmark_throughput.py --sample 2000 --stages categorization
+
+Results: ../output/benchmarks/throughput.csv
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Every role goes to the mock, whatever the environment says
+os.environ['LLM_PROVIDER'] = 'mock'
+
+import llm_categorization
+import arbitrate_final
+import llm_telemetry
+from llm_providers import MockProvider, set_provider, batch_ids
+from disagreement_resolution import find_disagreements
+from llm_telemetry import session_calls, summarize_calls
+
+# Configuration
+RESULTS_DIR = Path('../output/results')
+COMPARISON_DIR = Path('../output/comparison')
+ARBITRATION_DIR = Path('../output/arbitration_final')
+OUTPUT_DIR = Path('../output/benchmarks')
+TELEMETRY_FILE = OUTPUT_DIR / 'llm_calls.sqlite'
+
+DEFAULT_LATENCY = 'lognormal:1.5:0.5'
+DEFAULT_SAMPLE = 1000
+STAGES = ['categorization', 'arbitration', 'final']
+
+# Benchmark calls stay out of the pipeline's cost and retry telemetry
+llm_telemetry.STORE_FILE = TELEMETRY_FILE
+
+class RecordedResponses:
+    """MockProvider responder that answers with the pipeline's recorded outputs."""
+
+    def __init__(self):
+        self.categorizations = {
+            'categorize_openai': self._load_jsonl(RESULTS_DIR / 'results_openai.jsonl'),
+            'categorize_claude': self._load_jsonl(RESULTS_DIR / 'results_claude.jsonl'),
+        }
+        self.arbitrations = {}
+        arb_path = ARBITRATION_DIR / 'arbitration_results.csv'
+        if arb_path.exists():
+            arb_df = pd.read_csv(arb_path)
+            arb_df = arb_df[arb_df['status'] == 'arbitrated']
+            for record in arb_df.to_dict('records'):
+                self.arbitrations[self._question_key(record['question'])] = self._arbitration_reply(record)
+
+    @staticmethod
+    def _load_jsonl(path: Path) -> Dict[Any, Dict[str, Any]]:
+        records = {}
+        if path.exists():
+            with open(path, 'r') as f:
+                for line in f:
+                    record = json.loads(line)
+                    records[record['id']] = record
+        return records
+
+    @staticmethod
+    def _question_key(question) -> str:
+        return str(question).split('\n')[0].strip()
+
+    @staticmethod
+    def _arbitration_reply(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Recorded resolution row -> the JSON the arbitrator originally returned."""
+        reply = {key: (None if pd.isna(value) else value) for key, value in record.items()
+                 if key in arbitrate_final.ARBITRATION_SCHEMA['properties']}
+        if isinstance(reply.get('all_relevant_subtopics'), str):
+            reply['all_relevant_subtopics'] = json.loads(reply['all_relevant_subtopics'])
+        return reply
+
+    def __call__(self, prompt: str, schema, model_role: str):
+        if model_role in self.categorizations:
+            records = self.categorizations[model_role]
+            replies = [records[qid] for qid in batch_ids(prompt) if qid in records]
+            return json.dumps(replies) if replies else None
+        if model_role == 'arbitrator':
+            match = re.search(r'^Question: (.*)$', prompt, re.MULTILINE)
+            reply = self.arbitrations.get(self._question_key(match.group(1))) if match else None
+            return json.dumps(reply) if reply else None
+        return None
+
+class CountingMockProvider(MockProvider):
+    """MockProvider that counts attempts and injected failures."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.counts = {'attempts': 0, 'rate_limited': 0, 'server_errors': 0}
+        self._count_lock = threading.Lock()
+
+    def complete(self, *args, **kwargs):
+        with self._count_lock:
+            self.counts['attempts'] += 1
+        try:
+            return super().complete(*args, **kwargs)
+        except Exception as e:
+            key = 'rate_limited' if getattr(e, 'status_code', None) == 429 else 'server_errors'
+            with self._count_lock:
+                self.counts[key] += 1
+            raise
+
+def fresh_provider(args, responder: RecordedResponses) -> CountingMockProvider:
+    """New mock (empty rate buckets and counters) installed for every role."""
+    provider = CountingMockProvider(
+        latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500,
+        rate_malformed=args.rate_malformed, rpm=args.rpm, seed=args.seed, responder=responder
+    )
+    set_provider('mock', provider)
+    return provider
+
+def telemetry_retries(first_attempt: int) -> int:
+    """Retries among this process's attempts from index first_attempt on (attempts - distinct prompts)."""
+    summary = summarize_calls(session_calls().iloc[first_attempt:])
+    return int(summary['retries'].sum()) if len(summary) else 0
+
+def summarize(stage: str, workers: int, batch_size, questions: int, wall: float,
+              latencies: List[float], failed: int, counts: Dict[str, int], retries: int = 0) -> Dict[str, Any]:
+    """One result row: throughput and call latency percentiles for a stage run."""
+    row = {
+        'stage': stage,
+        'workers': workers,
+        'batch_size': batch_size,
+        'questions': questions,
+        'calls': len(latencies),
+        'failed_calls': failed,
+        'wall_s': round(wall, 2),
+        'questions_per_s': round(questions / wall, 2) if wall > 0 else np.nan,
+        'p50_latency_s': round(float(np.percentile(latencies, 50)), 3) if latencies else np.nan,
+        'p95_latency_s': round(float(np.percentile(latencies, 95)), 3) if latencies else np.nan,
+    }
+    row.update(counts)
+    row['retries'] = retries
+    return row
+
+def bench_categorization(question_ids: List[int], taxonomy, workers: int, batch_size: int,
+                         args, responder: RecordedResponses) -> Dict[str, Any]:
+    """Both models' batches on `workers` threads each, as llm_categorization.main runs them."""
+    provider = fresh_provider(args, responder)
+    first_attempt = len(session_calls())
+    questions = [{'id': qid, 'survey': 'Unknown', 'question': f"Question {qid}"} for qid in question_ids]
+    batches = [questions[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+    latencies = []
+    failed = [0]
+    lock = threading.Lock()
+
+    def timed_batch(api_call, batch):
+        start = time.perf_counter()
+        results = api_call(batch, taxonomy)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            failed[0] += 0 if results else 1
+
+    def run_model(api_call):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in as_completed([executor.submit(timed_batch, api_call, b) for b in batches]):
+                future.result()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for future in [executor.submit(run_model, llm_categorization.call_openai),
+                       executor.submit(run_model, llm_categorization.call_claude)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    return summarize('categorization', workers, batch_size, len(question_ids), wall,
+                     latencies, failed[0], provider.counts, telemetry_retries(first_attempt))
+
+def load_arbitration_rows(question_ids: List[int]) -> pd.DataFrame:
+    """Low-confidence disagreements among the sampled questions, shaped like arbitrate_final's input."""
+    comp_df = pd.read_csv(COMPARISON_DIR / 'full_comparison.csv')
+    comp_df = comp_df[comp_df['id'].isin(question_ids)]
+    text = pd.read_csv(ARBITRATION_DIR / 'all_disagreement_resolutions.csv', usecols=['id', 'question'])
+    comp_df = comp_df.merge(text.drop_duplicates('id'), on='id', how='left')
+    comp_df['question'] = comp_df['question'].fillna('Question ' + comp_df['id'].astype(str))
+    comp_df['primary_survey'] = 'Unknown'
+    disagreements = find_disagreements(comp_df)
+    return disagreements[disagreements['min_confidence'] < arbitrate_final.CONFIDENCE_THRESHOLD]
+
+def bench_arbitration(rows: pd.DataFrame, taxonomy, workers: int,
+                      args, responder: RecordedResponses) -> Dict[str, Any]:
+    """Arbitrate rows on `workers` threads with arbitrate_final's result pacing."""
+    provider = fresh_provider(args, responder)
+    first_attempt = len(session_calls())
+    latencies = []
+    failed = 0
+
+    def timed_question(row):
+        start = time.perf_counter()
+        result = arbitrate_final.arbitrate_question(row, taxonomy)
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(timed_question, row) for _, row in rows.iterrows()]
+        for future in as_completed(futures):
+            result, elapsed = future.result()
+            latencies.append(elapsed)
+            failed += result['status'] == 'failed'
+            time.sleep(arbitrate_final.RESULT_PACING)
+    wall = time.perf_counter() - start
+
+    return summarize('arbitration', workers, None, len(rows), wall, latencies, failed, provider.counts,
+                     telemetry_retries(first_attempt))
+
+def bench_final_outputs() -> Dict[str, Any]:
+    """Load, reconcile and build the survey x concept matrix from the recorded outputs."""
+    import create_final_outputs as cfo
+
+    start = time.perf_counter()
+    initial_df = cfo.load_initial_results()
+    arbitration_df = cfo.load_arbitration_results()
+    master_df = cfo.reconcile_categorizations(initial_df, arbitration_df)
+    cfo.create_survey_concept_matrix(master_df)
+    wall = time.perf_counter() - start
+
+    return summarize('final', 1, None, len(master_df), wall, [], 0,
+                     {'attempts': 0, 'rate_limited': 0, 'server_errors': 0})
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline throughput benchmark on recorded responses')
+    parser.add_argument('--workers', type=int, nargs='+', default=[llm_categorization.MAX_WORKERS],
+                        help='Worker counts to sweep (categorization and arbitration)')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[llm_categorization.BATCH_SIZE],
+                        help='Categorization batch sizes to sweep')
+    parser.add_argument('--sample', type=int, default=DEFAULT_SAMPLE,
+                        help='Questions to replay (0 = all recorded)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--latency', default=DEFAULT_LATENCY,
+                        help='constant:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA')
+    parser.add_argument('--rpm', type=float, default=None, help='Per-model requests/minute limit')
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-500', type=float, default=0.0)
+    parser.add_argument('--rate-malformed', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print("="*70)
+    print("THROUGHPUT BENCHMARK (recorded responses)")
+    print("="*70)
+
+    print("\n1. Loading recorded responses...")
+    responder = RecordedResponses()
+    taxonomy = llm_categorization.load_taxonomy()
+    recorded_ids = sorted(responder.categorizations['categorize_openai'])
+    rng = np.random.default_rng(args.seed)
+    if args.sample and args.sample < len(recorded_ids):
+        question_ids = sorted(rng.choice(recorded_ids, size=args.sample, replace=False).tolist())
+    else:
+        question_ids = recorded_ids
+    print(f"   Categorizations: {len(responder.categorizations['categorize_openai']):,} gpt-5-mini, "
+          f"{len(responder.categorizations['categorize_claude']):,} claude-haiku-4-5")
+    print(f"   Arbitrations: {len(responder.arbitrations):,}")
+    print(f"   Replaying {len(question_ids):,} questions")
+    print(f"   Latency: {args.latency}, rpm: {args.rpm or 'unlimited'}, "
+          f"429: {args.rate_429:.0%}, 500: {args.rate_500:.0%}, malformed: {args.rate_malformed:.0%}")
+
+    print("\n2. Running stages...")
+    rows = []
+    if 'categorization' in args.stages:
+        for workers in args.workers:
+            for batch_size in args.batch_size:
+                print(f"   Categorization: {workers} workers, batch size {batch_size}...")
+                rows.append(bench_categorization(question_ids, taxonomy, workers, batch_size, args, responder))
+
+    if 'arbitration' in args.stages:
+        arbitration_rows = load_arbitration_rows(question_ids)
+        for workers in args.workers:
+            print(f"   Arbitration: {workers} workers, {len(arbitration_rows)} questions...")
+            rows.append(bench_arbitration(arbitration_rows, taxonomy, workers, args, responder))
+
+    if 'final' in args.stages:
+        print("   Final outputs...")
+        rows.append(bench_final_outputs())
+
+    results_df = pd.DataFrame(rows).astype({'batch_size': 'Int64'})
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    results_df.to_csv(OUTPUT_DIR / 'throughput.csv', index=False)
+
+    print("\n" + "="*70)
+    print("RESULTS")
+    print("="*70)
+    print("\n" + results_df.to_string(index=False))
+    print(f"\nSaved: {OUTPUT_DIR / 'throughput.csv'}")
+    print(f"Telemetry: {TELEMETRY_FILE}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Stream the final results into the canonical JSON format
+(config/canonical_format.json), and read them back the same way.
+
+Question records come from the master table in chunks
+(analytics_store.iter_table), survey records from counts gathered while
+those chunks pass, and cluster records from question_index.py's
+clusters.json, read with the streaming reader below. Each record is
+serialized and written as soon as it is built, so memory is bounded by
+one chunk (plus the similarity links, a few ints per question), whatever
+the size of the inventory. Three layouts:
+
+    ndjson   one record per line with a "record_type" field
+             (question | survey | cluster | metadata)
+    json     one document {"questions": [...], "surveys": [...],
+             "clusters": [...], "metadata": {...}}; metadata comes last
+             because its totals are only known once the records are out
+    *.gz     either of the above, gzip-compressed
+
+read_canonical() yields (record_type, record) pairs from any of them,
+parsing the JSON document incrementally rather than loading it whole.
+
+similar_questions and cluster_id use the question index's ids, linked to
+master ids by question text. Fields the pipeline does not produce
+(question_type, complexity, agency, ...) are written as null.
+
+Usage:
+    python canonical_export.py                            # ../output/canonical/canonical.ndjson
+    python canonical_export.py --format json --compress   # ../output/canonical/canonical.json.gz
+    python canonical_export.py --read ../output/canonical/canonical.ndjson
+"""
+
+import argparse
+import ast
+import gzip
+import json
+import math
+import numpy as np
+import pandas as pd
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+import analytics_store
+from survey_incidence import load_incidence
+from question_index import CLUSTER_IDS_FILE, CLUSTERS_FILE, NEIGHBORS_FILE, question_key
+
+# Configuration
+OUTPUT_DIR = Path('../output/canonical')
+MAPPING_PATH = Path('../data/processed/embeddings/question_id_mapping.csv')
+FORMAT_VERSION = '1.0'
+FORMATS = ['ndjson', 'json']
+SECTIONS = {'questions': 'question', 'surveys': 'survey', 'clusters': 'cluster'}
+DOMAIN_TAGS = 5            # Most common topics listed per survey
+READ_BLOCK = 1 << 16       # Characters read at a time by the streaming parser
+
+MASTER_COLUMNS = [
+    'id', 'question', 'primary_survey', 'final_topic', 'final_subtopic', 'decision_method',
+    'needs_human_review', 'confidence_tier', 'models_agree', 'arb_primary_conf',
+    'secondary_primary_topic', 'secondary_primary_subtopic',
+    'primary_topic_openai', 'primary_subtopic_openai', 'confidence_openai', 'secondary_concepts_openai',
+    'reasoning_openai', 'primary_topic_claude', 'primary_subtopic_claude', 'confidence_claude',
+    'secondary_concepts_claude', 'reasoning_claude',
+]
+MODELS = ['openai', 'claude']
+
+def _clean(value):
+    """JSON-safe scalar: None for NaN/NA, Python types for numpy ones."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    return value
+
+def _concept(topic, subtopic) -> str:
+    topic, subtopic = _clean(topic), _clean(subtopic)
+    return f"{topic}.{subtopic}" if topic is not None and subtopic is not None else None
+
+def _secondary_concepts(value) -> List[str]:
+    """'Topic.Subtopic' labels from a stored secondary_concepts list (list or its repr)."""
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    if not isinstance(value, list):
+        return []
+    return [f"{c['topic']}.{c['subtopic']}" for c in value
+            if isinstance(c, dict) and c.get('topic') and c.get('subtopic')]
+
+# Similarity links (question index ids -> master ids)
+
+class SimilarityLinks(NamedTuple):
+    similar: Dict[int, List[int]]   # master id -> similar master ids, closest first
+    cluster: Dict[int, str]         # master id -> cluster_id
+    master_id: Dict[int, int]       # question index id -> master id
+
+def load_similarity_links() -> SimilarityLinks:
+    """question_index.py outputs keyed by master id (empty if they have not been built)."""
+    if not (NEIGHBORS_FILE.exists() and MAPPING_PATH.exists()):
+        return SimilarityLinks({}, {}, {})
+
+    master = analytics_store.read_table('master', ['id', 'question'])
+    by_text = dict(zip(master['question'].astype(str).str.strip()[::-1], master['id'].to_numpy()[::-1]))
+    mapping = pd.read_csv(MAPPING_PATH, usecols=['question_id', 'question_text'])
+    texts = mapping['question_text'].astype(str).str.strip()
+    master_id = {int(q): int(by_text[t]) for q, t in zip(mapping['question_id'], texts) if t in by_text}
+
+    def translate(keys: pd.Series) -> pd.Series:
+        return keys.str[1:].astype(np.int64).map(master_id)
+
+    neighbors = pd.read_csv(NEIGHBORS_FILE)
+    neighbors = neighbors.assign(source=translate(neighbors['question_id']),
+                                 target=translate(neighbors['similar_question_id']))
+    neighbors = neighbors.dropna(subset=['source', 'target'])
+    neighbors = neighbors.sort_values(['source', 'rank'], kind='stable')
+    similar = {int(s): [int(t) for t in targets]
+               for s, targets in neighbors.groupby('source', sort=False)['target']}
+
+    cluster = {}
+    if CLUSTER_IDS_FILE.exists():
+        clusters = pd.read_csv(CLUSTER_IDS_FILE).dropna()
+        clusters = clusters.assign(source=translate(clusters['question_id'])).dropna(subset=['source'])
+        cluster = dict(zip(clusters['source'].astype(np.int64).tolist(), clusters['cluster_id']))
+    return SimilarityLinks(similar, cluster, master_id)
+
+# Records
+
+def question_categories(row: dict) -> List[dict]:
+    """
+    Scored categories, final answer first: the final concept (agreement:
+    mean model confidence; arbitrated: arbitration confidence), the
+    dual-modal second concept, each model's differing primary concept
+    with its confidence, then model secondary concepts (unscored).
+    """
+    final = _concept(row['final_topic'], row['final_subtopic'])
+    picks = {m: _concept(row[f'primary_topic_{m}'], row[f'primary_subtopic_{m}']) for m in MODELS}
+    categories = []
+
+    def add(category, score, reasoning, source):
+        if category is not None and all(c['category'] != category for c in categories):
+            categories.append({'category': category, 'score': _clean(score), 'reasoning': _clean(reasoning),
+                               'source': source})
+
+    if final is not None:
+        if row['decision_method'] == 'agreement':
+            scores = [row[f'confidence_{m}'] for m in MODELS if _clean(row[f'confidence_{m}']) is not None]
+            score = round(sum(scores) / len(scores), 4) if scores else None
+        else:
+            score = row['arb_primary_conf']
+        reasoning = next((row[f'reasoning_{m}'] for m in MODELS if picks[m] == final), None)
+        add(final, score, reasoning, 'final')
+    add(_concept(row['secondary_primary_topic'], row['secondary_primary_subtopic']), None, None, 'arbitration')
+    for m in MODELS:
+        add(picks[m], row[f'confidence_{m}'], row[f'reasoning_{m}'], m)
+    for m in MODELS:
+        for concept in _secondary_concepts(row[f'secondary_concepts_{m}']):
+            add(concept, None, None, m)
+    return categories
+
+def question_records(links: SimilarityLinks, tally: Dict[str, Dict[str, int]]) -> Iterator[dict]:
+    """
+    Canonical question records from the master table, chunk by chunk.
+    `tally` collects survey -> {topic: questions} (every asking survey;
+    topic '' counts uncategorized questions) for the survey records.
+    """
+    incidence = load_incidence()
+    surveys = np.asarray(incidence.surveys, dtype=object)
+    for chunk in analytics_store.iter_table('master', None, order_by='id'):
+        chunk = chunk.reindex(columns=MASTER_COLUMNS)
+        ids = chunk['id'].to_numpy(dtype=np.int64)
+        rows = incidence.matrix[ids]
+        for n, row in enumerate(chunk.to_dict('records')):
+            qid = int(row['id'])
+            asked = surveys[rows.indices[rows.indptr[n]:rows.indptr[n + 1]]].tolist()
+            topic = _clean(row['final_topic'])
+            for survey in asked:
+                counts = tally.setdefault(survey, {})
+                key = topic if topic is not None else ''
+                counts[key] = counts.get(key, 0) + 1
+            yield {
+                'question_id': question_key(qid),
+                'survey_key': _clean(row['primary_survey']),
+                'surveys': asked,
+                'question_text': _clean(row['question']),
+                'categories': question_categories(row),
+                'decision_method': _clean(row['decision_method']),
+                'confidence_tier': _clean(row['confidence_tier']),
+                'needs_human_review': _clean(row['needs_human_review']),
+                'question_type': None,
+                'complexity': None,
+                'respondent_type': None,
+                'temporal_scope': None,
+                'universe': None,
+                'branching_logic': None,
+                'similar_questions': [question_key(q) for q in links.similar.get(qid, [])],
+                'cluster_id': links.cluster.get(qid),
+                'notes': None,
+            }
+
+def survey_records(tally: Dict[str, Dict[str, int]]) -> Iterator[dict]:
+    """Canonical survey records from the tally question_records() filled (surveys sorted)."""
+    for survey in sorted(tally):
+        counts = tally[survey]
+        topics = sorted((t for t in counts if t not in ('', 'Unknown')), key=lambda t: (-counts[t], t))
+        yield {
+            'survey_key': survey,
+            'full_name': survey,
+            'agency': None,
+            'domain_tags': topics[:DOMAIN_TAGS],
+            'target_population': None,
+            'collection_method': None,
+            'frequency': None,
+            'years_active': None,
+            'question_count': sum(counts.values()),
+        }
+
+def cluster_records(links: SimilarityLinks) -> Iterator[dict]:
+    """question_index.py clusters with question ids translated to master ids."""
+    if not CLUSTERS_FILE.exists():
+        return
+
+    def translate(key):
+        found = links.master_id.get(int(key[1:]))
+        return question_key(found) if found is not None else None
+
+    for _, cluster in read_canonical(CLUSTERS_FILE):
+        members = [m for m in map(translate, cluster['member_questions']) if m is not None]
+        if not members:
+            continue
+        yield dict(cluster, canonical_question_id=translate(cluster['canonical_question_id']),
+                   member_questions=members)
+
+# Writing
+
+def _open(path: Path, mode: str):
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _format_of(path: Path) -> str:
+    suffixes = [s for s in path.suffixes if s != '.gz']
+    return 'ndjson' if suffixes and suffixes[-1] in ('.ndjson', '.jsonl') else 'json'
+
+def write_canonical(path: Path, sections: List[Tuple[str, Iterable[dict]]],
+                    metadata: Callable[[Dict[str, int]], dict]) -> Dict[str, int]:
+    """
+    Stream sections [(name, records)] to path (layout from its suffix:
+    .ndjson/.jsonl or .json, optionally .gz), then the metadata built from
+    the record counts. Written to a temporary file and moved into place.
+    """
+    fmt = _format_of(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name('tmp.' + path.name)  # Same suffixes, so the same layout and compression
+    counts = {}
+    with _open(tmp, 'w') as f:
+        if fmt == 'json':
+            f.write('{\n')
+        for name, records in sections:
+            count = 0
+            if fmt == 'json':
+                f.write(f'"{name}": [')
+            for record in records:
+                if fmt == 'json':
+                    f.write((',\n' if count else '\n') + json.dumps(record, ensure_ascii=False))
+                else:
+                    f.write(json.dumps({'record_type': SECTIONS[name], **record}, ensure_ascii=False) + '\n')
+                count += 1
+            if fmt == 'json':
+                f.write('\n],\n')
+            counts[name] = count
+        meta = metadata(counts)
+        if fmt == 'json':
+            f.write('"metadata": ' + json.dumps(meta, ensure_ascii=False) + '\n}\n')
+        else:
+            f.write(json.dumps({'record_type': 'metadata', **meta}, ensure_ascii=False) + '\n')
+    tmp.replace(path)
+    return counts
+
+def export_canonical(path: Path) -> Dict[str, int]:
+    """Write the full inventory in canonical form to path."""
+    links = load_similarity_links()
+    tally = {}
+
+    def metadata(counts: Dict[str, int]) -> dict:
+        return {
+            'version': FORMAT_VERSION,
+            'created_date': date.today().isoformat(),
+            'description': 'Canonical JSON format for survey question analysis',
+            'total_questions': counts['questions'],
+            'total_surveys': counts['surveys'],
+            'total_clusters': counts['clusters'],
+        }
+
+    return write_canonical(path, [
+        ('questions', question_records(links, tally)),
+        ('surveys', survey_records(tally)),
+        ('clusters', cluster_records(links)),
+    ], metadata)
+
+# Reading
+
+class _JSONStream:
+    """Incremental JSON tokenizer over a text file: one value at a time, READ_BLOCK characters buffered."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        block = self.f.read(READ_BLOCK)
+        if not block:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input), not consumed."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input until it parses."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number or literal cut at the buffer end may parse short; confirm with more input
+                if end < len(self.buffer) or self.eof or self.buffer[end - 1] in '}]"':
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        """Top-level object: (key, value), arrays element by element; bare array: (None, element)."""
+        if self.peek() == '[':
+            yield from ((None, element) for element in self._array())
+            return
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            if self.peek() == '[':
+                for element in self._array():
+                    yield key, element
+            else:
+                yield key, self.value()
+            if self.expect(',}') == '}':
+                return
+
+    def _array(self) -> Iterator[object]:
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+def read_canonical(path: Path) -> Iterator[Tuple[str, dict]]:
+    """
+    (record_type, record) for every record in a canonical file (NDJSON or
+    JSON, optionally .gz) without loading it whole. A bare JSON array
+    (e.g. clusters.json) yields (None, element).
+    """
+    path = Path(path)
+    with _open(path, 'r') as f:
+        if _format_of(path) == 'ndjson':
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record.pop('record_type', None), record
+        else:
+            for key, value in _JSONStream(f).items():
+                yield SECTIONS.get(key, key), value
+
+def main():
+    parser = argparse.ArgumentParser(description='Export (or read) the canonical JSON format')
+    parser.add_argument('--format', choices=FORMATS, default='ndjson',
+                        help='Layout of the default output (with --output, its suffix decides)')
+    parser.add_argument('--compress', action='store_true', help='gzip the output')
+    parser.add_argument('--output', type=Path, help='Output path (default ../output/canonical/canonical.<format>)')
+    parser.add_argument('--read', type=Path, metavar='PATH', help='Stream an exported file and count its records')
+    args = parser.parse_args()
+
+    print("="*70)
+    print("CANONICAL FORMAT " + ("READ" if args.read else "EXPORT"))
+    print("="*70)
+
+    if args.read:
+        counts, metadata = {}, None
+        for record_type, record in read_canonical(args.read):
+            counts[record_type] = counts.get(record_type, 0) + 1
+            if record_type == 'metadata':
+                metadata = record
+        for record_type, count in counts.items():
+            print(f"  {record_type}: {count:,}")
+        if metadata:
+            print(f"  Metadata: version {metadata.get('version')}, created {metadata.get('created_date')}")
+        return
+
+    path = args.output or OUTPUT_DIR / f"canonical.{args.format}"
+    if args.compress and path.suffix != '.gz':
+        path = path.with_name(path.name + '.gz')
+
+    counts = export_canonical(path)
+    for name, count in counts.items():
+        print(f"  {name}: {count:,}")
+    print(f"\n  ✓ {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+if __name__ == '__main__':
+    main()
@@ -3,13 +3,14 @@
 Run ONLY Claude categorization.
 """
 
-import os
 import json
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
-import anthropic
 from tqdm import tqdm
+from llm_providers import complete
+from llm_categorization import CATEGORIZATION_SCHEMA, resolve_off_taxonomy, print_snap_summary
+from taxonomy import load_taxonomy
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -20,10 +21,6 @@ MAX_WORKERS = 6
 RESULTS_DIR = Path('../output/results')
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
-def load_taxonomy():
-    with open('../data/raw/census_survey_explorer_taxonomy.json', 'r') as f:
-        return json.load(f)['taxonomy']
-
 def load_questions():
     df = pd.read_csv('../data/raw/PublicSurveyQuestionsMap.csv')
     questions = []
@@ -72,35 +69,12 @@ Return a JSON array with one object per question, in the same order. Format:
 Return ONLY the JSON array, no other text."""
 
 def call_claude(batch, taxonomy, max_retries=5):
-    client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
     prompt = create_prompt(batch, taxonomy)
     
     for attempt in range(max_retries):
         try:
-            response = client.messages.create(
-                model="claude-haiku-4-5",
-                max_tokens=4096,
-                temperature=0,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            content = response.content[0].text
-            if content.startswith('```json'):
-                content = content.split('```json')[1]
-            if content.endswith('```'):
-                content = content.rsplit('```', 1)[0]
-            content = content.strip()
-            
-            result = json.loads(content)
-            if not isinstance(result, list):
-                if isinstance(result, dict) and 'categorizations' in result:
-                    result = result['categorizations']
-                elif isinstance(result, dict) and len(result) == 1:
-                    result = list(result.values())[0]
-                else:
-                    return []
-            
-            return result
+            reply = complete(prompt, schema=CATEGORIZATION_SCHEMA, model_role='categorize_claude')
+            return resolve_off_taxonomy(batch, reply['parsed'], taxonomy, 'categorize_claude')
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
@@ -147,5 +121,6 @@ with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             
             pbar.update(1)
 
+print_snap_summary('categorize_claude')
 print("\n✓ Claude processing complete!")
 print(f"Results: {output_file}")
@@ -3,14 +3,14 @@
 Run ONLY OpenAI categorization.
 """
 
-import os
 import json
-import re
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
 from tqdm import tqdm
+from llm_providers import complete
+from llm_categorization import CATEGORIZATION_SCHEMA, resolve_off_taxonomy, print_snap_summary
+from taxonomy import load_taxonomy
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -21,10 +21,6 @@ MAX_WORKERS = 6
 RESULTS_DIR = Path('../output/results')
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
-def load_taxonomy():
-    with open('../data/raw/census_survey_explorer_taxonomy.json', 'r') as f:
-        return json.load(f)['taxonomy']
-
 def load_questions():
     df = pd.read_csv('../data/raw/PublicSurveyQuestionsMap.csv')
     questions = []
@@ -73,45 +69,14 @@ Return a JSON array with one object per question, in the same order. Format:
 Return ONLY the JSON array, no other text."""
 
 def call_openai(batch, taxonomy, max_retries=5):
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
     prompt = create_prompt(batch, taxonomy)
     
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                model="gpt-5-mini",
-                messages=[
-                    {"role": "system", "content": "You are a precise data categorization assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            content = response.choices[0].message.content
-            
-            # Aggressive cleaning
-            content = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', content)
-            
-            try:
-                result = json.loads(content)
-            except json.JSONDecodeError:
-                start = content.find('[')
-                end = content.rfind(']')
-                if start != -1 and end != -1:
-                    array_str = content[start:end+1]
-                    array_str = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', array_str)
-                    result = json.loads(array_str)
-                else:
-                    raise
-            
-            if not isinstance(result, list):
-                if isinstance(result, dict) and 'categorizations' in result:
-                    result = result['categorizations']
-                elif isinstance(result, dict) and len(result) == 1:
-                    result = list(result.values())[0]
-                else:
-                    return []
-            
-            return result
+            reply = complete(prompt, schema=CATEGORIZATION_SCHEMA, model_role='categorize_openai',
+                             system="You are a precise data categorization assistant.")
+            return resolve_off_taxonomy(batch, reply['parsed'], taxonomy, 'categorize_openai',
+                                        system="You are a precise data categorization assistant.")
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
@@ -166,5 +131,6 @@ with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
 if failed_batches:
     raise Exception(f"Failed to categorize {len(failed_batches)} batches: {failed_batches[:10]}")
 
+print_snap_summary('categorize_openai')
 print("\n✓ OpenAI processing complete!")
 print(f"Results: {output_file}")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Hierarchical clustering shared by the heatmap, survey clusters and
+question-level clustering, cached by input hash.
+
+The heatmap ran SciPy linkage() on the dense matrix for surveys and for
+concepts (and again for fcluster), and notebook 03 ran
+AgglomerativeClustering over a dense N × N question similarity matrix.
+Both are O(N²) in memory. cluster_linkage() picks by size:
+
+- up to DENSE_MAX_ITEMS items: exact SciPy linkage (nearest-neighbour
+  chain for ward/average/complete; condensed distances only) with optimal
+  leaf ordering up to OLO_MAX_ITEMS
+- above: the merge tree is built on a KNN_NEIGHBORS nearest-neighbour
+  graph (scikit-learn connectivity-constrained agglomeration), O(N·k)
+  memory; merges are restricted to graph neighbours, an approximation
+  that keeps near-duplicates together
+
+Results (linkage matrix Z and leaf order) are cached under
+LINKAGE_CACHE_DIR keyed by a hash of the data and parameters, so the
+heatmap, 2_survey_clusters.csv and reruns share one computation.
+
+Usage:
+    python clustering.py --questions --threshold 0.9    # Question clusters from embeddings
+"""
+
+import argparse
+import hashlib
+import pickle
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import NamedTuple
+from scipy.cluster.hierarchy import fcluster, leaves_list, linkage, optimal_leaf_ordering
+
+# Configuration
+LINKAGE_CACHE_DIR = Path('../output/cache/linkage')
+DENSE_MAX_ITEMS = 5000
+OLO_MAX_ITEMS = 2000
+KNN_NEIGHBORS = 15
+EMBEDDINGS_PATH = Path('../data/processed/embeddings/embeddings_with_metadata.pkl')
+QUESTION_CLUSTERS_FILE = Path('../output/clusters/question_clusters.csv')
+
+class Linkage(NamedTuple):
+    Z: np.ndarray        # SciPy linkage matrix
+    leaves: np.ndarray   # Leaf order for display (optimal when computed)
+    method: str          # 'dense' | 'dense+olo' | 'knn'
+
+def _cache_key(X: np.ndarray, method: str, metric: str, optimal_ordering: bool) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{method}|{metric}|{optimal_ordering}|{X.shape}|{DENSE_MAX_ITEMS}|{KNN_NEIGHBORS}".encode())
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:32]
+
+def _knn_linkage(X: np.ndarray, method: str, metric: str) -> np.ndarray:
+    """Linkage matrix from agglomeration constrained to a kNN graph (sparse, O(N·k))."""
+    from sklearn.cluster import AgglomerativeClustering
+    from sklearn.neighbors import kneighbors_graph
+
+    n = len(X)
+    graph = kneighbors_graph(X, n_neighbors=min(KNN_NEIGHBORS, n - 1), metric=metric, include_self=False)
+    model = AgglomerativeClustering(
+        n_clusters=1, linkage=method, metric=metric, connectivity=graph,
+        compute_full_tree=True, compute_distances=True
+    ).fit(X)
+
+    children = model.children_
+    sizes = np.ones(2 * n - 1, dtype=np.int64)
+    for i, (a, b) in enumerate(children):
+        sizes[n + i] = sizes[a] + sizes[b]
+    # Graph constraints can produce small inversions; dendrograms and fcluster need monotone heights
+    heights = np.maximum.accumulate(model.distances_)
+    return np.column_stack([children, heights, sizes[n:]]).astype(np.float64)
+
+def cluster_linkage(X, method: str = 'ward', metric: str = 'euclidean', optimal_ordering: bool = True,
+                    cache: bool = True) -> Linkage:
+    """
+    Hierarchical clustering of the rows of X (cached by content).
+
+    method is a SciPy/scikit-learn linkage ('ward' needs metric='euclidean').
+    """
+    X = np.asarray(X, dtype=np.float64)
+    n = len(X)
+    if n < 2:
+        return Linkage(np.zeros((0, 4)), np.arange(n), 'dense')
+
+    path = LINKAGE_CACHE_DIR / f"{_cache_key(X, method, metric, optimal_ordering)}.npz"
+    if cache and path.exists():
+        with np.load(path, allow_pickle=False) as f:
+            return Linkage(f['Z'], f['leaves'], str(f['method']))
+
+    if n <= DENSE_MAX_ITEMS:
+        Z = linkage(X, method=method, metric=metric)
+        kind = 'dense'
+        if optimal_ordering and n <= OLO_MAX_ITEMS:
+            Z = optimal_leaf_ordering(Z, X, metric=metric)
+            kind = 'dense+olo'
+    else:
+        Z = _knn_linkage(X, method, metric)
+        kind = 'knn'
+    result = Linkage(Z, leaves_list(Z), kind)
+
+    if cache:
+        LINKAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp.npz')
+        np.savez_compressed(tmp, Z=result.Z, leaves=result.leaves, method=np.array(kind))
+        tmp.replace(path)
+    return result
+
+def flat_clusters(result: Linkage, n_clusters: int = None, distance: float = None) -> np.ndarray:
+    """Cluster labels (1..k) cut at n_clusters clusters or at a merge distance."""
+    if len(result.Z) == 0:
+        return np.ones(len(result.leaves), dtype=np.int32)
+    if n_clusters is not None:
+        return fcluster(result.Z, t=n_clusters, criterion='maxclust')
+    return fcluster(result.Z, t=distance, criterion='distance')
+
+def question_clusters(embeddings: np.ndarray, similarity_threshold: float) -> np.ndarray:
+    """
+    Average-linkage cosine clusters of question embeddings: questions merge
+    while their average similarity stays >= similarity_threshold.
+    """
+    result = cluster_linkage(embeddings, method='average', metric='cosine', optimal_ordering=False)
+    return flat_clusters(result, distance=1 - similarity_threshold)
+
+def main():
+    parser = argparse.ArgumentParser(description='Hierarchical clustering of question embeddings')
+    parser.add_argument('--questions', action='store_true', help='Cluster question embeddings')
+    parser.add_argument('--threshold', type=float, default=0.9, help='Minimum average cosine similarity')
+    args = parser.parse_args()
+
+    if not args.questions:
+        print(__doc__)
+        return
+    if not EMBEDDINGS_PATH.exists():
+        print(f"ERROR: {EMBEDDINGS_PATH} not found (run notebook 02 first)")
+        return
+
+    with open(EMBEDDINGS_PATH, 'rb') as f:
+        data = pickle.load(f)
+    embeddings = np.asarray(data['embeddings'])
+    labels = question_clusters(embeddings, args.threshold)
+
+    clusters = pd.DataFrame({'question_id': data['question_ids'], 'cluster': labels})
+    QUESTION_CLUSTERS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    clusters.to_csv(QUESTION_CLUSTERS_FILE, index=False)
+
+    sizes = clusters['cluster'].value_counts()
+    print(f"  {len(embeddings):,} questions -> {len(sizes):,} clusters at similarity >= {args.threshold}")
+    print(f"  Singletons: {(sizes == 1).sum():,}; largest cluster: {sizes.max():,}")
+    print(f"  ✓ {QUESTION_CLUSTERS_FILE}")
+
+if __name__ == '__main__':
+    main()
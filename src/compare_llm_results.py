@@ -6,31 +6,24 @@ Analyzes agreement, confidence correlations, and systematic differences.
 Generates tables, statistics, and visualizations.
 """
 
-import json
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.metrics import cohen_kappa_score, confusion_matrix
+from sklearn.metrics import cohen_kappa_score
 from collections import Counter
+from results_store import load_results, merge_results
+from analytics_store import save_table, register_results_views
+from concept_codec import load_codec
 
 # Configuration
-RESULTS_DIR = Path('../output/results')
 OUTPUT_DIR = Path('../output/comparison')
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 sns.set_style('whitegrid')
 plt.rcParams['figure.figsize'] = (14, 10)
 
-def load_results(model: str) -> pd.DataFrame:
-    """Load results from JSONL file."""
-    results = []
-    with open(RESULTS_DIR / f'results_{model}.jsonl', 'r') as f:
-        for line in f:
-            results.append(json.loads(line))
-    return pd.DataFrame(results)
-
 def main():
     print("="*70)
     print("LLM CATEGORIZATION COMPARISON")
@@ -38,6 +31,7 @@ def main():
     
     # Load results
     print("\n1. Loading results...")
+    # All columns: full_comparison.csv carries them through to arbitration
     openai_df = load_results('openai')
     claude_df = load_results('claude')
     print(f"   OpenAI: {len(openai_df)} categorizations")
@@ -45,11 +39,7 @@ def main():
     
     # Merge on question ID
     print("\n2. Merging results...")
-    merged = openai_df.merge(
-        claude_df, 
-        on='id', 
-        suffixes=('_openai', '_claude')
-    )
+    merged = merge_results(openai_df, claude_df)
     print(f"   Merged: {len(merged)} questions")
     
     # Filter out any None values
@@ -80,12 +70,12 @@ def main():
     subtopic_agreement = subtopic_match / len(merged) * 100
     print(f"Primary Subtopic Agreement: {subtopic_agreement:.2f}% ({subtopic_match}/{len(merged)})")
     
-    # Cohen's Kappa for topics
-    kappa_topic = cohen_kappa_score(merged['primary_topic_openai'], merged['primary_topic_claude'])
+    # Cohen's Kappa for topics (on the shared integer codes)
+    kappa_topic = cohen_kappa_score(merged['primary_topic_openai'].cat.codes, merged['primary_topic_claude'].cat.codes)
     print(f"\nCohen's Kappa (Topics): {kappa_topic:.3f}")
     
     # Cohen's Kappa for subtopics
-    kappa_subtopic = cohen_kappa_score(merged['primary_subtopic_openai'], merged['primary_subtopic_claude'])
+    kappa_subtopic = cohen_kappa_score(merged['primary_subtopic_openai'].cat.codes, merged['primary_subtopic_claude'].cat.codes)
     print(f"Cohen's Kappa (Subtopics): {kappa_subtopic:.3f}")
     
     # === CONFIDENCE ANALYSIS ===
@@ -117,12 +107,12 @@ def main():
     print("="*70)
     
     print("\nOpenAI Topic Distribution:")
-    openai_topics = merged['primary_topic_openai'].value_counts()
+    openai_topics = load_codec().counts(merged['primary_topic_openai'])
     for topic, count in openai_topics.items():
         print(f"  {topic}: {count} ({count/len(merged)*100:.1f}%)")
     
     print("\nClaude Topic Distribution:")
-    claude_topics = merged['primary_topic_claude'].value_counts()
+    claude_topics = load_codec().counts(merged['primary_topic_claude'])
     for topic, count in claude_topics.items():
         print(f"  {topic}: {count} ({count/len(merged)*100:.1f}%)")
     
@@ -136,7 +126,7 @@ def main():
     
     if len(disagreements) > 0:
         print("\nTop 10 Disagreement Patterns:")
-        disagreement_patterns = disagreements.groupby(['primary_topic_openai', 'primary_topic_claude']).size()
+        disagreement_patterns = disagreements.groupby(['primary_topic_openai', 'primary_topic_claude'], observed=True).size()
         disagreement_patterns = disagreement_patterns.sort_values(ascending=False).head(10)
         for (openai_topic, claude_topic), count in disagreement_patterns.items():
             print(f"  OpenAI:{openai_topic} vs Claude:{claude_topic} - {count} times")
@@ -199,8 +189,9 @@ def main():
         disagreements_export.to_csv(OUTPUT_DIR / 'disagreements.csv', index=False)
         print(f"   Saved: disagreements.csv ({len(disagreements)} rows)")
     
-    # Full comparison
-    merged.to_csv(OUTPUT_DIR / 'full_comparison.csv', index=False)
+    # Full comparison (analytical store table + CSV export)
+    save_table('comparison', merged)
+    register_results_views()
     print(f"   Saved: full_comparison.csv")
     
     # === GENERATE VISUALIZATIONS ===
@@ -213,11 +204,7 @@ def main():
     
     # Topic confusion matrix
     topics = sorted(set(merged['primary_topic_openai']) | set(merged['primary_topic_claude']))
-    cm = confusion_matrix(
-        merged['primary_topic_openai'], 
-        merged['primary_topic_claude'],
-        labels=topics
-    )
+    cm = load_codec().confusion(merged['primary_topic_openai'], merged['primary_topic_claude'], topics)
     
     sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
                 xticklabels=topics, yticklabels=topics, ax=axes[0, 0])
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Taxonomy-backed integer codes for topics, subtopics and concepts.
+
+Concepts used to be carried as 'Topic.Subtopic' strings built row by row,
+so agreement checks, groupbys and pivots all ran on Python strings. The
+codec gives every topic, subtopic and (topic, subtopic) concept a small
+integer code, held as a pandas categorical:
+
+- codes follow taxonomy order, so a taxonomy concept has the same code in
+  every table and every run
+- answers outside the taxonomy ('Unknown', 'N/A', invented subtopics) are
+  appended after the taxonomy codes, never dropped
+- concepts are encoded from the topic/subtopic codes of the unique pairs
+  only; the label is built once per distinct concept, not per row
+
+Labels come back only at presentation time: counts() and confusion()
+return results computed on the codes.
+"""
+
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Dict, List
+from taxonomy import load_taxonomy
+
+def _extended(base: List[str], *series: pd.Series) -> pd.CategoricalDtype:
+    """Categorical dtype: base values first (stable codes), then any other observed values sorted."""
+    known = set(base)
+    extra = set()
+    for s in series:
+        values = s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else s.dropna().unique()
+        extra.update(str(v) for v in values if v not in known)
+    return pd.CategoricalDtype(list(base) + sorted(extra))
+
+class ConceptCodec:
+    """Integer codes for one taxonomy."""
+
+    def __init__(self, taxonomy: Dict[str, List[str]]):
+        self.topics = list(taxonomy)
+        self.subtopics = list(dict.fromkeys(s for subtopics in taxonomy.values() for s in subtopics))
+        self.concepts = list(dict.fromkeys(
+            f"{topic}.{subtopic}" for topic, subtopics in taxonomy.items() for subtopic in subtopics
+        ))
+
+    def topic_dtype(self, *series: pd.Series) -> pd.CategoricalDtype:
+        """Topic categories covering the taxonomy plus anything in `series`."""
+        return _extended(self.topics, *series)
+
+    def subtopic_dtype(self, *series: pd.Series) -> pd.CategoricalDtype:
+        return _extended(self.subtopics, *series)
+
+    def encode_topics(self, *series: pd.Series) -> List[pd.Series]:
+        """Re-code topic columns onto one shared dtype (so == compares codes)."""
+        dtype = self.topic_dtype(*series)
+        return [s.astype(object).astype(dtype) for s in series]
+
+    def encode_subtopics(self, *series: pd.Series) -> List[pd.Series]:
+        dtype = self.subtopic_dtype(*series)
+        return [s.astype(object).astype(dtype) for s in series]
+
+    def encode_concepts(self, topic: pd.Series, subtopic: pd.Series) -> pd.Series:
+        """
+        Concept codes for topic/subtopic columns (strings or categoricals).
+
+        Missing topic or subtopic gives a missing concept, as string
+        concatenation did. Keeps the index of `topic`.
+        """
+        index = topic.index
+        topic = pd.Categorical(topic)
+        subtopic = pd.Categorical(subtopic)
+        width = len(subtopic.categories) + 1
+        pair = topic.codes.astype(np.int64) * width + subtopic.codes
+        missing = (topic.codes < 0) | (subtopic.codes < 0)
+
+        pairs, inverse = np.unique(np.where(missing, -1, pair), return_inverse=True)
+        labels = [
+            None if p < 0 else f"{topic.categories[p // width]}.{subtopic.categories[p % width]}"
+            for p in pairs
+        ]
+        dtype = _extended(self.concepts, pd.Series([l for l in labels if l is not None], dtype=object))
+        label_codes = dtype.categories.get_indexer([l if l is not None else '' for l in labels])
+        label_codes[[l is None for l in labels]] = -1
+
+        codes = label_codes[inverse.reshape(-1)]
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=index)
+
+    @staticmethod
+    def counts(values: pd.Series) -> pd.Series:
+        """
+        Like value_counts() but computed on the codes and without unobserved
+        categories; index is decoded labels, sorted by count descending with
+        ties in order of first appearance (as value_counts() orders them).
+        """
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        codes = values.cat.codes.to_numpy()
+        codes = codes[codes >= 0]
+        counted = np.bincount(codes, minlength=len(values.cat.categories))
+        observed, first = np.unique(codes, return_index=True)
+        order = observed[np.lexsort((first, -counted[observed]))]
+        return pd.Series(counted[order], index=pd.Index(values.cat.categories[order], dtype=object),
+                         name='count')
+
+    @staticmethod
+    def confusion(a: pd.Series, b: pd.Series, labels: List[str]) -> np.ndarray:
+        """Confusion matrix of two categorical columns sharing one dtype, rows/cols in `labels` order."""
+        categories = a.cat.categories
+        a_codes = a.cat.codes.to_numpy()
+        b_codes = b.cat.codes.to_numpy()
+        keep = (a_codes >= 0) & (b_codes >= 0)
+        n = len(categories)
+        full = np.bincount(a_codes[keep] * n + b_codes[keep], minlength=n * n).reshape(n, n)
+        index = categories.get_indexer(labels)
+        return full[np.ix_(index, index)]
+
+@lru_cache(maxsize=None)
+def load_codec() -> ConceptCodec:
+    """Codec for the Census taxonomy (built once per process)."""
+    return ConceptCodec(load_taxonomy())
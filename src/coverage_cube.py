@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Materialized coverage cube over (survey, topic, subtopic, decision_method,
+confidence_tier), maintained by deltas.
+
+The survey × concept matrix, the concept coverage table, the treemap and
+Sankey inputs and the unique/orphan concept lists were each recomputed
+from master_dataset.csv by a separate script. They are all rollups of one
+cube, stored in the analytical store:
+
+    cube        survey, topic, subtopic, decision_method, confidence_tier,
+                questions    questions whose primary_survey is `survey`
+                memberships  question-survey pairs (a question counts in
+                             every survey that asks it)
+    cube_facts  one row per question: its cube coordinates plus the
+                surveys asking it (JSON list text)
+
+update_cube() compares a new master frame with cube_facts and applies
+only the difference: cells of changed or removed questions are
+subtracted, cells of changed or new questions added. A question's old
+cells are subtracted from the surveys stored in its fact row, not from
+the current survey map, so a question moving between surveys (or a
+shrinking map) leaves no stale membership. A relabel of a few questions
+touches a few cells, not the corpus. Summing `questions` over
+surveys gives question counts; `memberships` gives the survey matrix.
+Memberships per cell are the sparse product incidence.T @ assignment
+(survey_incidence) over the survey lists stored in the fact rows.
+
+Usage:
+    python coverage_cube.py            # Update the cube from the stored master table
+    python coverage_cube.py --rebuild  # Rebuild it from scratch
+"""
+
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from typing import List, Tuple
+from scipy import sparse
+import analytics_store
+from survey_incidence import SurveyIncidence, load_incidence
+
+# Configuration
+DIMENSIONS = ['survey', 'topic', 'subtopic', 'decision_method', 'confidence_tier']
+MEASURES = ['questions', 'memberships']
+FACT_COLUMNS = ['id', 'primary_survey', 'topic', 'subtopic', 'decision_method', 'confidence_tier', 'surveys']
+UNDERSAMPLED_MAX = 4  # Concepts with at most this many questions are under-sampled
+MASTER_COLUMNS = ['id', 'primary_survey', 'final_topic', 'final_subtopic', 'decision_method', 'confidence_tier']
+
+def _dimension(values: pd.Series) -> pd.Series:
+    """Object column with None for missing (so NaN and None compare and group alike)."""
+    values = values.astype(object)
+    return values.where(values.notna(), None)
+
+def _survey_lists(incidence: SurveyIncidence, ids: np.ndarray) -> list:
+    """JSON list of the surveys asking each question (in survey map order)."""
+    rows = incidence.matrix[ids]
+    rows.sort_indices()
+    names = np.asarray(incidence.surveys, dtype=object)
+    return [json.dumps(list(names[rows.indices[start:end]]))
+            for start, end in zip(rows.indptr[:-1], rows.indptr[1:])]
+
+def question_facts(master_df: pd.DataFrame, incidence: SurveyIncidence = None) -> pd.DataFrame:
+    """Cube coordinates of each question in master (confidence_tier may be absent)."""
+    incidence = incidence or load_incidence()
+    ids = master_df['id'].to_numpy(dtype=np.int64)
+    if len(ids) and (ids.min() < 0 or ids.max() >= incidence.n_questions):
+        raise ValueError(f"question ids outside the survey map (0..{incidence.n_questions - 1})")
+    missing = pd.Series(None, index=master_df.index, dtype=object)
+    return pd.DataFrame({
+        'id': ids,
+        'primary_survey': _dimension(master_df['primary_survey']),
+        'topic': _dimension(master_df['final_topic']),
+        'subtopic': _dimension(master_df['final_subtopic']),
+        'decision_method': _dimension(master_df['decision_method']),
+        'confidence_tier': _dimension(master_df.get('confidence_tier', missing)),
+        'surveys': _survey_lists(incidence, ids),
+    }).reset_index(drop=True)
+
+def _aggregate(cells: pd.DataFrame) -> pd.DataFrame:
+    """Sum measures per cell; drop empty cells; sort by dimensions."""
+    if len(cells) == 0:
+        return pd.DataFrame(columns=DIMENSIONS + MEASURES).astype({m: np.int64 for m in MEASURES})
+    cube = cells.groupby(DIMENSIONS, dropna=False, sort=False)[MEASURES].sum().reset_index()
+    cube = cube[(cube[MEASURES] != 0).any(axis=1)]
+    for column in DIMENSIONS:
+        cube[column] = _dimension(cube[column])
+    return cube.sort_values(DIMENSIONS, na_position='first', kind='stable').reset_index(drop=True)
+
+def _fact_incidence(facts: pd.DataFrame) -> SurveyIncidence:
+    """Incidence of the surveys stored in each fact row (rows are fact positions, surveys sorted)."""
+    surveys = [json.loads(text) for text in facts['surveys']]
+    names = sorted({name for row in surveys for name in row})
+    column = {name: i for i, name in enumerate(names)}
+    rows = np.repeat(np.arange(len(facts)), [len(row) for row in surveys])
+    cols = np.array([column[name] for row in surveys for name in row], dtype=np.int64)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(len(facts), len(names)))
+    return SurveyIncidence(matrix, names)
+
+def _contributions(facts: pd.DataFrame, sign: int = 1) -> pd.DataFrame:
+    """
+    Cube cells of `facts`: one question in its primary survey, and per
+    survey the memberships of each (topic, subtopic, decision_method,
+    confidence_tier) cell as the sparse product incidence.T @ assignment.
+    """
+    primary = facts[DIMENSIONS[1:]].assign(survey=facts['primary_survey'], questions=sign, memberships=0)
+    cells = facts.groupby(DIMENSIONS[1:], dropna=False, sort=False).ngroup().to_numpy()
+    _, first = np.unique(cells, return_index=True)
+    incidence = _fact_incidence(facts)
+    counts = incidence.survey_concepts(np.arange(len(facts)),
+                                       pd.Series(pd.Categorical(cells, categories=range(len(first))))).tocoo()
+    members = facts.iloc[first[counts.col]][DIMENSIONS[1:]].assign(
+        survey=np.asarray(incidence.surveys, dtype=object)[counts.row], questions=0,
+        memberships=sign * counts.data.astype(np.int64)
+    )
+    return pd.concat([primary, members], ignore_index=True)[DIMENSIONS + MEASURES]
+
+def build_cube(facts: pd.DataFrame) -> pd.DataFrame:
+    return _aggregate(_contributions(facts))
+
+def changed_facts(old: pd.DataFrame, new: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(old rows to subtract, new rows to add): questions removed, added, or with any coordinate changed."""
+    merged = old.merge(new, on='id', how='outer', suffixes=('_old', '_new'), indicator=True)
+    same = merged['_merge'] == 'both'
+    for column in FACT_COLUMNS[1:]:
+        a, b = merged[f'{column}_old'], merged[f'{column}_new']
+        same &= (a == b) | (a.isna() & b.isna())
+    old_ids = merged.loc[~same & (merged['_merge'] != 'right_only'), 'id']
+    new_ids = merged.loc[~same & (merged['_merge'] != 'left_only'), 'id']
+    return old[old['id'].isin(old_ids)], new[new['id'].isin(new_ids)]
+
+def apply_delta(cube: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+    """Cube after subtracting `removed` questions' cells (as stored) and adding `added` ones."""
+    delta = pd.concat([_contributions(removed, sign=-1), _contributions(added)], ignore_index=True)
+    if len(delta) == 0:
+        return cube
+    return _aggregate(pd.concat([cube[DIMENSIONS + MEASURES], delta], ignore_index=True))
+
+def _read_stored(name: str, columns: List[str]) -> pd.DataFrame:
+    """Stored cube/facts table, or None if it is missing or has another layout."""
+    if not (analytics_store.has_table(name) or analytics_store.EXPORTS[name].exists()):
+        return None
+    stored = analytics_store.read_table(name)
+    if any(column not in stored.columns for column in columns):
+        return None
+    for column in stored.columns:
+        if column not in MEASURES + ['id', 'surveys']:
+            stored[column] = _dimension(stored[column])
+    return stored
+
+def _read_master() -> pd.DataFrame:
+    """Master columns the cube needs (confidence_tier only exists after arbitration)."""
+    master = analytics_store.read_table('master')
+    return master[[c for c in MASTER_COLUMNS if c in master.columns]]
+
+def update_cube(master_df: pd.DataFrame, rebuild: bool = False) -> pd.DataFrame:
+    """Bring the stored cube up to date with master_df (by deltas unless rebuild) and save it."""
+    facts = question_facts(master_df)
+    old_facts = None if rebuild else _read_stored('cube_facts', FACT_COLUMNS)
+    cube = None if old_facts is None else _read_stored('cube', DIMENSIONS + MEASURES)
+
+    if cube is None:
+        cube = build_cube(facts)
+        print(f"   Built coverage cube: {len(cube):,} cells from {len(facts):,} questions")
+    else:
+        removed, added = changed_facts(old_facts, facts)
+        cube = apply_delta(cube, removed, added)
+        print(f"   Updated coverage cube: {len(added):,} questions added/changed, "
+              f"{len(removed):,} removed/changed -> {len(cube):,} cells")
+
+    analytics_store.save_table('cube', cube)
+    analytics_store.save_table('cube_facts', facts)
+    return cube
+
+def load_cube() -> pd.DataFrame:
+    """Stored cube (brought up to date from the master table first if missing)."""
+    cube = _read_stored('cube', DIMENSIONS + MEASURES)
+    if cube is None:
+        cube = update_cube(_read_master())
+    return cube
+
+# Rollups
+
+def rollup(cube: pd.DataFrame, by: List[str], measure: str = 'questions',
+           exclude_unknown: bool = False) -> pd.Series:
+    """
+    Sum of `measure` by the `by` dimensions over categorized cells (topic
+    present; also not 'Unknown' if exclude_unknown), nonzero only, sorted.
+    """
+    cells = cube[cube['topic'].notna()]
+    if exclude_unknown:
+        cells = cells[cells['topic'] != 'Unknown']
+    cells = cells.dropna(subset=by)
+    totals = cells.groupby(by, sort=True)[measure].sum()
+    return totals[totals != 0]
+
+def survey_concept_matrix(cube: pd.DataFrame, exclude_unknown: bool = False) -> pd.DataFrame:
+    """Survey × concept question counts (every survey asking a question), both axes sorted."""
+    counts = rollup(cube, ['survey', 'topic', 'subtopic'], 'memberships', exclude_unknown).reset_index()
+    counts['concept'] = counts['topic'] + '.' + counts['subtopic']
+    matrix = counts.pivot_table(index='survey', columns='concept', values='memberships',
+                                aggfunc='sum', fill_value=0)
+    matrix.columns.name = 'concept'
+    return matrix.sort_index().sort_index(axis=1).astype(np.int64)
+
+def concept_coverage(cube: pd.DataFrame, exclude_unknown: bool = False) -> pd.DataFrame:
+    """Questions per concept: final_topic, final_subtopic, count (sorted by topic, subtopic)."""
+    counts = rollup(cube, ['topic', 'subtopic'], 'questions', exclude_unknown)
+    return counts.rename_axis(['final_topic', 'final_subtopic']).reset_index(name='count')
+
+def concept_totals(cube: pd.DataFrame, exclude_unknown: bool = False) -> pd.Series:
+    """Questions per 'Topic.Subtopic' concept, most first (ties by label)."""
+    coverage = concept_coverage(cube, exclude_unknown)
+    counts = pd.Series(coverage['count'].to_numpy(),
+                       index=pd.Index(coverage['final_topic'] + '.' + coverage['final_subtopic'], dtype=object),
+                       name='count')
+    return counts.sort_values(ascending=False, kind='stable')
+
+def orphaned_concepts(cube: pd.DataFrame, all_concepts: List[str]) -> pd.DataFrame:
+    """Taxonomy concepts with no questions: concept, topic, subtopic, question_count (sorted by concept)."""
+    covered = set(concept_totals(cube, exclude_unknown=True).index)
+    concepts = sorted(set(all_concepts) - covered)
+    return pd.DataFrame({
+        'concept': concepts,
+        'topic': [c.split('.', 1)[0] for c in concepts],
+        'subtopic': [c.split('.', 1)[1] for c in concepts],
+        'question_count': np.zeros(len(concepts), dtype=np.int64),
+    })
+
+def undersampled_concepts(cube: pd.DataFrame, max_questions: int = UNDERSAMPLED_MAX) -> pd.DataFrame:
+    """Concepts with 1..max_questions questions: concept, question_count, topic, subtopic (fewest first)."""
+    coverage = concept_coverage(cube, exclude_unknown=True)
+    coverage = coverage[coverage['count'] <= max_questions]
+    table = pd.DataFrame({
+        'concept': coverage['final_topic'] + '.' + coverage['final_subtopic'],
+        'question_count': coverage['count'].astype(np.int64),
+        'topic': coverage['final_topic'],
+        'subtopic': coverage['final_subtopic'],
+    })
+    return table.sort_values(['question_count', 'concept'], kind='stable').reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the coverage cube from the master table')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild instead of applying deltas')
+    args = parser.parse_args()
+
+    cube = update_cube(_read_master(), rebuild=args.rebuild)
+    print(f"    Questions: {int(cube['questions'].sum()):,}")
+    print(f"    Question-survey pairs: {int(cube['memberships'].sum()):,}")
+    print(f"    Concepts covered: {len(rollup(cube, ['topic', 'subtopic'])):,}")
+    by_method = cube.groupby('decision_method')['questions'].sum()
+    for method, count in by_method.sort_values(ascending=False, kind='stable').items():
+        print(f"    {method}: {count:,}")
+
+if __name__ == '__main__':
+    main()
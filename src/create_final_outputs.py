@@ -14,13 +14,18 @@ Outputs:
 - README.md with key findings
 """
 
-import json
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import matplotlib.pyplot as plt
 import seaborn as sns
 from collections import Counter
+from disagreement_resolution import agreement_mask, to_resolution_frame, load_resolutions
+from results_store import load_merged
+import analytics_store
+from concept_codec import load_codec
+from survey_incidence import load_incidence
+from coverage_cube import build_cube, question_facts, update_cube, survey_concept_matrix
 
 # Configuration
 OUTPUT_DIR = Path('../output/final')
@@ -30,81 +35,53 @@ sns.set_style('whitegrid')
 plt.rcParams['figure.figsize'] = (16, 10)
 
 def load_initial_results() -> pd.DataFrame:
-    """Load initial categorization results."""
-    openai = []
-    with open('../output/results/results_openai.jsonl', 'r') as f:
-        for line in f:
-            openai.append(json.loads(line))
-    
-    claude = []
-    with open('../output/results/results_claude.jsonl', 'r') as f:
-        for line in f:
-            claude.append(json.loads(line))
-    
-    openai_df = pd.DataFrame(openai)
-    claude_df = pd.DataFrame(claude)
-    
-    merged = openai_df.merge(claude_df, on='id', suffixes=('_openai', '_claude'))
-    return merged
+    """Load initial categorization results (all columns; they go into master_dataset.csv)."""
+    return load_merged()
+
+# Resolution columns reconcile_categorizations() uses
+RESOLUTION_COLUMNS = [
+    'id', 'primary_topic', 'primary_subtopic', 'primary_confidence',
+    'secondary_primary_topic', 'secondary_primary_subtopic',
+    'is_dual_modal', 'decision', 'confidence_tier'
+]
 
 def load_arbitration_results() -> pd.DataFrame:
-    """Load arbitration results if they exist."""
+    """Load arbitration results (typed resolution frame) if they exist."""
+    if analytics_store.has_table('resolutions'):
+        return to_resolution_frame(analytics_store.read_table('resolutions', RESOLUTION_COLUMNS))
     arb_path = Path('../output/arbitration_final/all_disagreement_resolutions.csv')
     if arb_path.exists():
-        return pd.read_csv(arb_path)
+        return load_resolutions(arb_path)
     return None
 
 def load_questions() -> pd.DataFrame:
     """Load original questions."""
-    df = pd.read_csv('../data/raw/PublicSurveyQuestionsMap.csv')
-    
-    questions = []
-    for idx, row in df.iterrows():
-        question = row['Question']
-        surveys = [col for col in df.columns if col != 'Question' and pd.notna(row[col])]
-        
-        questions.append({
-            'id': idx,
-            'question': question,
-            'surveys': ','.join(surveys),
-            'survey_count': len(surveys),
-            'primary_survey': surveys[0] if surveys else 'Unknown'
-        })
-    
-    return pd.DataFrame(questions)
+    return analytics_store.load_questions(['id', 'question', 'surveys', 'survey_count', 'primary_survey'])
 
 def reconcile_categorizations(initial_df: pd.DataFrame, arbitration_df: pd.DataFrame = None) -> pd.DataFrame:
-    """Create master dataset with reconciled categorizations."""
+    """
+    Create master dataset with reconciled categorizations.
+    
+    Decision precedence (first match wins):
+    categorization_failed > agreement > arbitration decision > unresolved_disagreement
+    """
     
     master = initial_df.copy()
     
     # Add agreement flag
-    master['models_agree'] = (
-        master['primary_topic_openai'] == master['primary_topic_claude']
-    ) & (
-        master['primary_subtopic_openai'] == master['primary_subtopic_claude']
-    )
+    master['models_agree'] = agreement_mask(master)
     
-    # Initialize final categorization columns
-    master['final_topic'] = None
-    master['final_subtopic'] = None
-    master['decision_method'] = None
-    master['needs_human_review'] = False
-    
-    # For agreements, use the agreed-upon categorization
-    agreed_mask = master['models_agree'] & master['primary_topic_openai'].notna()
-    master.loc[agreed_mask, 'final_topic'] = master.loc[agreed_mask, 'primary_topic_openai']
-    master.loc[agreed_mask, 'final_subtopic'] = master.loc[agreed_mask, 'primary_subtopic_openai']
-    master.loc[agreed_mask, 'decision_method'] = 'agreement'
+    agreed = (master['models_agree'] & master['primary_topic_openai'].notna()).to_numpy()
+    failed = (master['primary_topic_openai'].isna() & master['primary_topic_claude'].isna()).to_numpy()
     
     # For disagreements, check if arbitration exists
     if arbitration_df is not None:
         # Merge arbitration results
-        arb_subset = arbitration_df[[
+        arb_subset = to_resolution_frame(arbitration_df)[[
             'id', 'primary_topic', 'primary_subtopic', 'primary_confidence',
             'secondary_primary_topic', 'secondary_primary_subtopic', 
             'is_dual_modal', 'decision', 'confidence_tier'
-        ]].copy()
+        ]].drop_duplicates('id')
         arb_subset.columns = [
             'id', 'arb_primary_topic', 'arb_primary_subtopic', 'arb_primary_conf',
             'arb_secondary_topic', 'arb_secondary_subtopic',
@@ -112,49 +89,60 @@ def reconcile_categorizations(initial_df: pd.DataFrame, arbitration_df: pd.DataF
         ]
         
         master = master.merge(arb_subset, on='id', how='left')
-        
-        # Use arbitration results where available
-        arbitrated_mask = master['arb_primary_topic'].notna() & ~master['models_agree']
-        master.loc[arbitrated_mask, 'final_topic'] = master.loc[arbitrated_mask, 'arb_primary_topic']
-        master.loc[arbitrated_mask, 'final_subtopic'] = master.loc[arbitrated_mask, 'arb_primary_subtopic']
-        master.loc[arbitrated_mask, 'secondary_primary_topic'] = master.loc[arbitrated_mask, 'arb_secondary_topic']
-        master.loc[arbitrated_mask, 'secondary_primary_subtopic'] = master.loc[arbitrated_mask, 'arb_secondary_subtopic']
-        master.loc[arbitrated_mask, 'is_dual_modal'] = master.loc[arbitrated_mask, 'arb_is_dual_modal'].fillna(False)
-        master.loc[arbitrated_mask, 'confidence_tier'] = master.loc[arbitrated_mask, 'arb_conf_tier']
-        
-        # Set decision method
-        master.loc[arbitrated_mask, 'decision_method'] = master.loc[arbitrated_mask, 'arb_decision']
+        arbitrated = (master['arb_primary_topic'].notna() & ~master['models_agree']).to_numpy()
+        arb_topic = master['arb_primary_topic'].astype(object)
+        arb_subtopic = master['arb_primary_subtopic'].astype(object)
+        arb_decision = master['arb_decision'].astype(object)
+    else:
+        arbitrated = np.zeros(len(master), dtype=bool)
+        arb_topic = arb_subtopic = arb_decision = pd.Series(None, index=master.index, dtype=object)
+    
+    # Final categorization: agreed answer, else arbitrated answer, else unresolved (None)
+    master['final_topic'] = np.select(
+        [agreed, arbitrated], [master['primary_topic_openai'].astype(object), arb_topic], default=None
+    )
+    master['final_subtopic'] = np.select(
+        [agreed, arbitrated], [master['primary_subtopic_openai'].astype(object), arb_subtopic], default=None
+    )
     
-    # For remaining disagreements (no arbitration), mark as needing review
-    unresolved_mask = master['final_topic'].isna() & ~master['models_agree']
-    master.loc[unresolved_mask, 'needs_human_review'] = True
-    master.loc[unresolved_mask, 'decision_method'] = 'unresolved_disagreement'
+    unresolved = ~agreed & ~arbitrated & ~master['models_agree'].to_numpy()
+    master['decision_method'] = np.select(
+        [failed, agreed, arbitrated, unresolved],
+        ['categorization_failed', 'agreement', arb_decision, 'unresolved_disagreement'],
+        default=None
+    )
+    master['needs_human_review'] = unresolved | failed
     
-    # Handle failures (both models returned None)
-    failure_mask = master['primary_topic_openai'].isna() & master['primary_topic_claude'].isna()
-    master.loc[failure_mask, 'needs_human_review'] = True
-    master.loc[failure_mask, 'decision_method'] = 'categorization_failed'
+    # Final answers are stored as taxonomy codes (decoded only for display/export)
+    codec = load_codec()
+    master['final_topic'] = master['final_topic'].astype(codec.topic_dtype(master['final_topic']))
+    master['final_subtopic'] = master['final_subtopic'].astype(codec.subtopic_dtype(master['final_subtopic']))
     
-    return master
+    if arbitration_df is not None:
+        # Arbitration-only fields (NaN where not arbitrated)
+        master['secondary_primary_topic'] = master['arb_secondary_topic'].astype(object).where(arbitrated)
+        master['secondary_primary_subtopic'] = master['arb_secondary_subtopic'].astype(object).where(arbitrated)
+        master['is_dual_modal'] = master['arb_is_dual_modal'].fillna(False).astype(object).where(arbitrated)
+        master['confidence_tier'] = master['arb_conf_tier'].astype(object).where(arbitrated)
+    
+    # Keep the historical column layout: final columns first, then arbitration merge, then extras
+    leading = list(initial_df.columns) + ['models_agree', 'final_topic', 'final_subtopic',
+                                          'decision_method', 'needs_human_review']
+    return master[leading + [c for c in master.columns if c not in leading]]
 
-def create_survey_concept_matrix(master_df: pd.DataFrame, questions_df: pd.DataFrame) -> pd.DataFrame:
-    """Create aggregated survey × concept matrix."""
-    
-    # Ensure primary_survey exists in master_df (merge if needed)
+def create_survey_concept_matrix(master_df: pd.DataFrame, questions_df: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Create aggregated survey × concept matrix.
+    
+    A question counts in every survey that asks it (memberships rollup
+    of the coverage cube), not only its primary_survey. Reconciled output
+    without primary_survey gets it from the questions table.
+    """
     if 'primary_survey' not in master_df.columns:
+        if questions_df is None:
+            questions_df = load_questions()
         master_df = master_df.merge(questions_df[['id', 'primary_survey']], on='id', how='left')
-    
-    # Filter to successfully categorized questions
-    valid = master_df[master_df['final_topic'].notna()].copy()
-    
-    # Create concept column
-    valid['concept'] = valid['final_topic'] + '.' + valid['final_subtopic']
-    
-    # Create pivot table
-    matrix = valid.groupby(['primary_survey', 'concept']).size().reset_index(name='count')
-    matrix_wide = matrix.pivot(index='primary_survey', columns='concept', values='count').fillna(0)
-    
-    return matrix_wide
+    return survey_concept_matrix(build_cube(question_facts(master_df)))
 
 def generate_summary_stats(master_df: pd.DataFrame, questions_df: pd.DataFrame):
     """Generate and print summary statistics."""
@@ -181,13 +169,13 @@ def generate_summary_stats(master_df: pd.DataFrame, questions_df: pd.DataFrame):
     # Topic distribution
     print("\nFinal topic distribution:")
     valid = master_df[master_df['final_topic'].notna()]
-    topic_counts = valid['final_topic'].value_counts()
+    topic_counts = load_codec().counts(valid['final_topic'])
     for topic, count in topic_counts.items():
         pct = count / len(valid) * 100
         print(f"  {topic}: {count:,} ({pct:.1f}%)")
     
-    # Survey coverage (master_df already has primary_survey merged)
-    survey_counts = master_df['primary_survey'].value_counts()
+    # Survey coverage (every survey a question is in)
+    survey_counts = load_incidence().survey_sizes(master_df['id'])
     print(f"\nSurveys represented: {len(survey_counts)}")
     print(f"Questions per survey (median): {survey_counts.median():.0f}")
     
@@ -199,6 +187,13 @@ def generate_summary_stats(master_df: pd.DataFrame, questions_df: pd.DataFrame):
         'surveys': len(survey_counts)
     }
 
+def load_visualization_inputs():
+    """create_visualizations() arguments from the stored outputs (for figure_build.py)."""
+    master_df = analytics_store.read_table('master', ['id', 'primary_survey', 'final_topic', 'final_subtopic',
+                                                       'decision_method'])
+    matrix_df = pd.read_csv(OUTPUT_DIR / 'survey_concept_matrix.csv', index_col=0)
+    return master_df, load_questions(), matrix_df
+
 def create_visualizations(master_df: pd.DataFrame, questions_df: pd.DataFrame, matrix_df: pd.DataFrame):
     """Generate summary visualizations."""
     
@@ -220,7 +215,7 @@ def create_visualizations(master_df: pd.DataFrame, questions_df: pd.DataFrame, m
     # 2. Topic distribution
     ax2 = fig.add_subplot(gs[0, 1])
     valid = master_df[master_df['final_topic'].notna()]
-    topic_counts = valid['final_topic'].value_counts()
+    topic_counts = load_codec().counts(valid['final_topic'])
     ax2.barh(range(len(topic_counts)), topic_counts.values, color='steelblue')
     ax2.set_yticks(range(len(topic_counts)))
     ax2.set_yticklabels(topic_counts.index)
@@ -231,8 +226,8 @@ def create_visualizations(master_df: pd.DataFrame, questions_df: pd.DataFrame, m
     # 3. Top 10 subtopics
     ax3 = fig.add_subplot(gs[0, 2])
     valid = valid.copy()  # Avoid SettingWithCopyWarning
-    valid['concept'] = valid['final_topic'] + '.' + valid['final_subtopic']
-    concept_counts = valid['concept'].value_counts().head(10)
+    valid['concept'] = load_codec().encode_concepts(valid['final_topic'], valid['final_subtopic'])
+    concept_counts = load_codec().counts(valid['concept']).head(10)
     ax3.barh(range(len(concept_counts)), concept_counts.values, color='coral')
     ax3.set_yticks(range(len(concept_counts)))
     ax3.set_yticklabels([c.replace('.', '\n') for c in concept_counts.index], fontsize=9)
@@ -242,7 +237,7 @@ def create_visualizations(master_df: pd.DataFrame, questions_df: pd.DataFrame, m
     
     # 4. Survey size distribution
     ax4 = fig.add_subplot(gs[1, 0])
-    survey_sizes = master_df['primary_survey'].value_counts()
+    survey_sizes = load_incidence().survey_sizes(master_df['id'])
     ax4.hist(survey_sizes.values, bins=30, color='lightseagreen', edgecolor='black')
     ax4.set_xlabel('Questions per Survey')
     ax4.set_ylabel('Number of Surveys')
@@ -254,9 +249,7 @@ def create_visualizations(master_df: pd.DataFrame, questions_df: pd.DataFrame, m
     
     # 5. Concept diversity per survey
     ax5 = fig.add_subplot(gs[1, 1])
-    master_valid = master_df[master_df['final_topic'].notna()].copy()
-    master_valid['concept'] = master_valid['final_topic'] + '.' + master_valid['final_subtopic']
-    survey_concepts = master_valid.groupby('primary_survey')['concept'].nunique()
+    survey_concepts = (matrix_df > 0).sum(axis=1)
     ax5.hist(survey_concepts.values, bins=20, color='orchid', edgecolor='black')
     ax5.set_xlabel('Unique Concepts per Survey')
     ax5.set_ylabel('Number of Surveys')
@@ -283,11 +276,12 @@ def create_visualizations(master_df: pd.DataFrame, questions_df: pd.DataFrame, m
     top_survey_names = survey_sizes.head(15).index
     survey_topic = master_df[master_df['primary_survey'].isin(top_survey_names) & 
                              master_df['final_topic'].notna()].groupby(
-        ['primary_survey', 'final_topic']
+        ['primary_survey', 'final_topic'], observed=True
     ).size().reset_index(name='count')
     
     heatmap_data = survey_topic.pivot(index='primary_survey', columns='final_topic', values='count').fillna(0)
-    heatmap_data = heatmap_data.reindex(top_survey_names)
+    heatmap_data.columns = heatmap_data.columns.astype(str)
+    heatmap_data = heatmap_data.sort_index(axis=1).reindex(top_survey_names)
     
     sns.heatmap(heatmap_data, annot=True, fmt='.0f', cmap='YlOrRd', 
                 cbar_kws={'label': 'Question Count'}, ax=ax7)
@@ -391,12 +385,13 @@ def main():
     master_df = master_df.merge(questions_df[['id', 'question', 'primary_survey']], on='id', how='left')
     
     # Save master dataset
-    master_df.to_csv(OUTPUT_DIR / 'master_dataset.csv', index=False)
+    analytics_store.save_table('master', master_df)
     print(f"   ✓ Saved: master_dataset.csv ({len(master_df):,} rows)")
     
-    # Create survey-concept matrix
+    # Coverage cube (deltas against the stored one), then the survey-concept matrix rollup
     print("\n3. Creating survey-concept matrix...")
-    matrix_df = create_survey_concept_matrix(master_df, questions_df)
+    cube = update_cube(master_df)
+    matrix_df = survey_concept_matrix(cube)
     matrix_df.to_csv(OUTPUT_DIR / 'survey_concept_matrix.csv')
     print(f"   ✓ Saved: survey_concept_matrix.csv ({matrix_df.shape[0]} surveys × {matrix_df.shape[1]} concepts)")
     
@@ -1,113 +1,156 @@
 """
 Simplified data cleaning utilities for survey question data
+
+The survey map is wide (one column per survey), so it is cleaned in row
+chunks: each chunk is filtered, checked against a running set of row
+hashes for duplicates, and appended to the outputs. Memory is bounded by
+CHUNK_ROWS x columns plus 8 bytes per distinct row, not by the whole matrix.
 """
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
-def clean_survey_data(input_path, output_path=None):
+# Configuration
+CHUNK_ROWS = 2000
+QUESTION_COL = 'Question'
+
+def _append_csv(df, path, first):
+    df.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+
+def _drop_columns(path, columns, chunksize=CHUNK_ROWS):
+    """Rewrite a CSV without `columns`, chunk by chunk."""
+    tmp = Path(path).with_suffix('.tmp')
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+    for i, chunk in enumerate(reader):
+        _append_csv(chunk.drop(columns=columns), tmp, first=(i == 0))
+    tmp.replace(path)
+
+def clean_survey_data(input_path, output_path=None, melted_path=None, stats_path=None,
+                      chunksize=CHUNK_ROWS):
     """
-    Clean the raw survey data:
+    Clean the raw survey data in one streaming pass:
     1. Remove empty/unnamed columns
     2. Clean column names and question text
     3. Remove rows with missing questions
     4. Remove duplicate rows (data entry errors)
-    
+
+    Markers are kept as the text in the file (read as strings), so every
+    chunk writes them the same way.
+
     Args:
         input_path: Path to raw CSV
-        output_path: Path to save cleaned CSV (optional)
-    
+        output_path: Path to save cleaned (wide) CSV (optional)
+        melted_path: Path to save question_id, question_text, survey_key pairs (optional)
+        stats_path: Path to save survey_key, question_count (optional)
+        chunksize: Rows per chunk
+
     Returns:
-        Cleaned DataFrame
+        Survey statistics DataFrame (survey_key, question_count)
     """
-    print("Loading raw data...")
-    df = pd.read_csv(input_path)
-    
-    print(f"Original shape: {df.shape}")
-    
-    # 1. Remove unnamed/empty columns
-    print("\n1. Cleaning columns...")
-    cols_before = len(df.columns)
-    
-    # Drop columns that are unnamed or completely empty
-    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-    df = df.dropna(axis=1, how='all')
-    
-    # Remove trailing whitespace from column names
-    df.columns = df.columns.str.strip()
-    
-    cols_after = len(df.columns)
-    print(f"   Removed {cols_before - cols_after} empty/unnamed columns")
-    print(f"   Remaining columns: {cols_after}")
-    
-    # 2. Identify survey columns (everything except 'Question')
-    question_col = 'Question'
-    survey_cols = [col for col in df.columns if col != question_col]
-    
+    print("Streaming raw data...")
+
+    # 1. Remove unnamed columns up front; empty columns are only known at the end
+    header = pd.read_csv(input_path, nrows=0).columns
+    named = [col for col in header if not col.startswith('Unnamed')]
+    clean_names = {col: col.strip() for col in named}
+    survey_cols = [clean_names[col] for col in named if clean_names[col] != QUESTION_COL]
+    print(f"Original columns: {len(header)}")
+
+    for path in [output_path, melted_path, stats_path]:
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    seen = set()  # Row hashes of kept rows
+    non_empty = pd.Series(0, index=[clean_names[col] for col in named])
+    survey_counts = pd.Series(0, index=survey_cols)
+    rows_read = rows_blank = rows_duplicate = rows_kept = 0
+
+    reader = pd.read_csv(input_path, usecols=named, dtype=str, chunksize=chunksize)
+    for i, chunk in enumerate(reader):
+        chunk = chunk.rename(columns=clean_names)
+        rows_read += len(chunk)
+        non_empty += chunk.notna().sum()
+
+        # 3. Clean question text
+        questions = chunk[QUESTION_COL].str.strip()
+        keep = questions.notna() & (questions != '')
+        rows_blank += int((~keep).sum())
+        chunk = chunk[keep].assign(**{QUESTION_COL: questions[keep]})
+
+        # 4. Duplicates: within the chunk, or of any row already kept
+        hashes = pd.util.hash_pandas_object(chunk, index=False)
+        seen_before = np.fromiter((h in seen for h in hashes), dtype=bool, count=len(hashes))
+        duplicate = hashes.duplicated().to_numpy() | seen_before
+        rows_duplicate += int(duplicate.sum())
+        chunk, hashes = chunk[~duplicate], hashes[~duplicate]
+        seen.update(hashes.tolist())
+
+        # Question-survey pairs, question by question
+        ids = np.array([f"Q{n:04d}" for n in range(rows_kept + 1, rows_kept + len(chunk) + 1)], dtype=object)
+        asked = chunk[survey_cols].notna().to_numpy()
+        row_idx, col_idx = np.nonzero(asked)
+        survey_counts += asked.sum(axis=0)
+
+        first = (i == 0)
+        if output_path:
+            _append_csv(chunk, output_path, first)
+        if melted_path:
+            _append_csv(pd.DataFrame({
+                'question_id': ids[row_idx],
+                'question_text': chunk[QUESTION_COL].to_numpy()[row_idx],
+                'survey_key': np.array(survey_cols, dtype=object)[col_idx],
+            }), melted_path, first)
+        rows_kept += len(chunk)
+
+    # 1 (continued). Columns empty in the whole raw file
+    empty_cols = [col for col in non_empty.index if non_empty[col] == 0 and col != QUESTION_COL]
+    print(f"\n1. Cleaning columns...")
+    print(f"   Removed {len(header) - len(named) + len(empty_cols)} empty/unnamed columns")
+    print(f"   Remaining columns: {len(named) - len(empty_cols)}")
+    if output_path and empty_cols:
+        _drop_columns(output_path, empty_cols, chunksize)
+
     print(f"\n2. Data structure:")
-    print(f"   Survey columns: {len(survey_cols)}")
-    
-    # 3. Clean question text
+    print(f"   Survey columns: {len(survey_cols) - len(empty_cols)}")
+
     print(f"\n3. Cleaning question text...")
-    rows_before = len(df)
-    
-    # Remove rows with missing question text
-    df = df[df[question_col].notna()]
-    df = df[df[question_col].str.strip() != '']
-    
-    # Strip whitespace from questions
-    df[question_col] = df[question_col].str.strip()
-    
-    rows_after = len(df)
-    print(f"   Removed {rows_before - rows_after} rows with empty questions")
-    
-    # 4. Remove duplicate rows (data entry errors)
+    print(f"   Removed {rows_blank} rows with empty questions")
+
     print(f"\n4. Removing duplicate rows...")
-    rows_before = len(df)
-    
-    # Drop exact duplicate rows across all columns
-    df = df.drop_duplicates()
-    
-    rows_after = len(df)
-    duplicates_removed = rows_before - rows_after
-    print(f"   Removed {duplicates_removed} duplicate rows (data entry errors)")
-    print(f"   Remaining questions: {rows_after}")
-    
-    # 5. Verify data - count non-null values in survey columns
+    print(f"   Removed {rows_duplicate} duplicate rows (data entry errors)")
+    print(f"   Remaining questions: {rows_kept}")
+
+    # 5. Verify data - question-survey pairs per survey
     print(f"\n5. Verification...")
-    survey_counts = {}
-    for col in survey_cols:
-        count = df[col].notna().sum()
-        if count > 0:
-            survey_counts[col] = count
-    
-    total_pairs = sum(survey_counts.values())
-    print(f"   Total question-survey pairs: {total_pairs:,}")
+    stats = (survey_counts[survey_counts > 0].sort_values(ascending=False, kind='stable')
+             .rename_axis('survey_key').reset_index(name='question_count'))
+    print(f"   Total question-survey pairs: {stats['question_count'].sum():,}")
     print(f"   Questions per survey (top 5):")
-    
-    top_surveys = sorted(survey_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-    for survey, count in top_surveys:
+    for survey, count in stats.head(5).itertuples(index=False):
         survey_name = survey[:50] + '...' if len(survey) > 50 else survey
         print(f"     {survey_name}: {count}")
-    
-    # 6. Save if output path provided
-    if output_path:
-        print(f"\n6. Saving cleaned data...")
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        df.to_csv(output_path, index=False)
-        print(f"   ✓ Saved to: {output_path}")
-    
+
+    # 6. Outputs
+    if stats_path:
+        stats.to_csv(stats_path, index=False)
+    print(f"\n6. Saved:")
+    for path in [output_path, melted_path, stats_path]:
+        if path:
+            print(f"   ✓ {path}")
+
     print(f"\n✓ Data cleaning complete!")
-    print(f"Final shape: {df.shape}")
-    
-    return df
+    print(f"Read {rows_read} rows; kept {rows_kept} x {len(named) - len(empty_cols)} columns")
+
+    return stats
 
 if __name__ == "__main__":
     # Run as script
     DATA_DIR = Path(__file__).parent.parent / 'data'
     RAW_DATA = DATA_DIR / 'raw' / 'PublicSurveyQuestions.csv'
     CLEANED_DATA = DATA_DIR / 'processed' / 'cleaned_survey_data.csv'
-    
-    df_clean = clean_survey_data(RAW_DATA, CLEANED_DATA)
-    
+    MELTED_DATA = DATA_DIR / 'processed' / 'melted_survey_data.csv'
+    SURVEY_STATS = DATA_DIR / 'processed' / 'survey_statistics.csv'
+
+    clean_survey_data(RAW_DATA, CLEANED_DATA, MELTED_DATA, SURVEY_STATS)
+
     print(f"\nCleaned data ready for analysis!")
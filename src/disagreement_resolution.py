@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Vectorized disagreement detection and resolution frames.
+
+Shared by arbitrate_final.py (building resolutions) and
+create_final_outputs.py (reconciling them into the master dataset).
+
+- find_disagreements: topic/subtopic mismatch mask, min confidence and
+  confidence tier (binned categorical) for every comparison row at once
+- resolve_auto_dual_modal: primary/secondary assignment for high-confidence
+  disagreements by masked column selection - no per-row Python
+- to_resolution_frame: the typed schema every resolution row follows,
+  whether it came from the arbitrator, the auto dual-modal rule, or a CSV
+
+Confidence tiers:
+- Very Low: <0.60
+- Low: 0.60-0.75
+- Medium: 0.75-0.90
+- High: 0.90-0.95
+- Very High: >=0.95
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List
+
+CONFIDENCE_TIER_BINS = [-np.inf, 0.60, 0.75, 0.90, 0.95, np.inf]
+CONFIDENCE_TIER_LABELS = ['very_low', 'low', 'medium', 'high', 'very_high']
+CONFIDENCE_TIER_DTYPE = pd.CategoricalDtype(CONFIDENCE_TIER_LABELS, ordered=True)
+
+# Column order and dtypes of all_disagreement_resolutions.csv
+RESOLUTION_SCHEMA = {
+    'id': 'int64',
+    'question': 'string',
+    'original_gpt5mini': 'string',
+    'original_haiku45': 'string',
+    'original_gpt_confidence': 'float64',
+    'original_claude_confidence': 'float64',
+    'min_confidence': 'float64',
+    'confidence_tier': CONFIDENCE_TIER_DTYPE,
+    'decision': 'category',
+    'primary_topic': 'category',
+    'primary_subtopic': 'category',
+    'primary_confidence': 'float64',
+    'secondary_primary_topic': 'category',
+    'secondary_primary_subtopic': 'category',
+    'secondary_primary_confidence': 'float64',
+    'all_relevant_subtopics': 'string',
+    'reasoning': 'string',
+    'is_dual_modal': 'boolean',
+    'status': 'category',
+}
+
+def assign_confidence_tiers(min_confidence: pd.Series) -> pd.Series:
+    """Bin confidence scores into ordered tier categories."""
+    return pd.cut(
+        min_confidence,
+        bins=CONFIDENCE_TIER_BINS,
+        labels=CONFIDENCE_TIER_LABELS,
+        right=False
+    ).astype(CONFIDENCE_TIER_DTYPE)
+
+def agreement_mask(df: pd.DataFrame) -> pd.Series:
+    """True where both models chose the same primary topic AND subtopic."""
+    return (
+        (df['primary_topic_openai'] == df['primary_topic_claude']) &
+        (df['primary_subtopic_openai'] == df['primary_subtopic_claude'])
+    )
+
+def find_disagreements(comp_df: pd.DataFrame) -> pd.DataFrame:
+    """Rows where models disagree on topic or subtopic, with min confidence and tier."""
+    disagreements = comp_df[~agreement_mask(comp_df)].copy()
+    disagreements['min_confidence'] = np.fmin(
+        disagreements['confidence_openai'].to_numpy(dtype=float),
+        disagreements['confidence_claude'].to_numpy(dtype=float)
+    )
+    disagreements['confidence_tier'] = assign_confidence_tiers(disagreements['min_confidence'])
+    return disagreements
+
+def _concept(topic: pd.Series, subtopic: pd.Series) -> pd.Series:
+    """'Topic.Subtopic' strings for whole columns."""
+    return topic.astype('string') + '.' + subtopic.astype('string')
+
+def _json_string(s: pd.Series) -> pd.Series:
+    """Escape a string column for embedding inside a JSON string literal."""
+    return s.str.replace('\\', '\\\\', regex=False).str.replace('"', '\\"', regex=False)
+
+def resolve_auto_dual_modal(disagreements: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resolve high-confidence disagreements without the arbitrator.
+
+    The higher-confidence model's answer becomes primary, the other model's
+    becomes secondary primary (ties go to gpt-5-mini). Selection is done on
+    whole columns via the openai-wins mask.
+    """
+    openai_wins = (disagreements['confidence_openai'] >= disagreements['confidence_claude']).to_numpy()
+
+    def pick(openai_col: str, claude_col: str, primary: bool) -> np.ndarray:
+        first, second = (openai_col, claude_col) if primary else (claude_col, openai_col)
+        return np.where(openai_wins, disagreements[first].to_numpy(), disagreements[second].to_numpy())
+
+    primary_topic = pd.Series(pick('primary_topic_openai', 'primary_topic_claude', True), index=disagreements.index)
+    primary_subtopic = pd.Series(pick('primary_subtopic_openai', 'primary_subtopic_claude', True), index=disagreements.index)
+    secondary_topic = pd.Series(pick('primary_topic_openai', 'primary_topic_claude', False), index=disagreements.index)
+    secondary_subtopic = pd.Series(pick('primary_subtopic_openai', 'primary_subtopic_claude', False), index=disagreements.index)
+
+    primary_concept = _concept(primary_topic, primary_subtopic)
+    secondary_concept = _concept(secondary_topic, secondary_subtopic)
+    min_conf_text = np.char.mod('%.2f', disagreements['min_confidence'].to_numpy(dtype=float))
+
+    resolved = pd.DataFrame({
+        'id': disagreements['id'],
+        'question': disagreements['question'],
+        'original_gpt5mini': _concept(disagreements['primary_topic_openai'], disagreements['primary_subtopic_openai']),
+        'original_haiku45': _concept(disagreements['primary_topic_claude'], disagreements['primary_subtopic_claude']),
+        'original_gpt_confidence': disagreements['confidence_openai'],
+        'original_claude_confidence': disagreements['confidence_claude'],
+        'min_confidence': disagreements['min_confidence'],
+        'confidence_tier': disagreements['confidence_tier'],
+        'decision': 'auto_dual_modal',
+        'primary_topic': primary_topic,
+        'primary_subtopic': primary_subtopic,
+        'primary_confidence': pick('confidence_openai', 'confidence_claude', True),
+        'secondary_primary_topic': secondary_topic,
+        'secondary_primary_subtopic': secondary_subtopic,
+        'secondary_primary_confidence': pick('confidence_openai', 'confidence_claude', False),
+        'all_relevant_subtopics': '["' + _json_string(primary_concept) + '", "' + _json_string(secondary_concept) + '"]',
+        'reasoning': ('Both models highly confident (min=' + pd.Series(min_conf_text, index=disagreements.index)
+                      + ') but chose different topics. Auto-marked as dual-modal.'),
+        'is_dual_modal': True,
+        'status': 'auto_dual_modal'
+    })
+
+    return to_resolution_frame(resolved)
+
+def to_resolution_frame(records) -> pd.DataFrame:
+    """
+    Coerce resolution rows (list of dicts or DataFrame) to RESOLUTION_SCHEMA.
+
+    Schema columns come first in a fixed order; extra columns (e.g. 'error'
+    on failed arbitrations) are kept after them.
+    """
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    df = df.copy()
+    for column, dtype in RESOLUTION_SCHEMA.items():
+        if column not in df:
+            df[column] = np.nan
+        if column == 'is_dual_modal' and df[column].dtype == object:
+            # CSV round-trips give 'True'/'False' strings
+            df[column] = df[column].map({'True': True, 'False': False, True: True, False: False})
+        df[column] = df[column].astype(dtype)
+    extra = [c for c in df.columns if c not in RESOLUTION_SCHEMA]
+    return df[list(RESOLUTION_SCHEMA) + extra]
+
+def combine_resolutions(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate resolution frames, keeping categorical dtypes aligned."""
+    frames = [f for f in frames if len(f) > 0]
+    if not frames:
+        return to_resolution_frame(pd.DataFrame())
+    combined = pd.concat([f.astype({c: 'object' for c, t in RESOLUTION_SCHEMA.items() if t == 'category'})
+                          for f in frames], ignore_index=True)
+    return to_resolution_frame(combined)
+
+def load_resolutions(path) -> pd.DataFrame:
+    """Read all_disagreement_resolutions.csv into the typed schema."""
+    return to_resolution_frame(pd.read_csv(path))
@@ -15,6 +15,7 @@ from transformers import AutoTokenizer, AutoModel
 import torch
 from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm
+from similarity_stats import normalize_similarity_distributions, concepts_needed_for_mass
 import matplotlib.pyplot as plt
 import seaborn as sns
 
@@ -181,33 +182,8 @@ print(f"   Max:    {similarity_matrix.max():.4f}")
 
 # Normalize per question and analyze
 print("\n7. Analyzing normalized distributions...")
-n_questions = similarity_matrix.shape[0]
-n_concepts = similarity_matrix.shape[1]
-
 # For each question, normalize its similarity scores
-normalized_distributions = []
-top_k_stats = {k: [] for k in [1, 2, 3, 5, 10]}
-
-for i in range(n_questions):
-    scores = similarity_matrix[i]
-    
-    # Sort descending
-    sorted_scores = np.sort(scores)[::-1]
-    
-    # Normalize to sum to 1
-    normalized = sorted_scores / sorted_scores.sum()
-    normalized_distributions.append(normalized)
-    
-    # Cumulative for this question
-    cumulative = np.cumsum(normalized)
-    
-    # Track what % of mass is captured by top-k
-    for k in top_k_stats.keys():
-        if k <= len(cumulative):
-            top_k_stats[k].append(cumulative[k-1])
-
-# Convert to arrays
-normalized_distributions = np.array(normalized_distributions)
+normalized_distributions, top_k_stats = normalize_similarity_distributions(similarity_matrix)
 
 print("\n" + "="*70)
 print("RESULTS: How much similarity mass do top-K concepts capture?")
@@ -276,13 +252,7 @@ print("="*70)
 thresholds = [0.80, 0.85, 0.90, 0.95, 0.975, 0.99]
 
 for threshold in thresholds:
-    n_concepts_needed = []
-    for i in range(n_questions):
-        cumulative = np.cumsum(normalized_distributions[i])
-        n_needed = np.searchsorted(cumulative, threshold) + 1
-        n_concepts_needed.append(min(n_needed, n_concepts))
-    
-    n_concepts_needed = np.array(n_concepts_needed)
+    n_concepts_needed = concepts_needed_for_mass(normalized_distributions, threshold)
     print(f"\nTo capture {threshold*100:.1f}% of similarity mass:")
     print(f"  Mean concepts needed:   {n_concepts_needed.mean():.2f}")
     print(f"  Median concepts needed: {np.median(n_concepts_needed):.0f}")
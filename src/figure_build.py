@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Build report figures in parallel, skipping those whose inputs are unchanged.
+
+Figures were rendered serially, one whole script at a time, each at
+dpi=300, so a one-line data fix re-rendered everything. Here every figure
+is registered with the function that draws it and the files it reads
+(data exports plus the script itself):
+
+- the inputs are hashed; a figure whose hash matches the manifest and
+  whose outputs exist is skipped
+- the rest render in a process pool (FIGURE_WORKERS) on the Agg backend,
+  one figure per task, so independent figures don't wait on each other
+
+Manifest: ../output/visualizations/.figure_manifest.json
+
+Usage:
+    python figure_build.py                      # Build stale figures
+    python figure_build.py --force              # Rebuild all
+    python figure_build.py horizontal_bars_all_subtopics --workers 2
+    python figure_build.py --list
+"""
+
+import os
+os.environ.setdefault('MPLBACKEND', 'Agg')  # Workers never open a display
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+# Configuration
+FIGURE_WORKERS = min(4, os.cpu_count() or 1)
+MANIFEST_FILE = Path('../output/visualizations/.figure_manifest.json')
+HASH_BLOCK = 1 << 20
+
+OUTPUT = Path('../output')
+VIZ = OUTPUT / 'visualizations'
+CUBE = OUTPUT / 'cube' / 'coverage_cube.csv'
+MATRIX = OUTPUT / 'final' / 'survey_concept_matrix.csv'
+MASTER = OUTPUT / 'final' / 'master_dataset.csv'
+TAXONOMY = Path('../data/raw/census_survey_explorer_taxonomy.json')
+SURVEY_MAP = Path('../data/raw/PublicSurveyQuestionsMap.csv')
+
+class Figure(NamedTuple):
+    name: str
+    render: str          # 'module:function' that draws and saves the figure
+    load: str            # 'module:function' returning its argument(s), or '' for none
+    inputs: List[Path]   # Files the figure depends on (its script is added automatically)
+    outputs: List[Path]
+
+FIGURES = [
+    Figure('figure_02_model_agreement', 'create_figure_02_agreement:main', '',
+           [OUTPUT / 'comparison' / 'agreement_summary.csv'],
+           [VIZ / 'figure_02_model_agreement.png']),
+    Figure('beeswarm_coverage_distribution', 'generate_coverage_analysis:viz_beeswarm_distribution',
+           'coverage_cube:load_cube', [CUBE],
+           [VIZ / 'beeswarm_coverage_distribution.png']),
+    Figure('horizontal_bars_all_subtopics', 'generate_coverage_analysis:viz_bars_by_topic',
+           'coverage_cube:load_cube', [CUBE],
+           [VIZ / 'horizontal_bars_all_subtopics.png']),
+    Figure('unique_orphan_tables', 'generate_coverage_analysis:viz_unique_orphan_table',
+           'coverage_cube:load_cube', [CUBE, TAXONOMY],
+           [VIZ / 'unique_orphan_tables.png', VIZ / 'unique_and_orphan_concepts.csv',
+            VIZ / 'orphaned_concepts.csv', VIZ / 'undersampled_concepts.csv']),
+    Figure('1_coverage_treemap', 'generate_visualizations_1_2_3:viz1_coverage_gap_treemap',
+           'coverage_cube:load_cube', [CUBE],
+           [VIZ / '1_coverage_treemap.html', VIZ / '1_coverage_analysis.csv']),
+    Figure('2_clustered_heatmap', 'generate_visualizations_1_2_3:viz2_clustered_heatmap',
+           'generate_visualizations_1_2_3:load_matrix', [MATRIX],
+           [VIZ / '2_clustered_heatmap.png']),
+    Figure('3_sankey_flow', 'generate_visualizations_1_2_3:viz3_sankey_diagram',
+           'coverage_cube:load_cube', [CUBE],
+           [VIZ / '3_sankey_flow.html']),
+    Figure('summary_dashboard', 'create_final_outputs:create_visualizations',
+           'create_final_outputs:load_visualization_inputs', [MASTER, MATRIX, SURVEY_MAP],
+           [OUTPUT / 'final' / 'summary_dashboard.png']),
+]
+
+def _resolve(ref: str):
+    module, function = ref.split(':')
+    return getattr(importlib.import_module(module), function)
+
+def _file_hash(path: Path, digest):
+    digest.update(str(path).encode('utf-8'))
+    if not path.exists():
+        digest.update(b'<missing>')
+        return
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+
+def input_hash(figure: Figure) -> str:
+    """Hash of the figure's input files and of the script(s) that draw it."""
+    scripts = {Path(ref.split(':')[0] + '.py') for ref in (figure.render, figure.load) if ref}
+    digest = hashlib.sha256()
+    for path in sorted(scripts) + list(figure.inputs):
+        _file_hash(path, digest)
+    return digest.hexdigest()
+
+def load_manifest() -> Dict[str, str]:
+    if MANIFEST_FILE.exists():
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest: Dict[str, str]):
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_FILE.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp.replace(MANIFEST_FILE)
+
+def render_figure(figure: Figure) -> Tuple[str, bool, float, str]:
+    """Worker: load inputs, draw, close all figures. Returns (name, ok, seconds, captured output)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    start = time.time()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            args = _resolve(figure.load)() if figure.load else ()
+            _resolve(figure.render)(*(args if isinstance(args, tuple) else (args,)))
+        ok = True
+    except Exception:
+        log.write(traceback.format_exc())
+        ok = False
+    finally:
+        plt.close('all')
+    return figure.name, ok, time.time() - start, log.getvalue()
+
+def build_figures(names: List[str] = None, force: bool = False, workers: int = FIGURE_WORKERS,
+                  verbose: bool = False) -> bool:
+    """Render the named figures (default all) whose inputs changed; True if none failed."""
+    selected = [f for f in FIGURES if names is None or f.name in names]
+    unknown = set(names or []) - {f.name for f in FIGURES}
+    if unknown:
+        raise ValueError(f"unknown figures: {', '.join(sorted(unknown))}")
+
+    manifest = load_manifest()
+    hashes = {f.name: input_hash(f) for f in selected}
+    stale = [f for f in selected
+             if force or manifest.get(f.name) != hashes[f.name] or not all(p.exists() for p in f.outputs)]
+    for figure in selected:
+        if figure not in stale:
+            print(f"  = {figure.name} (inputs unchanged)")
+    if not stale:
+        return True
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(stale)))) as pool:
+        futures = [pool.submit(render_figure, figure) for figure in stale]
+        for future in as_completed(futures):
+            name, ok, seconds, log = future.result()
+            if ok:
+                manifest[name] = hashes[name]
+                print(f"  ✓ {name} ({seconds:.1f}s)")
+            else:
+                manifest.pop(name, None)
+                failed += 1
+                print(f"  ✗ {name} failed:")
+                print('      ' + log.strip().splitlines()[-1] if log.strip() else '')
+            if verbose and log.strip():
+                print('\n'.join('      ' + line for line in log.rstrip().splitlines()))
+    save_manifest(manifest)
+    return failed == 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Build report figures (parallel, cached by input hash)')
+    parser.add_argument('figures', nargs='*', help='Figure names (default: all)')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if inputs are unchanged')
+    parser.add_argument('--workers', type=int, default=FIGURE_WORKERS)
+    parser.add_argument('--verbose', action='store_true', help="Show each figure's output")
+    parser.add_argument('--list', action='store_true', help='List registered figures and whether they are stale')
+    args = parser.parse_args()
+
+    if args.list:
+        manifest = load_manifest()
+        for figure in FIGURES:
+            state = 'current' if manifest.get(figure.name) == input_hash(figure) else 'stale'
+            print(f"  {figure.name:<34} {state:<8} {', '.join(str(p) for p in figure.inputs)}")
+        return
+
+    start = time.time()
+    ok = build_figures(args.figures or None, args.force, args.workers, args.verbose)
+    print(f"\n  Figures {'built' if ok else 'built with failures'} in {time.time() - start:.1f}s")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    exit(main())
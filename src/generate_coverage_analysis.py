@@ -12,6 +12,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
+from taxonomy import load_taxonomy
+from coverage_cube import (load_cube, rollup, concept_totals, survey_concept_matrix,
+                           orphaned_concepts, undersampled_concepts)
 
 # Configuration
 FINAL_DIR = Path('../output/final')
@@ -22,39 +25,18 @@ sns.set_style('whitegrid')
 plt.rcParams['figure.facecolor'] = 'white'
 
 def load_data():
-    """Load master dataset."""
-    master = pd.read_csv(FINAL_DIR / 'master_dataset.csv')
-    return master
+    """Load the coverage cube."""
+    return load_cube()
 
-def load_taxonomy():
-    """Load full taxonomy to find orphaned concepts."""
-    import json
-    taxonomy_path = Path('../data/raw/census_survey_explorer_taxonomy.json')
-    with open(taxonomy_path, 'r') as f:
-        data = json.load(f)
-    
-    # Flatten to topic.subtopic
-    all_concepts = []
-    for topic, subtopics in data['taxonomy'].items():
-        for subtopic in subtopics:
-            all_concepts.append(f"{topic}.{subtopic}")
-    
-    return all_concepts
-
-def viz_beeswarm_distribution(master_df):
+def viz_beeswarm_distribution(cube):
     """
     Beeswarm plot showing distribution of question counts across concepts.
     """
     print("\n1. BEESWARM PLOT - Question Count Distribution")
     print("="*70)
     
-    # Get concept counts (filter out Unknown)
-    valid = master_df[
-        (master_df['final_topic'].notna()) & 
-        (master_df['final_topic'] != 'Unknown')
-    ].copy()
-    valid['concept'] = valid['final_topic'] + '.' + valid['final_subtopic']
-    concept_counts = valid['concept'].value_counts()
+    # Get concept counts (cube rollup, Unknown filtered out)
+    concept_counts = concept_totals(cube, exclude_unknown=True)
     
     # Create dataframe for plotting
     plot_data = pd.DataFrame({
@@ -106,21 +88,17 @@ def viz_beeswarm_distribution(master_df):
     
     return plot_data
 
-def viz_bars_by_topic(master_df):
+def viz_bars_by_topic(cube):
     """
     Horizontal bar charts - ALL subtopics for each major topic, sorted by count.
     """
     print("\n2. HORIZONTAL BAR CHARTS - All Subtopics per Topic")
     print("="*70)
     
-    # Get concept counts (filter out Unknown)
-    valid = master_df[
-        (master_df['final_topic'].notna()) & 
-        (master_df['final_topic'] != 'Unknown')
-    ].copy()
-    valid['concept'] = valid['final_topic'] + '.' + valid['final_subtopic']
+    # Get concept counts (cube rollup, Unknown filtered out)
+    coverage = rollup(cube, ['topic', 'subtopic'], exclude_unknown=True)
     
-    topics = sorted(valid['final_topic'].unique())
+    topics = sorted(coverage.index.get_level_values('topic').unique())
     
     fig, axes = plt.subplots(3, 2, figsize=(18, 24))
     axes = axes.flatten()
@@ -132,8 +110,7 @@ def viz_bars_by_topic(master_df):
         ax = axes[idx]
         
         # Get ALL subtopics for this topic
-        topic_data = valid[valid['final_topic'] == topic]
-        subtopic_counts = topic_data['final_subtopic'].value_counts().sort_values(ascending=True)
+        subtopic_counts = coverage.loc[topic].sort_values(ascending=True)
         
         # Color gradient from red (low) to green (high)
         colors = plt.cm.RdYlGn(np.linspace(0.2, 0.9, len(subtopic_counts)))
@@ -171,23 +148,20 @@ def viz_bars_by_topic(master_df):
     print(f"   ✓ Saved: horizontal_bars_all_subtopics.png")
     plt.close()
 
-def viz_unique_orphan_table(master_df, all_taxonomy_concepts):
+def viz_unique_orphan_table(cube, all_taxonomy_concepts=None):
     """
     Table showing subtopics that appear in 0 or 1 survey (orphans and uniques).
-    By major topic with counts.
+    By major topic with counts (all_taxonomy_concepts defaults to the full taxonomy).
     """
     print("\n3. UNIQUE & ORPHAN SUBTOPICS - Appearing in 0-1 Surveys")
     print("="*70)
     
-    # Get concept counts (filter out Unknown)
-    valid = master_df[
-        (master_df['final_topic'].notna()) & 
-        (master_df['final_topic'] != 'Unknown')
-    ].copy()
-    valid['concept'] = valid['final_topic'] + '.' + valid['final_subtopic']
+    if all_taxonomy_concepts is None:
+        all_taxonomy_concepts = load_taxonomy().concepts
     
-    # Count which surveys each concept appears in
-    concept_survey_counts = valid.groupby('concept')['primary_survey'].nunique()
+    # Count which surveys each concept appears in (every survey asking the question; Unknown filtered out)
+    survey_concepts = survey_concept_matrix(cube, exclude_unknown=True)
+    concept_survey_counts = (survey_concepts > 0).sum(axis=0).sort_index()
     
     # Find concepts with ZERO coverage
     covered_concepts = set(concept_survey_counts.index)
@@ -219,8 +193,8 @@ def viz_unique_orphan_table(master_df, all_taxonomy_concepts):
     for concept in one_survey.index:
         topic, subtopic = concept.split('.')
         # Find which survey has it
-        survey = valid[valid['concept'] == concept]['primary_survey'].iloc[0]
-        question_count = len(valid[valid['concept'] == concept])
+        survey = survey_concepts.index[survey_concepts[concept] > 0][0]
+        question_count = int(survey_concepts[concept].sum())
         results.append({
             'topic': topic,
             'subtopic': subtopic,
@@ -234,6 +208,13 @@ def viz_unique_orphan_table(master_df, all_taxonomy_concepts):
     results_df.to_csv(VIZ_DIR / 'unique_and_orphan_concepts.csv', index=False)
     print(f"   ✓ Saved: unique_and_orphan_concepts.csv")
     
+    # Long tail by question count (cube rollups)
+    orphaned = orphaned_concepts(cube, all_taxonomy_concepts)
+    orphaned.to_csv(VIZ_DIR / 'orphaned_concepts.csv', index=False)
+    undersampled = undersampled_concepts(cube)
+    undersampled.to_csv(VIZ_DIR / 'undersampled_concepts.csv', index=False)
+    print(f"   ✓ Saved: orphaned_concepts.csv ({len(orphaned)}), undersampled_concepts.csv ({len(undersampled)})")
+    
     # Create visual table by topic
     fig, axes = plt.subplots(3, 2, figsize=(20, 16))
     axes = axes.flatten()
@@ -313,12 +294,10 @@ def viz_unique_orphan_table(master_df, all_taxonomy_concepts):
     
     # Summary stats by topic
     print("\n   Summary by Topic:")
-    summary = results_df.groupby('topic').agg({
-        'subtopic': 'count',
-        'survey_count': lambda x: (x == 0).sum()
-    })
-    summary.columns = ['Total', 'Orphans']
-    summary['Uniques'] = results_df.groupby('topic').apply(lambda x: (x['survey_count'] == 1).sum())
+    summary = results_df.assign(
+        orphan=results_df['survey_count'] == 0,
+        unique=results_df['survey_count'] == 1
+    ).groupby('topic').agg(Total=('subtopic', 'count'), Orphans=('orphan', 'sum'), Uniques=('unique', 'sum'))
     print(summary.to_string())
 
 def main():
@@ -328,15 +307,15 @@ def main():
     
     # Load data
     print("\nLoading data...")
-    master_df = load_data()
-    all_concepts = load_taxonomy()
-    print(f"   Master dataset: {len(master_df)} questions")
+    cube = load_data()
+    all_concepts = load_taxonomy().concepts
+    print(f"   Master dataset: {int(cube['questions'].sum())} questions")
     print(f"   Full taxonomy: {len(all_concepts)} concepts")
     
     # Generate visualizations
-    viz_beeswarm_distribution(master_df)
-    viz_bars_by_topic(master_df)
-    viz_unique_orphan_table(master_df, all_concepts)
+    viz_beeswarm_distribution(cube)
+    viz_bars_by_topic(cube)
+    viz_unique_orphan_table(cube, all_concepts)
     
     print("\n" + "="*70)
     print("COVERAGE ANALYSIS COMPLETE!")
@@ -347,6 +326,8 @@ def main():
     print("  - horizontal_bars_all_subtopics.png")
     print("  - unique_orphan_tables.png")
     print("  - unique_and_orphan_concepts.csv")
+    print("  - orphaned_concepts.csv")
+    print("  - undersampled_concepts.csv")
 
 if __name__ == '__main__':
     main()
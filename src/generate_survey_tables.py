@@ -10,15 +10,29 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from collections import Counter
+from analytics_store import read_table
+from survey_aggregates import valid_categorized, survey_profiles
+from survey_incidence import load_incidence
+from survey_overlap import binary_matrix, similarity_matrix, top_pairs, lsh_pairs, shingle_matrix, shared_columns
 
 # Configuration
 FINAL_DIR = Path('../output/final')
 VIZ_DIR = Path('../output/visualizations')
 VIZ_DIR.mkdir(parents=True, exist_ok=True)
 
+# Consolidation search: exact sparse product below LSH_MIN_SURVEYS surveys,
+# MinHash/LSH candidates (re-scored exactly) above; the dense S × S
+# similarity CSV is only written up to SIMILARITY_MATRIX_MAX_SURVEYS
+LSH_MIN_SURVEYS = 2000
+LSH_RECALL = 0.95
+SIMILARITY_MATRIX_MAX_SURVEYS = 2000
+
+# Master columns these figures use (read from the analytical store)
+MASTER_COLUMNS = ['id', 'question', 'primary_survey', 'final_topic', 'final_subtopic']
+
 def load_data():
     """Load master dataset and matrix."""
-    master = pd.read_csv(FINAL_DIR / 'master_dataset.csv')
+    master = read_table('master', MASTER_COLUMNS)
     matrix = pd.read_csv(FINAL_DIR / 'survey_concept_matrix.csv', index_col=0)
     return master, matrix
 
@@ -29,45 +43,18 @@ def create_survey_profile_table(master_df):
     print("\n1. SURVEY PROFILE TABLE")
     print("="*70)
     
-    # Filter valid categorizations
-    valid = master_df[
-        (master_df['final_topic'].notna()) & 
-        (master_df['final_topic'] != 'Unknown')
-    ].copy()
-    
-    profiles = []
+    # All per-survey statistics in one grouped pass
+    stats = survey_profiles(valid_categorized(master_df))
+    profiles = pd.DataFrame({
+        'Survey': stats.index,
+        'Questions': stats['questions'].to_numpy(),
+        'Primary_Topic': stats['primary_topic'].to_numpy(),
+        'Topic_Coverage': stats['topic_coverage'].to_numpy(),
+        'Unique_Concepts': stats['unique_concepts'].to_numpy(),
+        'Top_5_Concepts': stats['top_concepts'].to_numpy()
+    })
     
-    for survey in sorted(valid['primary_survey'].unique()):
-        survey_data = valid[valid['primary_survey'] == survey]
-        
-        # Primary topic (most common)
-        primary_topic = survey_data['final_topic'].mode()[0] if len(survey_data) > 0 else 'Unknown'
-        
-        # Topic distribution
-        topic_dist = survey_data['final_topic'].value_counts()
-        topic_pct = (topic_dist / len(survey_data) * 100).round(1)
-        
-        # Top 5 concepts
-        survey_data['concept'] = survey_data['final_topic'] + '.' + survey_data['final_subtopic']
-        top_concepts = survey_data['concept'].value_counts().head(5)
-        top_concepts_str = ', '.join([f"{c.split('.')[1]} ({v})" for c, v in top_concepts.items()])
-        
-        # Topic coverage string
-        topic_coverage = ', '.join([f"{t} ({p}%)" for t, p in topic_pct.head(3).items()])
-        
-        # Unique concepts
-        unique_concepts = survey_data['concept'].nunique()
-        
-        profiles.append({
-            'Survey': survey,
-            'Questions': len(survey_data),
-            'Primary_Topic': primary_topic,
-            'Topic_Coverage': topic_coverage,
-            'Unique_Concepts': unique_concepts,
-            'Top_5_Concepts': top_concepts_str
-        })
-    
-    profiles_df = pd.DataFrame(profiles).sort_values('Questions', ascending=False)
+    profiles_df = profiles.sort_values('Questions', ascending=False)
     
     # Save full table
     profiles_df.to_csv(VIZ_DIR / 'survey_profiles.csv', index=False)
@@ -84,88 +71,80 @@ def create_survey_profile_table(master_df):
     
     return profiles_df
 
-def calculate_concept_overlap(matrix_df):
+def calculate_concept_overlap(matrix_df, metric='jaccard'):
     """
     Calculate pairwise concept overlap between surveys.
-    Returns similarity matrix and overlap details.
+    Returns similarity matrix (all intersections from one sparse product).
     """
-    # Convert to binary (has concept or not)
-    binary_matrix = (matrix_df > 0).astype(int)
-    
-    # Calculate Jaccard similarity for each pair
-    surveys = matrix_df.index.tolist()
-    n_surveys = len(surveys)
-    
-    similarity_matrix = np.zeros((n_surveys, n_surveys))
-    
-    for i, survey1 in enumerate(surveys):
-        for j, survey2 in enumerate(surveys):
-            if i == j:
-                similarity_matrix[i, j] = 1.0
-            elif i < j:
-                # Jaccard: intersection / union
-                concepts1 = set(binary_matrix.loc[survey1][binary_matrix.loc[survey1] == 1].index)
-                concepts2 = set(binary_matrix.loc[survey2][binary_matrix.loc[survey2] == 1].index)
-                
-                if len(concepts1) == 0 and len(concepts2) == 0:
-                    similarity = 0
-                else:
-                    intersection = len(concepts1 & concepts2)
-                    union = len(concepts1 | concepts2)
-                    similarity = intersection / union if union > 0 else 0
-                
-                similarity_matrix[i, j] = similarity
-                similarity_matrix[j, i] = similarity
-    
-    similarity_df = pd.DataFrame(similarity_matrix, index=surveys, columns=surveys)
-    
-    return similarity_df
+    return similarity_matrix(binary_matrix(matrix_df), matrix_df.index.tolist(), metric)
+
+CANDIDATE_COLUMNS = ['Survey_1', 'Survey_2', 'Overlap_Pct', 'Shared_Concepts', 'Survey_1_Questions',
+                     'Survey_2_Questions', 'Total_Questions', 'Top_Shared_Concepts']
 
-def create_consolidation_candidates(matrix_df, master_df, threshold=0.50):
+def create_consolidation_candidates(matrix_df, master_df, threshold=0.50, metric='jaccard', top_k=None,
+                                    method='auto', features='concepts', recall=LSH_RECALL):
     """
     Identify survey pairs with high concept overlap - consolidation candidates.
+    
+    Only pairs sharing a concept are scored (top_k keeps the best k).
+    method='lsh' (or 'auto' at LSH_MIN_SURVEYS+ surveys) takes candidates
+    from MinHash/LSH and re-scores them exactly; Jaccard only.
+    features='questions' scores surveys on question-text shingles instead
+    of concepts.
     """
     print("\n2. CONSOLIDATION CANDIDATES")
     print("="*70)
     
-    print(f"   Calculating concept overlap (Jaccard similarity)...")
-    similarity_df = calculate_concept_overlap(matrix_df)
+    surveys = matrix_df.index.tolist()
+    if method == 'auto':
+        method = 'lsh' if len(surveys) >= LSH_MIN_SURVEYS and metric == 'jaccard' else 'exact'
+    if method == 'lsh' and metric != 'jaccard':
+        raise ValueError(f"LSH candidates estimate Jaccard only (got metric={metric!r})")
+    
+    binary = binary_matrix(matrix_df)
+    scored = binary
+    if features == 'questions':
+        scored = shingle_matrix(master_df['primary_survey'], master_df['question'], surveys)
+    
+    print(f"   Calculating {features} overlap ({metric} similarity, {method})...")
+    if method == 'lsh':
+        pairs = lsh_pairs(scored, threshold, recall, k=top_k)
+    else:
+        pairs = top_pairs(scored, threshold, metric, top_k)
+    
+    similarity_df = None
+    if len(surveys) <= SIMILARITY_MATRIX_MAX_SURVEYS:
+        similarity_df = similarity_matrix(scored, surveys, metric)
     
-    # Find high-overlap pairs
-    candidates = []
+    # Question counts per survey, once, on the membership basis the overlap uses
+    # (a question counts in every survey asking it; a pair's total counts it once)
+    valid = valid_categorized(master_df)
+    incidence = load_incidence()
+    question_counts = incidence.survey_sizes(valid['id'])
+    members = incidence.matrix[valid['id'].to_numpy(dtype=np.int64)].tocsc()
+    column = {name: i for i, name in enumerate(incidence.surveys)}
     
-    surveys = similarity_df.index.tolist()
-    for i, survey1 in enumerate(surveys):
-        for j, survey2 in enumerate(surveys):
-            if i < j:  # Only upper triangle
-                similarity = similarity_df.loc[survey1, survey2]
-                
-                if similarity >= threshold:
-                    # Get shared concepts
-                    survey1_concepts = set(matrix_df.columns[matrix_df.loc[survey1] > 0])
-                    survey2_concepts = set(matrix_df.columns[matrix_df.loc[survey2] > 0])
-                    shared = survey1_concepts & survey2_concepts
-                    
-                    # Get question counts
-                    valid = master_df[
-                        (master_df['final_topic'].notna()) & 
-                        (master_df['final_topic'] != 'Unknown')
-                    ]
-                    q1 = len(valid[valid['primary_survey'] == survey1])
-                    q2 = len(valid[valid['primary_survey'] == survey2])
-                    
-                    candidates.append({
-                        'Survey_1': survey1,
-                        'Survey_2': survey2,
-                        'Overlap_Pct': round(similarity * 100, 1),
-                        'Shared_Concepts': len(shared),
-                        'Survey_1_Questions': q1,
-                        'Survey_2_Questions': q2,
-                        'Total_Questions': q1 + q2,
-                        'Top_Shared_Concepts': ', '.join(sorted(list(shared))[:5])
-                    })
+    concepts = matrix_df.columns
+    candidates = []
+    for pair in pairs.itertuples(index=False):
+        survey1, survey2 = surveys[pair.i], surveys[pair.j]
+        shared = sorted(concepts[shared_columns(binary, pair.i, pair.j)])
+        q1 = int(question_counts.get(survey1, 0))
+        q2 = int(question_counts.get(survey2, 0))
+        both = len(np.intersect1d(members[:, column[survey1]].indices, members[:, column[survey2]].indices)) \
+            if survey1 in column and survey2 in column else 0
+        candidates.append({
+            'Survey_1': survey1,
+            'Survey_2': survey2,
+            'Overlap_Pct': round(pair.score * 100, 1),
+            'Shared_Concepts': len(shared),
+            'Survey_1_Questions': q1,
+            'Survey_2_Questions': q2,
+            'Total_Questions': q1 + q2 - both,
+            'Top_Shared_Concepts': ', '.join(shared[:5])
+        })
     
-    candidates_df = pd.DataFrame(candidates).sort_values('Overlap_Pct', ascending=False)
+    candidates_df = pd.DataFrame(candidates, columns=CANDIDATE_COLUMNS)
     
     # Save
     candidates_df.to_csv(VIZ_DIR / 'consolidation_candidates.csv', index=False)
@@ -185,8 +164,11 @@ def create_consolidation_candidates(matrix_df, master_df, threshold=0.50):
         print(f"   Try lowering threshold (currently {threshold})")
     
     # Save similarity matrix
-    similarity_df.to_csv(VIZ_DIR / 'survey_similarity_matrix.csv')
-    print(f"   ✓ Saved: survey_similarity_matrix.csv")
+    if similarity_df is not None:
+        similarity_df.to_csv(VIZ_DIR / 'survey_similarity_matrix.csv')
+        print(f"   ✓ Saved: survey_similarity_matrix.csv")
+    else:
+        print(f"   Skipped survey_similarity_matrix.csv ({len(surveys):,} surveys > {SIMILARITY_MATRIX_MAX_SURVEYS:,})")
     
     return candidates_df, similarity_df
 
@@ -197,32 +179,17 @@ def create_topic_grouping_table(master_df):
     print("\n3. SURVEYS BY TOPIC AREA")
     print("="*70)
     
-    # Filter valid
-    valid = master_df[
-        (master_df['final_topic'].notna()) & 
-        (master_df['final_topic'] != 'Unknown')
-    ].copy()
-    
-    # Calculate primary topic for each survey
-    survey_topics = []
-    
-    for survey in sorted(valid['primary_survey'].unique()):
-        survey_data = valid[valid['primary_survey'] == survey]
-        
-        # Get topic distribution
-        topic_counts = survey_data['final_topic'].value_counts()
-        primary_topic = topic_counts.index[0]
-        primary_pct = (topic_counts.iloc[0] / len(survey_data) * 100)
-        
-        survey_topics.append({
-            'Survey': survey,
-            'Primary_Topic': primary_topic,
-            'Primary_Topic_Pct': round(primary_pct, 1),
-            'Question_Count': len(survey_data),
-            'Concept_Count': survey_data['final_subtopic'].nunique()
-        })
-    
-    topic_df = pd.DataFrame(survey_topics).sort_values(['Primary_Topic', 'Question_Count'], ascending=[True, False])
+    # Primary topic for each survey (one grouped pass)
+    stats = survey_profiles(valid_categorized(master_df))
+    survey_topics = pd.DataFrame({
+        'Survey': stats.index,
+        'Primary_Topic': stats['top_topic'].to_numpy(),
+        'Primary_Topic_Pct': [round(n / q * 100, 1) for n, q in zip(stats['top_topic_count'], stats['questions'])],
+        'Question_Count': stats['questions'].to_numpy(),
+        'Concept_Count': stats['unique_subtopics'].to_numpy()
+    })
+    
+    topic_df = survey_topics.sort_values(['Primary_Topic', 'Question_Count'], ascending=[True, False])
     
     # Save
     topic_df.to_csv(VIZ_DIR / 'surveys_by_topic.csv', index=False)
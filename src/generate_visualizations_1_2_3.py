@@ -14,21 +14,22 @@ import seaborn as sns
 from pathlib import Path
 import plotly.graph_objects as go
 import plotly.express as px
-from scipy.cluster.hierarchy import dendrogram, linkage
-from scipy.spatial.distance import pdist
+from clustering import cluster_linkage, flat_clusters
+from coverage_cube import load_cube, rollup, concept_coverage
 
 # Configuration
 FINAL_DIR = Path('../output/final')
 VIZ_DIR = Path('../output/visualizations')
 VIZ_DIR.mkdir(parents=True, exist_ok=True)
 
+def load_matrix():
+    return pd.read_csv(FINAL_DIR / 'survey_concept_matrix.csv', index_col=0)
+
 def load_data():
-    """Load master dataset and matrix."""
-    master = pd.read_csv(FINAL_DIR / 'master_dataset.csv')
-    matrix = pd.read_csv(FINAL_DIR / 'survey_concept_matrix.csv', index_col=0)
-    return master, matrix
+    """Load coverage cube and matrix."""
+    return load_cube(), load_matrix()
 
-def viz1_coverage_gap_treemap(master_df):
+def viz1_coverage_gap_treemap(cube):
     """
     Visualization 1: Coverage Gap Analysis
     Treemap showing question count per subtopic, colored by topic.
@@ -37,15 +38,12 @@ def viz1_coverage_gap_treemap(master_df):
     print("\n1. COVERAGE GAP ANALYSIS (Treemap)")
     print("="*70)
     
-    # Filter to successfully categorized
-    valid = master_df[master_df['final_topic'].notna()].copy()
-    
-    # Count by topic and subtopic
-    coverage = valid.groupby(['final_topic', 'final_subtopic']).size().reset_index(name='count')
+    # Count by topic and subtopic (cube rollup over successfully categorized questions)
+    coverage = concept_coverage(cube)
     coverage = coverage.sort_values('count', ascending=False)
     
     print(f"   Total concepts covered: {len(coverage)}")
-    print(f"   Questions analyzed: {len(valid)}")
+    print(f"   Questions analyzed: {int(rollup(cube, ['topic']).sum())}")
     
     # Create treemap
     fig = px.treemap(
@@ -116,15 +114,12 @@ def viz2_clustered_heatmap(matrix_df):
         # Normalize by row (survey) to compare patterns not magnitudes
         matrix_norm = matrix_filtered.div(matrix_filtered.sum(axis=1), axis=0).fillna(0)
         
-        # Cluster surveys
-        survey_linkage = linkage(matrix_norm, method='ward')
-        survey_dendro = dendrogram(survey_linkage, no_plot=True)
-        survey_order = survey_dendro['leaves']
+        # Cluster surveys and concepts (optimal leaf order; cached by input hash)
+        survey_linkage = cluster_linkage(matrix_norm.to_numpy(), method='ward')
+        survey_order = survey_linkage.leaves
         
-        # Cluster concepts
-        concept_linkage = linkage(matrix_norm.T, method='ward')
-        concept_dendro = dendrogram(concept_linkage, no_plot=True)
-        concept_order = concept_dendro['leaves']
+        concept_linkage = cluster_linkage(matrix_norm.T.to_numpy(), method='ward')
+        concept_order = concept_linkage.leaves
         
         # Reorder matrix
         matrix_ordered = matrix_filtered.iloc[survey_order, concept_order]
@@ -163,8 +158,7 @@ def viz2_clustered_heatmap(matrix_df):
     
     # Identify survey clusters
     if len(matrix_filtered) > 1:
-        from scipy.cluster.hierarchy import fcluster
-        cluster_labels = fcluster(survey_linkage, t=5, criterion='maxclust')
+        cluster_labels = flat_clusters(survey_linkage, n_clusters=5)
         
         clusters = pd.DataFrame({
             'survey': matrix_filtered.index,
@@ -183,7 +177,7 @@ def viz2_clustered_heatmap(matrix_df):
         clusters.to_csv(VIZ_DIR / '2_survey_clusters.csv', index=False)
         print(f"\n   ✓ Saved: 2_survey_clusters.csv")
 
-def viz3_sankey_diagram(master_df):
+def viz3_sankey_diagram(cube):
     """
     Visualization 3: Sankey Diagram
     Flow from Surveys → Topics → Subtopics
@@ -191,34 +185,30 @@ def viz3_sankey_diagram(master_df):
     print("\n3. SANKEY DIAGRAM (Surveys → Topics → Subtopics)")
     print("="*70)
     
-    # Filter valid
-    valid = master_df[master_df['final_topic'].notna()].copy()
-    
-    # For visualization, limit to top 15 surveys by question count
-    top_surveys = valid['primary_survey'].value_counts().head(15).index
-    valid_filtered = valid[valid['primary_survey'].isin(top_surveys)].copy()
+    # For visualization, limit to top 15 surveys by question count (cube rollups; ties by name)
+    flows = rollup(cube, ['survey', 'topic', 'subtopic'])
+    survey_totals = rollup(cube, ['survey'])
+    top_surveys = survey_totals.sort_values(ascending=False, kind='stable').head(15).index
+    flows = flows[flows.index.get_level_values('survey').isin(top_surveys)]
     
     print(f"   Using top 15 surveys (for readability)")
-    print(f"   Questions: {len(valid_filtered)}")
+    print(f"   Questions: {int(survey_totals[top_surveys].sum())}")
     
     # Create flows
     # Survey → Topic
-    survey_topic = valid_filtered.groupby(['primary_survey', 'final_topic']).size().reset_index(name='count')
+    survey_topic = (flows.groupby(level=['survey', 'topic']).sum()
+                    .rename_axis(['primary_survey', 'final_topic']).reset_index(name='count'))
     
     # Topic → Subtopic (limit to top 30 subtopics per topic for readability)
-    topic_subtopic_list = []
-    for topic in valid_filtered['final_topic'].unique():
-        topic_data = valid_filtered[valid_filtered['final_topic'] == topic]
-        top_subtopics = topic_data['final_subtopic'].value_counts().head(30).index
-        topic_sub = topic_data[topic_data['final_subtopic'].isin(top_subtopics)]
-        topic_subtopic_list.append(
-            topic_sub.groupby(['final_topic', 'final_subtopic']).size().reset_index(name='count')
-        )
-    topic_subtopic = pd.concat(topic_subtopic_list)
+    topic_subtopic = (flows.groupby(level=['topic', 'subtopic']).sum()
+                      .rename_axis(['final_topic', 'final_subtopic']).reset_index(name='count'))
+    rank = (topic_subtopic.sort_values(['final_topic', 'count'], ascending=[True, False], kind='stable')
+            .groupby('final_topic').cumcount())
+    topic_subtopic = topic_subtopic[rank.reindex(topic_subtopic.index) < 30]
     
     # Create node labels and indices
     all_surveys = survey_topic['primary_survey'].unique().tolist()
-    all_topics = valid_filtered['final_topic'].unique().tolist()
+    all_topics = survey_topic['final_topic'].drop_duplicates().sort_values().tolist()
     all_subtopics = topic_subtopic['final_subtopic'].unique().tolist()
     
     node_labels = all_surveys + all_topics + all_subtopics
@@ -279,14 +269,14 @@ def main():
     
     # Load data
     print("\nLoading data...")
-    master_df, matrix_df = load_data()
-    print(f"   Master dataset: {len(master_df)} questions")
+    cube, matrix_df = load_data()
+    print(f"   Master dataset: {int(cube['questions'].sum())} questions")
     print(f"   Concept matrix: {matrix_df.shape[0]} surveys × {matrix_df.shape[1]} concepts")
     
     # Generate visualizations
-    viz1_coverage_gap_treemap(master_df)
+    viz1_coverage_gap_treemap(cube)
     viz2_clustered_heatmap(matrix_df)
-    viz3_sankey_diagram(master_df)
+    viz3_sankey_diagram(cube)
     
     print("\n" + "="*70)
     print("VISUALIZATIONS COMPLETE!")
@@ -4,21 +4,36 @@ LLM-based categorization of survey questions to Census taxonomy concepts.
 
 Sends questions in batches of 10 to both OpenAI and Claude APIs.
 Includes error handling, exponential backoff, and resume capability.
+
+With --shortlist, each batch's prompt carries only the taxonomy concepts
+its questions were shortlisted to (taxonomy_shortlist.py); questions
+without a confident shortlist are batched together with the full
+taxonomy. Answers are always checked against the full taxonomy.
+
+With --two-stage, a first call routes STAGE1_BATCH_SIZE questions at a
+time to top-level topics from the topic names alone; each topic's
+questions are then categorized in BATCH_SIZE batches with only that
+topic's subtopics in the prompt, starting as soon as their routing comes
+back rather than after all of stage one. Secondary concepts are limited
+to the routed topic.
+
+In every mode resume is by question id: questions already in the results
+files are skipped before batching. The checkpoint only records progress.
 """
 
-import os
 import json
 import time
-import re
 import pandas as pd
 from pathlib import Path
 from typing import List, Dict, Any
 from dotenv import load_dotenv
-import anthropic
-from openai import OpenAI
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import threading
+from collections import Counter
+from llm_providers import complete
+from retrying_executor import RetryingExecutor
+from taxonomy import Taxonomy, load_taxonomy
 
 # Load environment variables
 load_dotenv()
@@ -26,6 +41,9 @@ load_dotenv()
 # Configuration
 BATCH_SIZE = 10
 MAX_WORKERS = 6
+SHORTLIST = False  # Embedding-shortlisted taxonomy per batch (--shortlist)
+TWO_STAGE = False  # Topic first, then subtopic within the topic (--two-stage)
+STAGE1_BATCH_SIZE = 50  # Questions per stage-one (topic routing) call
 CHECKPOINT_FILE = Path('../output/categorization_checkpoint.json')
 RESULTS_DIR = Path('../output/results')
 
@@ -36,12 +54,36 @@ RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 # Thread-safe file writing
 write_lock = threading.Lock()
 
-def load_taxonomy() -> Dict[str, List[str]]:
-    """Load Census taxonomy from JSON file."""
-    taxonomy_path = Path('../data/raw/census_survey_explorer_taxonomy.json')
-    with open(taxonomy_path, 'r') as f:
-        data = json.load(f)
-    return data['taxonomy']
+# Off-taxonomy answers: snapped locally when possible, re-asked once otherwise
+REQUERY_OFF_TAXONOMY = True
+snap_counts = Counter()  # (model_role, exact | normalized | edit_distance | unresolved) -> answers
+snap_lock = threading.Lock()
+
+# Expected reply: one object per question in the batch
+CATEGORIZATION_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'required': ['id', 'primary_topic', 'primary_subtopic', 'confidence'],
+        'properties': {
+            'id': {'type': 'integer'},
+            'primary_topic': {'type': 'string', 'examples': ['Economic', 'Demographic']},
+            'primary_subtopic': {'type': 'string', 'examples': ['Income', 'Age']},
+            'confidence': {'type': 'number'},
+            'secondary_concepts': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'topic': {'type': 'string', 'examples': ['Economic']},
+                        'subtopic': {'type': 'string', 'examples': ['Employment Status']}
+                    }
+                }
+            },
+            'reasoning': {'type': 'string'}
+        }
+    }
+}
 
 def load_questions() -> pd.DataFrame:
     """Load survey questions from CSV."""
@@ -103,125 +145,109 @@ Return ONLY the JSON array, no other text."""
     return prompt
 
 def call_openai(batch: List[Dict[str, Any]], taxonomy: Dict[str, List[str]], 
-                max_retries: int = 5) -> List[Dict[str, Any]]:
-    """Call OpenAI API with exponential backoff."""
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    prompt = create_prompt(batch, taxonomy)
+                max_retries: int = 5, shortlist: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+    """Categorize a batch with gpt-5-mini, with exponential backoff."""
+    return _categorize(batch, taxonomy, 'categorize_openai', max_retries,
+                       system="You are a precise data categorization assistant.", shortlist=shortlist)
+
+def call_claude(batch: List[Dict[str, Any]], taxonomy: Dict[str, List[str]], 
+                max_retries: int = 5, shortlist: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+    """Categorize a batch with claude-haiku-4-5, with exponential backoff."""
+    return _categorize(batch, taxonomy, 'categorize_claude', max_retries, shortlist=shortlist)
+
+def snap_to_taxonomy(results: List[Dict[str, Any]], taxonomy: Taxonomy, model_role: str) -> List[Any]:
+    """
+    Snap each result's primary and secondary concepts onto the taxonomy in place.
+
+    A snapped primary keeps the model's answer in 'snapped_from'. Returns
+    the ids whose primary concept could not be resolved.
+    """
+    unresolved = []
+    methods = Counter()
+    for result in results:
+        topic, subtopic = result.get('primary_topic'), result.get('primary_subtopic')
+        snapped = taxonomy.snap(topic, subtopic)
+        if snapped is None:
+            unresolved.append(result.get('id'))
+            methods['unresolved'] += 1
+        else:
+            methods[snapped.method] += 1
+            if snapped.method != 'exact':
+                result['snapped_from'] = f"{topic}.{subtopic}"
+                result['primary_topic'], result['primary_subtopic'] = snapped.topic, snapped.subtopic
+        
+        for concept in result.get('secondary_concepts') or []:
+            if isinstance(concept, dict):
+                snapped = taxonomy.snap(concept.get('topic'), concept.get('subtopic'))
+                if snapped is not None:
+                    concept['topic'], concept['subtopic'] = snapped.topic, snapped.subtopic
     
-    for attempt in range(max_retries):
-        try:
-            response = client.chat.completions.create(
-                model="gpt-5-mini",
-                messages=[
-                    {"role": "system", "content": "You are a precise data categorization assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            content = response.choices[0].message.content
-            
-            # Aggressive cleaning for OpenAI's malformed JSON
-            # Remove control characters
-            import re
-            content = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', content)
-            
-            # Try to parse
-            try:
-                result = json.loads(content)
-            except json.JSONDecodeError as e:
-                # If it fails, try to extract just the array
-                # Find first [ and last ]
-                start = content.find('[')
-                end = content.rfind(']')
-                if start != -1 and end != -1:
-                    array_str = content[start:end+1]
-                    # Clean again
-                    array_str = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', array_str)
-                    result = json.loads(array_str)
-                else:
-                    raise e
-            
-            # Ensure result is a list
-            if not isinstance(result, list):
-                if isinstance(result, dict) and 'categorizations' in result:
-                    result = result['categorizations']
-                elif isinstance(result, dict) and len(result) == 1:
-                    result = list(result.values())[0]
-                else:
-                    print(f"  Unexpected response format: {type(result)}")
-                    return []
-            
-            # Verify it's actually a list now
-            if not isinstance(result, list):
-                print(f"  Could not extract list from response")
-                return []
-            
-            return result
-            
-        except Exception as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"  Error: {str(e)[:100]}. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"  Failed after {max_retries} attempts: {str(e)[:100]}")
-                return []
+    with snap_lock:
+        for method, count in methods.items():
+            snap_counts[(model_role, method)] += count
+    return unresolved
+
+def resolve_off_taxonomy(batch: List[Dict[str, Any]], results: List[Dict[str, Any]],
+                         taxonomy: Dict[str, List[str]], model_role: str, system: str = None) -> List[Dict[str, Any]]:
+    """
+    Snap a batch's results onto the taxonomy, re-asking only what can't be snapped.
     
-    return []
+    Questions whose primary concept is still off-taxonomy are sent once
+    more on their own; a re-asked answer replaces the first one only if it
+    resolves, and a failed re-ask keeps the first answers.
+    """
+    if not isinstance(taxonomy, Taxonomy):
+        taxonomy = Taxonomy(taxonomy)
+    unresolved = set(snap_to_taxonomy(results, taxonomy, model_role))
+    if not unresolved or not REQUERY_OFF_TAXONOMY:
+        return results
+    
+    retry_batch = [q for q in batch if q['id'] in unresolved]
+    try:
+        reply = complete(create_prompt(retry_batch, taxonomy), schema=CATEGORIZATION_SCHEMA,
+                         model_role=model_role, system=system)
+    except Exception as e:
+        print(f"  Re-ask of {len(retry_batch)} off-taxonomy answers failed: {str(e)[:100]}")
+        return results
+    retried = reply['parsed']
+    still_unresolved = set(snap_to_taxonomy(retried, taxonomy, model_role))
+    replacements = {r.get('id'): r for r in retried if r.get('id') in unresolved - still_unresolved}
+    return [replacements.get(r.get('id'), r) for r in results]
 
-def call_claude(batch: List[Dict[str, Any]], taxonomy: Dict[str, List[str]], 
-                max_retries: int = 5) -> List[Dict[str, Any]]:
-    """Call Claude API with exponential backoff."""
-    client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-    prompt = create_prompt(batch, taxonomy)
+def print_snap_summary(model_role: str):
+    """One line: how this process's answers for model_role matched the taxonomy."""
+    with snap_lock:
+        counts = {method: n for (role, method), n in snap_counts.items() if role == model_role}
+    if counts:
+        print(f"  Taxonomy check: {counts.get('exact', 0)} exact, "
+              f"{counts.get('normalized', 0) + counts.get('edit_distance', 0)} snapped, "
+              f"{counts.get('unresolved', 0)} unresolved answers")
+
+def _categorize(batch: List[Dict[str, Any]], taxonomy: Dict[str, List[str]], model_role: str,
+                max_retries: int, system: str = None, shortlist: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Send one batch to the model behind model_role; [] once retries are exhausted.
+    
+    The prompt lists `shortlist` (a subset of the taxonomy) when given;
+    answers are snapped against, and re-asked with, the full taxonomy.
+    """
+    prompt = create_prompt(batch, shortlist or taxonomy)
     
     for attempt in range(max_retries):
         try:
-            response = client.messages.create(
-                model="claude-haiku-4-5",
-                max_tokens=4096,
-                temperature=0,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            content = response.content[0].text
-            
-            # Strip markdown formatting if present
-            if content.startswith('```json'):
-                content = content.split('```json')[1]
-            if content.endswith('```'):
-                content = content.rsplit('```', 1)[0]
-            content = content.strip()
-            
-            result = json.loads(content)
-            
-            # Ensure result is a list
-            if not isinstance(result, list):
-                # Handle if wrapped in extra object
-                if isinstance(result, dict) and 'categorizations' in result:
-                    result = result['categorizations']
-                elif isinstance(result, dict) and len(result) == 1:
-                    result = list(result.values())[0]
-                else:
-                    print(f"  Unexpected response format: {type(result)}")
-                    return []
-            
-            # Verify it's actually a list now
-            if not isinstance(result, list):
-                print(f"  Could not extract list from response")
-                return []
-            
-            return result
+            # Reply is parsed (fences, control characters, wrapper objects) and
+            # checked against CATEGORIZATION_SCHEMA by the provider layer
+            reply = complete(prompt, schema=CATEGORIZATION_SCHEMA, model_role=model_role,
+                             system=system)
+            return resolve_off_taxonomy(batch, reply['parsed'], taxonomy, model_role, system)
             
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
-                print(f"  Error: {e}. Retrying in {wait_time}s...")
+                print(f"  Error: {str(e)[:100]}. Retrying in {wait_time}s...")
                 time.sleep(wait_time)
             else:
-                print(f"  Failed after {max_retries} attempts: {e}")
+                print(f"  Failed after {max_retries} attempts: {str(e)[:100]}")
                 return []
     
     return []
@@ -259,41 +285,62 @@ def save_results(results: List[Dict[str, Any]], model: str):
             for result in results:
                 f.write(json.dumps(result) + '\n')
 
-def process_batch(batch_idx: int, batch: List[Dict], taxonomy: Dict, model: str, api_call) -> tuple:
+def process_batch(batch_idx: int, batch: List[Dict], taxonomy: Dict, model: str, api_call,
+                  shortlist: Dict = None) -> tuple:
     """Process a single batch (for parallel execution)."""
-    results = api_call(batch, taxonomy)
+    results = api_call(batch, taxonomy, shortlist=shortlist) if shortlist else api_call(batch, taxonomy)
     return (batch_idx, results)
 
+def create_batches(questions_df: pd.DataFrame, taxonomy: Taxonomy, shortlist: bool = False) -> List[tuple]:
+    """[(batch, prompt taxonomy or None for the full one)]; shortlist batches are regrouped by concept."""
+    questions = questions_df.to_dict('records')
+    if not shortlist:
+        return [(questions[i:i + BATCH_SIZE], None) for i in range(0, len(questions), BATCH_SIZE)]
+    
+    from taxonomy_shortlist import shortlist_batches
+    batches = shortlist_batches(questions, taxonomy, BATCH_SIZE)
+    shortlisted = [b for b, s in batches if s is not None]
+    sizes = [sum(len(v) for v in s.values()) for _, s in batches if s is not None]
+    print(f"Shortlist: {sum(map(len, shortlisted))} questions in {len(shortlisted)} batches "
+          f"(mean {sum(sizes) / max(len(sizes), 1):.1f} of {len(taxonomy.concepts)} concepts per prompt), "
+          f"{sum(len(b) for b, s in batches if s is None)} on the full taxonomy")
+    return batches
+
 def process_model(questions_df: pd.DataFrame, taxonomy: Dict[str, List[str]], 
-                  model: str, start_batch: int = 0):
-    """Process all questions for a given model (parallel)."""
+                  model: str, shortlist: bool = SHORTLIST):
+    """
+    Process all questions for a given model (parallel).
+    
+    Resumes by skipping ids already in the results file before batching
+    (shortlist batches are regrouped, so a batch index would not line up).
+    """
     
     print(f"\n{'='*70}")
     print(f"Processing with {model.upper()} ({MAX_WORKERS} workers)")
     print(f"{'='*70}")
     
-    # Create batches
-    questions = questions_df.to_dict('records')
-    batches = [questions[i:i + BATCH_SIZE] for i in range(0, len(questions), BATCH_SIZE)]
+    # Create batches from the questions not done yet
+    done = completed_ids(model)
+    remaining = questions_df[~questions_df['id'].isin(done)]
+    batches = create_batches(remaining, taxonomy, shortlist)
     
-    # Process from checkpoint
     total_batches = len(batches)
+    print(f"Questions: {len(remaining)} ({len(questions_df) - len(remaining)} already done)")
     print(f"Total batches: {total_batches}")
-    print(f"Starting from batch: {start_batch}")
     
     api_call = call_openai if model == 'openai' else call_claude
     
     # Parallel processing
-    completed_count = start_batch
+    completed_count = load_checkpoint().get(f'{model}_batch', 0)
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         # Submit all batches
         future_to_batch = {
-            executor.submit(process_batch, batch_idx, batches[batch_idx], taxonomy, model, api_call): batch_idx
-            for batch_idx in range(start_batch, total_batches)
+            executor.submit(process_batch, batch_idx, batch, taxonomy, model, api_call, prompt_taxonomy): batch_idx
+            for batch_idx, (batch, prompt_taxonomy) in enumerate(batches)
         }
         
         # Process as they complete
-        with tqdm(total=total_batches - start_batch, desc=f"  {model}") as pbar:
+        with tqdm(total=total_batches, desc=f"  {model}") as pbar:
             for future in as_completed(future_to_batch):
                 batch_idx, results = future.result()
                 
@@ -301,7 +348,7 @@ def process_model(questions_df: pd.DataFrame, taxonomy: Dict[str, List[str]],
                     # Save results
                     save_results(results, model)
                     
-                    # Update checkpoint
+                    # Update checkpoint (batches completed, for progress only)
                     completed_count += 1
                     checkpoint = load_checkpoint()
                     checkpoint[f'{model}_batch'] = completed_count
@@ -311,6 +358,195 @@ def process_model(questions_df: pd.DataFrame, taxonomy: Dict[str, List[str]],
                 
                 pbar.update(1)
     
+    print_snap_summary('categorize_openai' if model == 'openai' else 'categorize_claude')
+    
+    print(f"\n{model.upper()} processing complete!")
+
+# Two-stage mode: stage one routes questions to a topic from topic names only;
+# stage two picks the subtopic with just that topic's subtopics in the prompt
+def topic_schema(topics: List[str]) -> Dict[str, Any]:
+    """Expected stage-one reply: one {id, topic} object per question."""
+    return {
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'required': ['id', 'topic'],
+            'properties': {
+                'id': {'type': 'integer'},
+                'topic': {'type': 'string', 'enum': list(topics)},
+                'confidence': {'type': 'number'}
+            }
+        }
+    }
+
+def create_topic_prompt(batch: List[Dict[str, Any]], topics: List[str]) -> str:
+    """Stage-one prompt: route each question to one top-level topic."""
+    
+    prompt = f"""You are routing federal survey questions to top-level topics of the official U.S. Census Bureau taxonomy.
+
+TOPICS:
+{json.dumps(list(topics))}
+
+TASK:
+For each question below, choose the single most relevant topic from TOPICS
+and give a 0-1 confidence score.
+
+QUESTIONS:
+{json.dumps(batch, indent=2)}
+
+Return a JSON array with one object per question, in the same order. Format:
+[
+  {{"id": 0, "topic": "Economic", "confidence": 0.9}},
+  ...
+]
+
+Return ONLY the JSON array, no other text."""
+    
+    return prompt
+
+def classify_topics(batch: List[Dict[str, Any]], taxonomy: Taxonomy, model_role: str,
+                    system: str = None) -> Dict[Any, str]:
+    """
+    Stage one: {question id: taxonomy topic, or None if unresolved}.
+    
+    Raises on a failed call so the executor retries it.
+    """
+    reply = complete(create_topic_prompt(batch, list(taxonomy)), schema=topic_schema(list(taxonomy)),
+                     model_role=model_role, system=system)
+    routed = {r.get('id'): taxonomy.snap_topic(r.get('topic')) for r in reply['parsed'] if isinstance(r, dict)}
+    return {q['id']: routed.get(q['id']) for q in batch}
+
+def categorize_within_topic(batch: List[Dict[str, Any]], topic: str, taxonomy: Taxonomy, model_role: str,
+                            system: str = None) -> List[Dict[str, Any]]:
+    """
+    Stage two: primary and secondary concepts for questions routed to topic.
+    
+    The prompt lists only topic's subtopics (the full taxonomy when topic
+    is None); answers are snapped against, and re-asked with, the full
+    taxonomy. Raises on a failed call so the executor retries it.
+    """
+    prompt_taxonomy = {topic: taxonomy[topic]} if topic is not None else taxonomy
+    reply = complete(create_prompt(batch, prompt_taxonomy), schema=CATEGORIZATION_SCHEMA,
+                     model_role=model_role, system=system)
+    results = reply['parsed']
+    for result in results:
+        if topic is not None and not result.get('primary_topic'):
+            result['primary_topic'] = topic
+    return resolve_off_taxonomy(batch, results, taxonomy, model_role, system)
+
+def completed_ids(model: str) -> set:
+    """Question ids already in results_{model}.jsonl (completion check and resume)."""
+    output_file = RESULTS_DIR / f'results_{model}.jsonl'
+    done = set()
+    if output_file.exists():
+        with open(output_file, 'r') as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line).get('id'))
+                except json.JSONDecodeError:
+                    continue
+    return done
+
+def process_model_two_stage(questions_df: pd.DataFrame, taxonomy: Taxonomy, model: str):
+    """
+    Two-stage categorization for one model, stage two streaming behind stage one.
+    
+    At most MAX_WORKERS stage-one batches (STAGE1_BATCH_SIZE questions) are
+    outstanding at a time. As each returns, its questions join per-topic
+    queues and every queue holding BATCH_SIZE questions goes straight to
+    stage two, ahead of the next stage-one batch; partial queues are
+    flushed once stage one is done. Questions stage one could not route
+    (or whose stage-one batch failed) are categorized against the full
+    taxonomy. Resumes by skipping ids already in the results file.
+    """
+    if not isinstance(taxonomy, Taxonomy):
+        taxonomy = Taxonomy(taxonomy)
+    model_role = 'categorize_openai' if model == 'openai' else 'categorize_claude'
+    system = "You are a precise data categorization assistant." if model == 'openai' else None
+    
+    print(f"\n{'='*70}")
+    print(f"Processing with {model.upper()} - two-stage ({MAX_WORKERS} in flight)")
+    print(f"{'='*70}")
+    
+    done = completed_ids(model)
+    questions = [q for q in questions_df.to_dict('records') if q['id'] not in done]
+    stage1_batches = [questions[i:i + STAGE1_BATCH_SIZE] for i in range(0, len(questions), STAGE1_BATCH_SIZE)]
+    print(f"Questions: {len(questions)} ({len(done)} already done)")
+    print(f"Stage 1 batches: {len(stage1_batches)} of up to {STAGE1_BATCH_SIZE}")
+    
+    queues = {}          # topic (None = full taxonomy) -> questions waiting for stage two
+    pending = {}         # future -> (stage, batch, topic)
+    routed = Counter()   # topic -> questions routed
+    prompt_chars = {1: [], 2: []}
+    failed = 0
+    next_stage1 = 0
+    
+    with RetryingExecutor(max_in_flight=MAX_WORKERS) as executor, \
+            tqdm(total=len(questions), desc=f"  {model}") as pbar:
+        
+        def submit_stage1():
+            nonlocal next_stage1
+            batch = stage1_batches[next_stage1]
+            next_stage1 += 1
+            prompt_chars[1].append(len(create_topic_prompt(batch, list(taxonomy))))
+            future = executor.submit(classify_topics, batch, taxonomy, model_role, system,
+                                     description=f"{model} topic batch {next_stage1}")
+            pending[future] = (1, batch, None)
+        
+        def submit_stage2(topic, minimum):
+            while len(queues.get(topic, [])) >= minimum and queues[topic]:
+                batch, queues[topic] = queues[topic][:BATCH_SIZE], queues[topic][BATCH_SIZE:]
+                prompt_chars[2].append(len(create_prompt(batch, {topic: taxonomy[topic]} if topic else taxonomy)))
+                future = executor.submit(categorize_within_topic, batch, topic, taxonomy, model_role, system,
+                                         description=f"{model} {topic or 'full taxonomy'} batch")
+                pending[future] = (2, batch, topic)
+        
+        for _ in range(min(MAX_WORKERS, len(stage1_batches))):
+            submit_stage1()
+        
+        while pending:
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, batch, topic = pending.pop(future)
+                
+                if stage == 1:
+                    try:
+                        routes = future.result()
+                    except Exception:
+                        routes = {}
+                    for question in batch:
+                        topic = routes.get(question['id'])
+                        routed[topic] += 1
+                        queues.setdefault(topic, []).append(question)
+                    # Full batches go to stage two before the next stage-one batch
+                    for topic in list(queues):
+                        submit_stage2(topic, BATCH_SIZE)
+                    if next_stage1 < len(stage1_batches):
+                        submit_stage1()
+                    elif not any(s == 1 for s, _, _ in pending.values()):
+                        for topic in list(queues):
+                            submit_stage2(topic, 1)
+                else:
+                    try:
+                        results = future.result()
+                    except Exception:
+                        results = []
+                    if results:
+                        save_results(results, model)
+                    else:
+                        failed += len(batch)
+                        print(f"\n  Warning: {topic or 'full taxonomy'} batch failed for {model}")
+                    pbar.update(len(batch))
+    
+    single_stage = len(create_prompt(questions[:BATCH_SIZE], taxonomy)) if questions else 0
+    mean = lambda sizes: sum(sizes) / max(len(sizes), 1)
+    print(f"\n  Stage 1: {len(prompt_chars[1])} calls, mean {mean(prompt_chars[1]):,.0f} prompt chars")
+    print(f"  Stage 2: {len(prompt_chars[2])} calls, mean {mean(prompt_chars[2]):,.0f} prompt chars "
+          f"(single-stage prompt: {single_stage:,} chars)")
+    print(f"  Routed to {sum(1 for t in routed if t is not None)} topics; "
+          f"{routed[None]} questions on the full taxonomy; {failed} failed")
+    print_snap_summary(model_role)
+    
     print(f"\n{model.upper()} processing complete!")
 
 def main():
@@ -320,12 +556,15 @@ def main():
     # Check for model argument
     run_openai = True
     run_claude = True
+    shortlist = SHORTLIST or '--shortlist' in sys.argv
+    two_stage = TWO_STAGE or '--two-stage' in sys.argv
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--openai-only':
-            run_claude = False
-        elif sys.argv[1] == '--claude-only':
-            run_openai = False
+    if '--openai-only' in sys.argv:
+        run_claude = False
+    elif '--claude-only' in sys.argv:
+        run_openai = False
+    if two_stage and shortlist:
+        print("Note: --two-stage replaces --shortlist (prompts are already per topic)")
     
     print("="*70)
     print("LLM-BASED SURVEY QUESTION CATEGORIZATION")
@@ -340,23 +579,22 @@ def main():
     
     # Load checkpoint
     checkpoint = load_checkpoint()
-    print(f"\nCheckpoint: OpenAI batch {checkpoint['openai_batch']}, Claude batch {checkpoint['claude_batch']}")
+    print(f"\nCheckpoint: OpenAI {checkpoint['openai_batch']} batches, Claude {checkpoint['claude_batch']} batches done")
     
     # Run both APIs in parallel
     with ThreadPoolExecutor(max_workers=2) as executor:
         futures = []
         
-        # Submit OpenAI
-        if run_openai and checkpoint['openai_batch'] < len(questions_df) // BATCH_SIZE + 1:
-            futures.append(executor.submit(process_model, questions_df, taxonomy, 'openai', checkpoint['openai_batch']))
-        elif run_openai:
-            print("\nOpenAI processing already complete (skipping)")
-        
-        # Submit Claude
-        if run_claude and checkpoint['claude_batch'] < len(questions_df) // BATCH_SIZE + 1:
-            futures.append(executor.submit(process_model, questions_df, taxonomy, 'claude', checkpoint['claude_batch']))
-        elif run_claude:
-            print("\nClaude processing already complete (skipping)")
+        for model, label, run in (('openai', 'OpenAI', run_openai), ('claude', 'Claude', run_claude)):
+            if not run:
+                continue
+            # Done when every question has a result, whatever the batching mode
+            if set(questions_df['id']) <= completed_ids(model):
+                print(f"\n{label} processing already complete (skipping)")
+            elif two_stage:
+                futures.append(executor.submit(process_model_two_stage, questions_df, taxonomy, model))
+            else:
+                futures.append(executor.submit(process_model, questions_df, taxonomy, model, shortlist))
         
         # Wait for both to complete
         for future in as_completed(futures):
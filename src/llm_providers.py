@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Provider layer for every LLM call in the pipeline.
+
+Scripts ask for a model *role* instead of naming a model and building a
+client themselves:
+
+    from llm_providers import complete
+    reply = complete(prompt, schema=ARBITRATION_SCHEMA, model_role='arbitrator')
+    reply['parsed'], reply['usage'], reply['latency']
+
+- MODEL_ROLES maps each role to a provider and model (one place to change models)
+- One client per provider, created lazily and shared by all threads, so
+  HTTP connections are kept alive and reused; every call has a timeout
+- SDK-level retries are off: retry policy belongs to the caller
+  (RetryingExecutor or the script's own backoff loop)
+- With a schema, the reply is parsed (markdown fences, stray control
+  characters, prose around the JSON) and checked for type and required
+  keys; anything unusable raises MalformedResponseError so it is retried
+- Every reply carries token usage and wall-clock latency, and every
+  attempt (including failures) is recorded by llm_telemetry.py
+
+Offline mode:
+    LLM_PROVIDER=mock routes every role to MockProvider, an in-process
+    stand-in with a configurable latency distribution and injected 429s,
+    500s and malformed JSON. Replies are generated from the schema, so the
+    full pipeline (concurrency, retries, checkpoints) runs without API keys.
+
+    MOCK_LATENCY=lognormal:1.5:0.5   (constant:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA)
+    MOCK_RATE_429=0.02  MOCK_RATE_500=0.01  MOCK_RATE_MALFORMED=0.01  MOCK_SEED=42
+    MOCK_RPM=500   (per-model requests/minute; calls over the limit get a 429)
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import threading
+import zlib
+from typing import Dict, Any, List, Callable, Optional
+from llm_telemetry import record_call
+
+# Role -> provider and model
+MODEL_ROLES = {
+    'categorize_openai': {'provider': 'openai', 'model': 'gpt-5-mini'},
+    'categorize_claude': {'provider': 'anthropic', 'model': 'claude-haiku-4-5'},
+    'arbitrator': {'provider': 'anthropic', 'model': 'claude-sonnet-4-5'},
+    'qc': {'provider': 'openai', 'model': 'gpt-5.2'},
+}
+
+REQUEST_TIMEOUT = 120.0   # seconds per call
+DEFAULT_MAX_TOKENS = 4096  # Anthropic requires an explicit limit
+
+class ProviderError(Exception):
+    """An LLM call failed in a way the caller may retry."""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class RateLimitError(ProviderError):
+    """HTTP 429 from the provider."""
+
+class ServerError(ProviderError):
+    """HTTP 5xx (or timeout) from the provider."""
+
+class MalformedResponseError(ProviderError):
+    """Reply did not contain JSON matching the requested schema."""
+
+def _wrap_sdk_error(e: Exception) -> Exception:
+    """Map SDK exceptions onto ProviderError subclasses by status code."""
+    status = getattr(e, 'status_code', None)
+    if status == 429:
+        return RateLimitError(str(e), status)
+    if status is not None and status >= 500:
+        return ServerError(str(e), status)
+    if 'timeout' in type(e).__name__.lower():
+        return ServerError(str(e))
+    return e
+
+class OpenAIProvider:
+    """Chat completions through one shared, pooled OpenAI client."""
+
+    name = 'openai'
+
+    def __init__(self, timeout: float = REQUEST_TIMEOUT):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), timeout=timeout, max_retries=0)
+
+    def complete(self, prompt: str, model: str, system: str = None,
+                 max_tokens: int = None, model_role: str = None) -> Dict[str, Any]:
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        kwargs = {'max_completion_tokens': max_tokens} if max_tokens else {}
+        try:
+            response = self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        except Exception as e:
+            raise _wrap_sdk_error(e) from e
+
+        usage = response.usage
+        details = getattr(usage, 'prompt_tokens_details', None)
+        return {
+            'text': response.choices[0].message.content or '',
+            'usage': {
+                'input_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+                'output_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+                'cached_tokens': getattr(details, 'cached_tokens', 0) or 0,
+            }
+        }
+
+class AnthropicProvider:
+    """Messages API through one shared, pooled Anthropic client."""
+
+    name = 'anthropic'
+
+    def __init__(self, timeout: float = REQUEST_TIMEOUT):
+        import anthropic
+        self.client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), timeout=timeout, max_retries=0)
+
+    def complete(self, prompt: str, model: str, system: str = None,
+                 max_tokens: int = None, model_role: str = None) -> Dict[str, Any]:
+        kwargs = {'system': system} if system else {}
+        try:
+            response = self.client.messages.create(
+                model=model,
+                max_tokens=max_tokens or DEFAULT_MAX_TOKENS,
+                temperature=0,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            )
+        except Exception as e:
+            raise _wrap_sdk_error(e) from e
+
+        usage = response.usage
+        return {
+            'text': response.content[0].text,
+            'usage': {
+                'input_tokens': getattr(usage, 'input_tokens', 0) or 0,
+                'output_tokens': getattr(usage, 'output_tokens', 0) or 0,
+                'cached_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+            }
+        }
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'constant:S' | 'uniform:LO:HI' | 'lognormal:MEDIAN:SIGMA' -> sampler(rng) in seconds."""
+    kind, *params = spec.split(':')
+    params = [float(p) for p in params]
+    if kind == 'constant':
+        return lambda rng: params[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def batch_ids(prompt: str) -> List[Any]:
+    """Ids of the first JSON array of {'id': ...} objects embedded in the prompt (the batch)."""
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r'\[', prompt):
+        try:
+            value, _ = decoder.raw_decode(prompt, match.start())
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, list) and value and all(isinstance(v, dict) and 'id' in v for v in value):
+            return [v['id'] for v in value]
+    return []
+
+def _fake_value(schema: Dict[str, Any], rng: random.Random, ids: List[Any]):
+    """Schema-conforming placeholder value (enum/examples when given)."""
+    kind = schema.get('type')
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+    if 'examples' in schema:
+        return rng.choice(schema['examples'])
+    if kind == 'object':
+        return {key: _fake_value(sub, rng, ids) for key, sub in schema.get('properties', {}).items()}
+    if kind == 'array':
+        items = schema.get('items', {})
+        if items.get('type') == 'object' and 'id' in items.get('properties', {}) and ids:
+            return [dict(_fake_value(items, rng, ids), id=qid) for qid in ids]
+        return [_fake_value(items, rng, ids)] if items else []
+    if kind == 'number':
+        return round(rng.uniform(0.5, 1.0), 2)
+    if kind == 'integer':
+        return 0
+    if kind == 'boolean':
+        return rng.random() < 0.5
+    return 'mock'
+
+class MockProvider:
+    """
+    Deterministic in-process stand-in for load testing.
+
+    Each call is first checked against a per-model requests-per-minute
+    token bucket (429 when empty), sleeps for a latency drawn from the
+    configured distribution, then either raises an injected 429/500,
+    returns malformed JSON, or returns a reply generated from the schema. Draws are seeded from the
+    prompt and how many times it has been sent, so a rerun with the same
+    settings sees the same failures on the same calls.
+
+    responder: optional fn(prompt, schema, model_role) -> reply text, e.g.
+               to replay recorded results instead of generating them;
+               returning None falls back to a generated reply
+    """
+
+    name = 'mock'
+
+    def __init__(self, latency: str = 'lognormal:1.5:0.5', rate_429: float = 0.0,
+                 rate_500: float = 0.0, rate_malformed: float = 0.0, rpm: float = None,
+                 seed: int = 42, responder: Callable[[str, Optional[Dict[str, Any]], str], str] = None):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_malformed = rate_malformed
+        self.rpm = rpm
+        self.seed = seed
+        self.responder = responder
+        self._sends = {}
+        self._buckets = {}  # model -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'MockProvider':
+        return cls(
+            latency=os.getenv('MOCK_LATENCY', 'lognormal:1.5:0.5'),
+            rate_429=float(os.getenv('MOCK_RATE_429', 0)),
+            rate_500=float(os.getenv('MOCK_RATE_500', 0)),
+            rate_malformed=float(os.getenv('MOCK_RATE_MALFORMED', 0)),
+            rpm=float(os.getenv('MOCK_RPM')) if os.getenv('MOCK_RPM') else None,
+            seed=int(os.getenv('MOCK_SEED', 42))
+        )
+
+    def _rng(self, prompt: str) -> random.Random:
+        key = zlib.crc32(prompt.encode('utf-8'))
+        with self._lock:
+            attempt = self._sends.get(key, 0)
+            self._sends[key] = attempt + 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+    def _admit(self, model: str) -> bool:
+        """Take one request token for model; False when the bucket is empty."""
+        if not self.rpm:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            capacity = max(1.0, self.rpm / 60)  # Bursts of up to one second's worth
+            tokens, last = self._buckets.get(model, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * self.rpm / 60)
+            admitted = tokens >= 1
+            self._buckets[model] = (tokens - 1 if admitted else tokens, now)
+        return admitted
+
+    def complete(self, prompt: str, model: str, system: str = None, max_tokens: int = None,
+                 model_role: str = None, schema: Dict[str, Any] = None) -> Dict[str, Any]:
+        rng = self._rng(prompt)
+        if not self._admit(model):
+            time.sleep(0.05)  # Rejections are fast, not free
+            raise RateLimitError(f"Mock 429: over {self.rpm:g} requests/minute for {model}", 429)
+        time.sleep(self.sample_latency(rng))
+
+        roll = rng.random()
+        if roll < self.rate_429:
+            raise RateLimitError("Mock 429: rate limit exceeded", 429)
+        if roll < self.rate_429 + self.rate_500:
+            raise ServerError("Mock 500: internal server error", 500)
+
+        text = self.responder(prompt, schema, model_role) if self.responder is not None else None
+        if text is None:
+            text = json.dumps(_fake_value(schema, rng, batch_ids(prompt)), indent=2) if schema is not None else 'mock'
+
+        if rng.random() < self.rate_malformed:
+            # Truncated mid-reply, like a cut-off generation
+            text = text[:max(1, int(len(text) * rng.uniform(0.2, 0.8)))]
+
+        return {
+            'text': text,
+            'usage': {
+                'input_tokens': (len(prompt) + len(system or '')) // 4,
+                'output_tokens': len(text) // 4,
+                'cached_tokens': 0,
+            }
+        }
+
+# Shared provider instances (one pooled client per provider per process)
+_providers = {}
+_providers_lock = threading.Lock()
+
+def get_provider(name: str):
+    """Shared provider instance; LLM_PROVIDER=mock overrides every real provider."""
+    if os.getenv('LLM_PROVIDER', '').lower() == 'mock':
+        name = 'mock'
+    with _providers_lock:
+        if name not in _providers:
+            if name == 'openai':
+                _providers[name] = OpenAIProvider()
+            elif name == 'anthropic':
+                _providers[name] = AnthropicProvider()
+            elif name == 'mock':
+                _providers[name] = MockProvider.from_env()
+            else:
+                raise ValueError(f"Unknown provider: {name}")
+        return _providers[name]
+
+def set_provider(name: str, provider):
+    """Install a provider instance (e.g. a configured MockProvider) under a name."""
+    with _providers_lock:
+        _providers[name] = provider
+
+def extract_json(content: str):
+    """
+    Pull a JSON value out of an LLM reply.
+
+    Tries, in order: the reply as-is; with markdown fences and control
+    characters stripped; the first balanced {...} or [...] block.
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', content, re.DOTALL)
+    if fenced:
+        content = fenced.group(1)
+    # Control characters (incl. raw newlines inside strings) are never needed between JSON tokens
+    content = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', content).strip()
+
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+
+    # First complete JSON object or array (whichever opens first)
+    starts = [i for i in (content.find('{'), content.find('[')) if i != -1]
+    if not starts:
+        raise MalformedResponseError("No JSON found in reply")
+    start = min(starts)
+    opener = content[start]
+    closer = '}' if opener == '{' else ']'
+    depth = 0
+    in_string = False
+    escaped = False
+    for i, char in enumerate(content[start:], start):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == opener:
+            depth += 1
+        elif char == closer:
+            depth -= 1
+            if depth == 0:
+                try:
+                    return json.loads(content[start:i+1])
+                except json.JSONDecodeError as e:
+                    raise MalformedResponseError(f"Could not extract valid JSON: {e}")
+    raise MalformedResponseError("No complete JSON value found in reply")
+
+def _check_schema(value, schema: Dict[str, Any]):
+    """Check top-level type and required keys (of the object, or of each array item)."""
+    kind = schema.get('type')
+    if kind == 'array':
+        if isinstance(value, dict) and len(value) == 1 and isinstance(next(iter(value.values())), list):
+            # Array wrapped in a single-key object, e.g. {"categorizations": [...]}
+            value = next(iter(value.values()))
+        if not isinstance(value, list):
+            raise MalformedResponseError(f"Expected JSON array, got {type(value).__name__}")
+        required = schema.get('items', {}).get('required', [])
+        for item in value:
+            if not isinstance(item, dict) or any(key not in item for key in required):
+                raise MalformedResponseError(f"Array item missing required keys {required}")
+    elif kind == 'object':
+        if not isinstance(value, dict):
+            raise MalformedResponseError(f"Expected JSON object, got {type(value).__name__}")
+        missing = [key for key in schema.get('required', []) if key not in value]
+        if missing:
+            raise MalformedResponseError(f"Reply missing required keys {missing}")
+    return value
+
+def _outcome(e: Exception) -> str:
+    """Telemetry outcome label for a failed attempt."""
+    if isinstance(e, RateLimitError):
+        return 'rate_limited'
+    if isinstance(e, ServerError):
+        return 'server_error'
+    if isinstance(e, MalformedResponseError):
+        return 'malformed'
+    return 'error'
+
+def complete(prompt: str, schema: Dict[str, Any] = None, model_role: str = 'categorize_openai',
+             system: str = None, max_tokens: int = None) -> Dict[str, Any]:
+    """
+    Send one prompt to the model behind a role.
+
+    Args:
+        prompt: User message
+        schema: Optional JSON schema (type/properties/required/items); when
+                given, the reply is parsed and validated into 'parsed'
+        model_role: Key of MODEL_ROLES
+        system: Optional system message
+        max_tokens: Optional output token limit
+
+    Returns:
+        Dict with text, parsed (None without schema), usage (input_tokens,
+        output_tokens, cached_tokens), latency (seconds), provider, model,
+        model_role
+
+    Raises:
+        RateLimitError / ServerError on retryable API failures,
+        MalformedResponseError when the reply does not match the schema
+    """
+    role = MODEL_ROLES[model_role]
+    provider = get_provider(role['provider'])
+
+    kwargs = {'schema': schema} if isinstance(provider, MockProvider) else {}
+    start = time.perf_counter()
+    try:
+        reply = provider.complete(prompt, role['model'], system=system, max_tokens=max_tokens,
+                                  model_role=model_role, **kwargs)
+    except Exception as e:
+        record_call(model_role, provider.name, role['model'], prompt, None,
+                    time.perf_counter() - start, _outcome(e), str(e))
+        raise
+    latency = time.perf_counter() - start
+
+    try:
+        parsed = _check_schema(extract_json(reply['text']), schema) if schema is not None else None
+    except MalformedResponseError as e:
+        # Tokens were still spent
+        record_call(model_role, provider.name, role['model'], prompt, reply['usage'], latency, 'malformed', str(e))
+        raise
+    record_call(model_role, provider.name, role['model'], prompt, reply['usage'], latency, 'ok')
+
+    return {
+        'text': reply['text'],
+        'parsed': parsed,
+        'usage': reply['usage'],
+        'latency': latency,
+        'provider': provider.name,
+        'model': role['model'],
+        'model_role': model_role
+    }
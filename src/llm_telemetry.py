@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Per-call token, cost and latency telemetry for LLM calls.
+
+llm_providers.complete() records every attempt - successful or not - with
+provider, model, role, input/cached/output tokens, latency, outcome and
+cost (zero for the offline mock provider). Rows are buffered and
+appended to a local SQLite store, so each pipeline stage (a separate
+process under run_pipeline.py) adds to the same file.
+
+Retries are derived, not guessed: attempts carry a hash of their prompt,
+so repeated attempts of one logical call share a key within a stage.
+
+- run_id: PIPELINE_RUN_ID (set by run_pipeline.py), else one id per process
+- stage: PIPELINE_STAGE (set by run_pipeline.py), else the script name
+
+Outputs:
+    ../output/telemetry/llm_calls.sqlite   (table llm_calls)
+    ../output/telemetry/llm_metrics.prom   (Prometheus textfile / OpenMetrics)
+"""
+
+import os
+import sys
+import atexit
+import sqlite3
+import threading
+import zlib
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List
+
+# Configuration
+TELEMETRY_DIR = Path('../output/telemetry')
+STORE_FILE = TELEMETRY_DIR / 'llm_calls.sqlite'
+PROMETHEUS_FILE = TELEMETRY_DIR / 'llm_metrics.prom'
+FLUSH_EVERY = 50  # Buffered rows per SQLite write
+
+# USD per 1M tokens: (input, cached input, output). Update from the providers' price sheets.
+MODEL_PRICING = {
+    'gpt-5-mini': (0.25, 0.025, 2.00),
+    'gpt-5.2': (1.75, 0.175, 14.00),
+    'claude-haiku-4-5': (1.00, 0.10, 5.00),
+    'claude-sonnet-4-5': (3.00, 0.30, 15.00),
+}
+
+LATENCY_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60, 120]  # seconds
+
+COLUMNS = {
+    'ts': 'REAL',
+    'run_id': 'TEXT',
+    'stage': 'TEXT',
+    'model_role': 'TEXT',
+    'provider': 'TEXT',
+    'model': 'TEXT',
+    'prompt_hash': 'INTEGER',
+    'input_tokens': 'INTEGER',
+    'cached_tokens': 'INTEGER',
+    'output_tokens': 'INTEGER',
+    'latency_s': 'REAL',
+    'outcome': 'TEXT',   # ok | rate_limited | server_error | malformed | error
+    'error': 'TEXT',
+    'cost_usd': 'REAL',
+}
+
+_PROCESS_RUN_ID = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+_buffer: List[Dict[str, Any]] = []
+_session: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+
+def current_run_id() -> str:
+    return os.getenv('PIPELINE_RUN_ID') or _PROCESS_RUN_ID
+
+def current_stage() -> str:
+    return os.getenv('PIPELINE_STAGE') or Path(sys.argv[0]).stem or 'interactive'
+
+def call_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """USD cost of one call; cached tokens are billed at the cached rate instead of the input rate."""
+    if model not in MODEL_PRICING:
+        return 0.0
+    input_rate, cached_rate, output_rate = MODEL_PRICING[model]
+    uncached = max(0, input_tokens - cached_tokens)
+    return (uncached * input_rate + cached_tokens * cached_rate + output_tokens * output_rate) / 1e6
+
+def record_call(model_role: str, provider: str, model: str, prompt: str, usage: Dict[str, int],
+                latency: float, outcome: str, error: str = None):
+    """Buffer one attempt's telemetry (flushed every FLUSH_EVERY rows and at exit)."""
+    usage = usage or {}
+    row = {
+        'ts': datetime.now().timestamp(),
+        'run_id': current_run_id(),
+        'stage': current_stage(),
+        'model_role': model_role,
+        'provider': provider,
+        'model': model,
+        'prompt_hash': zlib.crc32(prompt.encode('utf-8')),
+        'input_tokens': usage.get('input_tokens', 0),
+        'cached_tokens': usage.get('cached_tokens', 0),
+        'output_tokens': usage.get('output_tokens', 0),
+        'latency_s': latency,
+        'outcome': outcome,
+        'error': error[:200] if error else None,
+        'cost_usd': 0.0 if provider == 'mock' else call_cost(
+            model, usage.get('input_tokens', 0), usage.get('cached_tokens', 0), usage.get('output_tokens', 0)),
+    }
+    with _lock:
+        _buffer.append(row)
+        _session.append(row)
+        should_flush = len(_buffer) >= FLUSH_EVERY
+    if should_flush:
+        flush()
+
+def flush(path: Path = None):
+    """Append buffered rows to the SQLite store."""
+    path = path or STORE_FILE
+    with _lock:
+        rows = list(_buffer)
+        _buffer.clear()
+    if not rows:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    columns = list(COLUMNS)
+    with sqlite3.connect(path, timeout=30) as conn:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS llm_calls "
+                     f"({', '.join(f'{c} {t}' for c, t in COLUMNS.items())})")
+        conn.executemany(
+            f"INSERT INTO llm_calls ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row[c] for c in columns) for row in rows]
+        )
+
+atexit.register(flush)
+
+def session_calls() -> pd.DataFrame:
+    """Every attempt recorded by this process."""
+    with _lock:
+        return pd.DataFrame(list(_session), columns=list(COLUMNS))
+
+def load_calls(run_id: str = None, path: Path = None) -> pd.DataFrame:
+    """Attempts from the store, optionally for one run."""
+    flush()
+    path = path or STORE_FILE
+    if not path.exists():
+        return pd.DataFrame(columns=list(COLUMNS))
+    with sqlite3.connect(path, timeout=30) as conn:
+        if run_id is None:
+            return pd.read_sql_query("SELECT * FROM llm_calls", conn)
+        return pd.read_sql_query("SELECT * FROM llm_calls WHERE run_id = ?", conn, params=(run_id,))
+
+def select_calls(calls: pd.DataFrame, run_id: str = None, provider=None) -> pd.DataFrame:
+    """Attempts of one run and/or provider(s) (a name or a list; None = all)."""
+    if run_id is not None:
+        calls = calls[calls['run_id'] == run_id]
+    if provider is not None:
+        providers = [provider] if isinstance(provider, str) else list(provider)
+        calls = calls[calls['provider'].isin(providers)]
+    return calls
+
+def summarize_calls(calls: pd.DataFrame, by: List[str] = ['stage'], run_id: str = None,
+                    provider=None) -> pd.DataFrame:
+    """
+    Per-group totals: logical calls, attempts, retries, failures, tokens, cost, latency.
+
+    A logical call is one (stage, role, prompt) key; its extra attempts are
+    retries, and it failed if none of its attempts succeeded. run_id and
+    provider restrict the attempts counted (see select_calls).
+    """
+    calls = select_calls(calls, run_id, provider)
+    if len(calls) == 0:
+        return pd.DataFrame()
+    calls = calls.assign(ok=calls['outcome'] == 'ok')
+    key = list(dict.fromkeys(by + ['stage', 'model_role', 'prompt_hash']))
+    logical = (calls.groupby(key)
+               .agg(attempts=('ok', 'size'), succeeded=('ok', 'any')).reset_index())
+
+    summary = calls.groupby(by).agg(
+        attempts=('ok', 'size'),
+        input_tokens=('input_tokens', 'sum'),
+        cached_tokens=('cached_tokens', 'sum'),
+        output_tokens=('output_tokens', 'sum'),
+        cost_usd=('cost_usd', 'sum'),
+        p50_latency_s=('latency_s', 'median'),
+        p95_latency_s=('latency_s', lambda s: s.quantile(0.95)),
+        rate_limited=('outcome', lambda s: (s == 'rate_limited').sum()),
+        first_ts=('ts', 'min'),
+        last_ts=('ts', 'max'),
+    )
+    per_group = logical.groupby(by).agg(calls=('attempts', 'size'), failed=('succeeded', lambda s: (~s).sum()))
+    summary = per_group.join(summary)
+    summary['retries'] = summary['attempts'] - summary['calls']
+    summary['cost_usd'] = summary['cost_usd'].round(4)
+    return summary.reset_index()
+
+def _labels(values: Dict[str, Any]) -> str:
+    escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"') for k, v in values.items()}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped.items()) + '}'
+
+def export_prometheus(calls: pd.DataFrame, path: Path = None, openmetrics: bool = False,
+                      run_id: str = None, provider=None) -> Path:
+    """
+    Write counters and a latency histogram in Prometheus textfile format
+    (node_exporter textfile collector); openmetrics=True adds the # EOF
+    terminator OpenMetrics parsers require. run_id and provider restrict
+    the attempts exported (see select_calls).
+    """
+    calls = select_calls(calls, run_id, provider)
+    path = path or PROMETHEUS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    keys = ['stage', 'model_role', 'provider', 'model']
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str):
+        # OpenMetrics names the counter family without _total; the classic text format with it
+        family = f"{name}_total" if kind == 'counter' and not openmetrics else name
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+
+    metric('llm_calls', 'counter', 'LLM call attempts by outcome')
+    for group, count in calls.groupby(keys + ['outcome']).size().items():
+        lines.append(f"llm_calls_total{_labels(dict(zip(keys + ['outcome'], group)))} {count}")
+
+    by_series = list(calls.groupby(keys))
+
+    metric('llm_tokens', 'counter', 'Tokens by type')
+    for group, rows in by_series:
+        for kind in ['input', 'cached', 'output']:
+            labels = dict(zip(keys, group), type=kind)
+            lines.append(f"llm_tokens_total{_labels(labels)} {int(rows[f'{kind}_tokens'].sum())}")
+
+    metric('llm_cost_usd', 'counter', 'Estimated spend in USD (MODEL_PRICING)')
+    for group, rows in by_series:
+        lines.append(f"llm_cost_usd_total{_labels(dict(zip(keys, group)))} {rows['cost_usd'].sum():.6f}")
+
+    metric('llm_latency_seconds', 'histogram', 'Per-attempt latency')
+    for group, rows in by_series:
+        base = dict(zip(keys, group))
+        latency = rows['latency_s'].to_numpy(dtype=float)
+        for bound in LATENCY_BUCKETS:
+            lines.append(f"llm_latency_seconds_bucket{_labels(dict(base, le=f'{bound:g}'))} "
+                         f"{int((latency <= bound).sum())}")
+        lines.append(f"llm_latency_seconds_bucket{_labels(dict(base, le='+Inf'))} {len(latency)}")
+        lines.append(f"llm_latency_seconds_sum{_labels(base)} {latency.sum():.6f}")
+        lines.append(f"llm_latency_seconds_count{_labels(base)} {len(latency)}")
+
+    if openmetrics:
+        lines.append('# EOF')
+
+    # Write-then-rename so a scraping collector never reads a half-written file
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text('\n'.join(lines) + '\n')
+    tmp.replace(path)
+    return path
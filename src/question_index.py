@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Approximate nearest-neighbour index over question embeddings: similar
+questions, kNN-graph clusters and canonical questions.
+
+config/canonical_format.json gives each question `similar_questions` and
+a `cluster_id`, and each cluster a canonical question. Notebook 03 got
+there through a dense N × N cosine matrix. Here an inverted-file (IVF)
+index is used instead:
+
+- vectors are centred on the corpus mean (raw RoBERTa similarities sit
+  around 0.99 for any pair) and L2-normalized, so inner product is cosine
+- a k-means coarse quantizer splits them into ~sqrt(N) lists; a query
+  scans only its N_PROBE closest lists, O(N · N_PROBE / lists) per query
+- every question's top SIMILAR_QUESTIONS neighbours are kept with the
+  index; mutual neighbours at >= CLUSTER_SIMILARITY are linked and the
+  connected components of that graph are the clusters
+- the canonical question of a cluster is the member with the highest
+  mean similarity to the others (exact, from the sum of member vectors)
+
+The index (centroids, vectors, neighbour table) is saved to INDEX_FILE.
+On the next run only new or re-embedded questions are assigned to lists
+and searched; existing neighbour lists are patched by scoring them
+exactly against the new block (a question's neighbours can change even
+when it is not in a new question's own top-k), and only lists that
+pointed at removed or changed questions are searched again.
+The quantizer is retrained when the corpus has grown RETRAIN_GROWTH-fold.
+
+Usage:
+    python question_index.py                    # Build or update the index and outputs
+    python question_index.py --rebuild          # Retrain from scratch
+    python question_index.py --query 42         # Neighbours of question 42
+"""
+
+import argparse
+import json
+import pickle
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Tuple
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+# Configuration
+EMBEDDINGS_PATH = Path('../data/processed/embeddings/embeddings_with_metadata.pkl')
+QUESTIONS_PATH = Path('../data/processed/survey_questions_cleaned.csv')
+INDEX_FILE = Path('../output/index/question_ivf.npz')
+NEIGHBORS_FILE = Path('../output/clusters/similar_questions.csv')
+CLUSTER_IDS_FILE = Path('../output/clusters/question_cluster_ids.csv')
+CLUSTERS_FILE = Path('../output/clusters/clusters.json')
+
+SIMILAR_QUESTIONS = 10      # Neighbours kept per question
+N_PROBE = 16                # Lists scanned per query
+CLUSTER_SIMILARITY = 0.9    # Minimum (centred) cosine for a cluster edge
+MIN_LIST_SIZE = 32          # Lists are sized ~sqrt(N), at least this many vectors each
+RETRAIN_GROWTH = 2.0        # Retrain the quantizer once the corpus doubles
+RECALL_SAMPLE = 500         # Questions checked against exact search
+SEARCH_BLOCK = 4096         # Queries scored against one list at a time
+
+def question_key(question_id) -> str:
+    """Canonical question id ('Q0042')."""
+    return f"Q{int(question_id):04d}"
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+class IVFIndex:
+    """Inverted-file cosine index: centred, normalized vectors grouped by nearest centroid."""
+
+    def __init__(self, mean: np.ndarray, centroids: np.ndarray, ids: np.ndarray, vectors: np.ndarray,
+                 lists: np.ndarray, trained_size: int):
+        self.mean = mean
+        self.centroids = centroids
+        self.ids = ids
+        self.vectors = vectors
+        self.lists = lists
+        self.trained_size = trained_size
+        self._members = None
+
+    @classmethod
+    def train(cls, ids: np.ndarray, embeddings: np.ndarray, seed: int = 42) -> 'IVFIndex':
+        """Fit the centring mean and a k-means quantizer on `embeddings`, then add them."""
+        from sklearn.cluster import MiniBatchKMeans
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        mean = embeddings.mean(axis=0)
+        vectors = _normalize(embeddings - mean)
+        n_lists = int(max(1, min(np.sqrt(len(vectors)), len(vectors) // MIN_LIST_SIZE)))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3,
+                                 batch_size=max(1024, 4 * n_lists)).fit(vectors)
+        centroids = _normalize(kmeans.cluster_centers_)
+        index = cls(mean, centroids, np.zeros(0, dtype=np.int64), np.zeros((0, vectors.shape[1]), np.float32),
+                    np.zeros(0, dtype=np.int32), len(vectors))
+        index.add(ids, embeddings)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def prepare(self, embeddings: np.ndarray) -> np.ndarray:
+        """Centred, normalized float32 vectors (what the index stores and searches with)."""
+        return _normalize(np.asarray(embeddings, dtype=np.float32) - self.mean)
+
+    def add(self, ids: np.ndarray, embeddings: np.ndarray):
+        """Append vectors to their nearest lists (ids must not be indexed yet)."""
+        vectors = self.prepare(embeddings)
+        lists = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32) if len(vectors) else \
+            np.zeros(0, dtype=np.int32)
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self.lists = np.concatenate([self.lists, lists])
+        self._members = None
+
+    def remove(self, ids: np.ndarray):
+        keep = ~np.isin(self.ids, ids)
+        self.ids, self.vectors, self.lists = self.ids[keep], self.vectors[keep], self.lists[keep]
+        self._members = None
+
+    def positions(self, ids: np.ndarray) -> np.ndarray:
+        """Row of each id in the index (-1 if absent)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        order = np.argsort(self.ids)
+        rows = order[np.minimum(np.searchsorted(self.ids, ids, sorter=order), len(order) - 1)]
+        return np.where(self.ids[rows] == ids, rows, -1)
+
+    def _list_members(self) -> List[np.ndarray]:
+        if self._members is None:
+            order = np.argsort(self.lists, kind='stable')
+            bounds = np.searchsorted(self.lists[order], np.arange(self.n_lists + 1))
+            self._members = [order[bounds[l]:bounds[l + 1]] for l in range(self.n_lists)]
+        return self._members
+
+    def search(self, vectors: np.ndarray, k: int, n_probe: int = N_PROBE,
+               exclude: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows and cosine scores for prepared query vectors, best first
+        (row -1 / score -inf where fewer than k were found). exclude[q] is a
+        row never returned for query q (itself, for indexed queries).
+        """
+        n_queries = len(vectors)
+        best_rows = np.full((n_queries, k), -1, dtype=np.int64)
+        best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        if n_queries == 0 or len(self) == 0:
+            return best_rows, best_scores
+
+        n_probe = min(n_probe, self.n_lists)
+        coarse = vectors @ self.centroids.T
+        probes = np.argpartition(-coarse, n_probe - 1, axis=1)[:, :n_probe] if n_probe < self.n_lists else \
+            np.tile(np.arange(self.n_lists), (n_queries, 1))
+
+        # Queries grouped by probed list, so each list is scored with one matrix product
+        flat = probes.ravel()
+        order = np.argsort(flat, kind='stable')
+        bounds = np.searchsorted(flat[order], np.arange(self.n_lists + 1))
+        members = self._list_members()
+
+        for l in range(self.n_lists):
+            rows = members[l]
+            if len(rows) == 0:
+                continue
+            queries_all = order[bounds[l]:bounds[l + 1]] // n_probe
+            for start in range(0, len(queries_all), SEARCH_BLOCK):
+                queries = queries_all[start:start + SEARCH_BLOCK]
+                scores = vectors[queries] @ self.vectors[rows].T
+                if exclude is not None:
+                    scores[exclude[queries][:, None] == rows[None, :]] = -np.inf
+                merged_scores = np.concatenate([best_scores[queries], scores], axis=1)
+                merged_rows = np.concatenate([best_rows[queries], np.broadcast_to(rows, scores.shape)], axis=1)
+                top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+                best_scores[queries] = np.take_along_axis(merged_scores, top, axis=1)
+                best_rows[queries] = np.take_along_axis(merged_rows, top, axis=1)
+
+        ranked = np.argsort(-best_scores, axis=1, kind='stable')
+        best_scores = np.take_along_axis(best_scores, ranked, axis=1)
+        best_rows = np.take_along_axis(best_rows, ranked, axis=1)
+        best_rows[~np.isfinite(best_scores)] = -1
+        return best_rows, best_scores
+
+    def save(self, path: Path, **extra):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp.npz')
+        np.savez(tmp, mean=self.mean, centroids=self.centroids, ids=self.ids, vectors=self.vectors,
+                 lists=self.lists, trained_size=np.int64(self.trained_size), **extra)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Tuple['IVFIndex', Dict[str, np.ndarray]]:
+        """(index, other arrays saved with it)."""
+        with np.load(path, allow_pickle=False) as f:
+            arrays = {name: f[name] for name in f.files}
+        index = cls(arrays.pop('mean'), arrays.pop('centroids'), arrays.pop('ids'), arrays.pop('vectors'),
+                    arrays.pop('lists'), int(arrays.pop('trained_size')))
+        return index, arrays
+
+# Neighbour table
+
+class Neighbors:
+    """Top-k neighbour ids and scores per indexed question (rows follow index.ids)."""
+
+    def __init__(self, ids: np.ndarray, scores: np.ndarray):
+        self.ids = ids
+        self.scores = scores
+
+    @classmethod
+    def search(cls, index: IVFIndex, rows: np.ndarray, k: int, n_probe: int = N_PROBE) -> 'Neighbors':
+        """Neighbours of the indexed questions at `rows` (excluding themselves)."""
+        found, scores = index.search(index.vectors[rows], k, n_probe, exclude=rows)
+        ids = np.where(found >= 0, index.ids[np.maximum(found, 0)], -1)
+        return cls(ids, scores)
+
+def _merge_new_rows(index: IVFIndex, neighbors: Neighbors, start: int):
+    """
+    Patch the neighbour lists of rows before `start` with the rows added
+    from `start` on: exact scores against the new block, best k kept per row.
+    """
+    k = neighbors.ids.shape[1]
+    for first in range(0, start, SEARCH_BLOCK):
+        rows = np.arange(first, min(first + SEARCH_BLOCK, start))
+        best_ids, best_scores = neighbors.ids[rows], neighbors.scores[rows]
+        for column in range(start, len(index), SEARCH_BLOCK):
+            block = np.arange(column, min(column + SEARCH_BLOCK, len(index)))
+            scores = index.vectors[rows] @ index.vectors[block].T
+            pool_scores = np.concatenate([best_scores, scores], axis=1)
+            pool_ids = np.concatenate([best_ids, np.broadcast_to(index.ids[block], scores.shape)], axis=1)
+            top = np.argpartition(-pool_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(pool_scores, top, axis=1)
+            best_ids = np.take_along_axis(pool_ids, top, axis=1)
+        ranked = np.argsort(-best_scores, axis=1, kind='stable')
+        neighbors.scores[rows] = np.take_along_axis(best_scores, ranked, axis=1)
+        neighbors.ids[rows] = np.take_along_axis(best_ids, ranked, axis=1)
+
+def update_index(ids: np.ndarray, embeddings: np.ndarray, k: int = SIMILAR_QUESTIONS, n_probe: int = N_PROBE,
+                 rebuild: bool = False, path: Path = INDEX_FILE) -> Tuple[IVFIndex, Neighbors]:
+    """
+    Bring the stored index and neighbour table up to date with (ids,
+    embeddings) and save them. New and re-embedded questions are added and
+    searched; existing neighbour lists are patched rather than recomputed.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    index = neighbors = None
+    if not rebuild and path.exists():
+        index, arrays = IVFIndex.load(path)
+        if index.vectors.shape[1] != embeddings.shape[1] or arrays['neighbor_ids'].shape[1] != k:
+            index = None
+        else:
+            neighbors = Neighbors(arrays['neighbor_ids'], arrays['neighbor_scores'])
+    if index is not None and len(ids) >= RETRAIN_GROWTH * index.trained_size:
+        print(f"   Corpus grew {len(ids) / index.trained_size:.1f}x since training; retraining")
+        index = None
+
+    if index is None:
+        index = IVFIndex.train(ids, embeddings)
+        neighbors = Neighbors.search(index, np.arange(len(index)), k, n_probe)
+        print(f"   Built index: {len(index):,} questions in {index.n_lists:,} lists")
+        index.save(path, neighbor_ids=neighbors.ids, neighbor_scores=neighbors.scores)
+        return index, neighbors
+
+    # Classify incoming questions against the index
+    rows = index.positions(ids)
+    known = rows >= 0
+    changed = np.zeros(len(ids), dtype=bool)
+    changed[known] = np.any(index.vectors[rows[known]] != index.prepare(embeddings[known]), axis=1)
+    removed = np.setdiff1d(index.ids, ids)
+    stale_ids = np.concatenate([removed, ids[changed]])
+    new = ~known | changed
+
+    if not len(stale_ids) and not new.any():
+        print(f"   Index up to date: {len(index):,} questions")
+        return index, neighbors
+
+    # Drop removed and changed questions (with their rows in the neighbour table)
+    keep = ~np.isin(index.ids, stale_ids)
+    index.remove(stale_ids)
+    neighbors = Neighbors(neighbors.ids[keep], neighbors.scores[keep])
+
+    # Lists that pointed at a dropped question are searched again
+    invalid = np.isin(neighbors.ids, stale_ids).any(axis=1)
+    if invalid.any():
+        refreshed = Neighbors.search(index, np.flatnonzero(invalid), k, n_probe)
+        neighbors.ids[invalid], neighbors.scores[invalid] = refreshed.ids, refreshed.scores
+
+    # Add new vectors and search their neighbours; existing lists are scored exactly against them
+    start = len(index)
+    index.add(ids[new], embeddings[new])
+    added = Neighbors.search(index, np.arange(start, len(index)), k, n_probe)
+    neighbors = Neighbors(np.concatenate([neighbors.ids, added.ids]), np.concatenate([neighbors.scores, added.scores]))
+    _merge_new_rows(index, neighbors, start)
+
+    print(f"   Updated index: {new.sum():,} questions added/re-embedded, {len(removed):,} removed, "
+          f"{int(invalid.sum()):,} neighbour lists refreshed -> {len(index):,} questions")
+    index.save(path, neighbor_ids=neighbors.ids, neighbor_scores=neighbors.scores)
+    return index, neighbors
+
+def sample_recall(index: IVFIndex, neighbors: Neighbors, k: int = 5, sample: int = RECALL_SAMPLE,
+                  seed: int = 42) -> float:
+    """Share of the exact top-k neighbours found, over a random sample of indexed questions."""
+    k = min(k, neighbors.ids.shape[1], len(index) - 1)
+    if k < 1:
+        return 1.0
+    rows = np.random.default_rng(seed).choice(len(index), size=min(sample, len(index)), replace=False)
+    scores = index.vectors[rows] @ index.vectors.T
+    scores[np.arange(len(rows)), rows] = -np.inf
+    exact = index.ids[np.argpartition(-scores, k - 1, axis=1)[:, :k]]
+    found = [len(set(e) & set(a)) for e, a in zip(exact, neighbors.ids[rows, :k])]
+    return sum(found) / (k * len(rows))
+
+# Clusters
+
+def knn_clusters(index: IVFIndex, neighbors: Neighbors,
+                 threshold: float = CLUSTER_SIMILARITY) -> np.ndarray:
+    """
+    Component label per indexed question in the graph of mutual neighbours
+    with similarity >= threshold (singletons are their own component).
+    """
+    n = len(index)
+    rows = np.repeat(np.arange(n), neighbors.ids.shape[1])
+    cols = index.positions(neighbors.ids.ravel())
+    keep = (cols >= 0) & (neighbors.scores.ravel() >= threshold)
+    graph = sparse.csr_matrix((np.ones(keep.sum(), dtype=np.int8), (rows[keep], cols[keep])), shape=(n, n))
+    mutual = graph.minimum(graph.T)
+    _, labels = connected_components(mutual, directed=False)
+    return labels
+
+def cluster_records(index: IVFIndex, labels: np.ndarray, texts: Dict[int, str],
+                    surveys: Dict[int, List[str]]) -> Tuple[List[dict], Dict[int, str]]:
+    """
+    Canonical-format cluster records for components of two or more
+    questions (largest first), and the cluster_id of each clustered question.
+
+    For normalized vectors with sum S over n members, a member's mean
+    similarity to the others is (v · S - 1) / (n - 1) and the mean pairwise
+    similarity is (|S|² - n) / (n (n - 1)), so neither needs the n × n matrix.
+    """
+    sizes = np.bincount(labels)
+    components = [c for c in np.argsort(-sizes, kind='stable') if sizes[c] > 1]
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(len(sizes) + 1))
+
+    records, cluster_of = [], {}
+    for number, component in enumerate(components, start=1):
+        rows = order[bounds[component]:bounds[component + 1]]
+        n = len(rows)
+        total = index.vectors[rows].sum(axis=0, dtype=np.float64)
+        mean_to_others = (index.vectors[rows] @ total - 1) / (n - 1)
+        canonical = index.ids[rows[np.argmax(mean_to_others)]]
+        members = sorted(int(q) for q in index.ids[rows])
+
+        cluster_id = f"C{number:05d}"
+        for q in members:
+            cluster_of[q] = cluster_id
+        records.append({
+            'cluster_id': cluster_id,
+            'canonical_question_id': question_key(canonical),
+            'canonical_question_text': texts.get(int(canonical)),
+            'cluster_size': n,
+            'member_questions': [question_key(q) for q in members],
+            'avg_similarity': round(float((total @ total - n) / (n * (n - 1))), 4),
+            'surveys_represented': sorted({s for q in members for s in surveys.get(q, [])}),
+        })
+    return records, cluster_of
+
+# Inputs and outputs
+
+def load_embeddings() -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """(question ids, embeddings, question texts) from notebook 02."""
+    with open(EMBEDDINGS_PATH, 'rb') as f:
+        data = pickle.load(f)
+    return np.asarray(data['question_ids'], dtype=np.int64), np.asarray(data['embeddings']), list(data['question_texts'])
+
+def load_question_surveys() -> Dict[int, List[str]]:
+    """Surveys asking each embedded question (ids as in survey_questions_cleaned.csv)."""
+    if not QUESTIONS_PATH.exists():
+        return {}
+    questions = pd.read_csv(QUESTIONS_PATH, usecols=['question_id', 'survey']).dropna()
+    return {int(q): sorted(set(s)) for q, s in questions.groupby('question_id')['survey']}
+
+def neighbor_table(index: IVFIndex, neighbors: Neighbors) -> pd.DataFrame:
+    """Long table: question_id, similar_question_id, rank (1 = closest), similarity."""
+    k = neighbors.ids.shape[1]
+    found = neighbors.ids.ravel() >= 0
+    table = pd.DataFrame({
+        'question_id': np.repeat(index.ids, k)[found],
+        'similar_question_id': neighbors.ids.ravel()[found],
+        'rank': np.tile(np.arange(1, k + 1), len(index))[found],
+        'similarity': neighbors.scores.ravel()[found].round(4),
+    })
+    table['question_id'] = table['question_id'].map(question_key)
+    table['similar_question_id'] = table['similar_question_id'].map(question_key)
+    return table.sort_values(['question_id', 'rank'], kind='stable').reset_index(drop=True)
+
+def save_outputs(index: IVFIndex, neighbors: Neighbors, texts: Dict[int, str], similar: int,
+                 threshold: float) -> List[dict]:
+    """Write similar questions, per-question cluster ids and cluster records."""
+    table = neighbor_table(index, neighbors)
+    table = table[table['rank'] <= similar]
+    records, cluster_of = cluster_records(index, knn_clusters(index, neighbors, threshold), texts,
+                                          load_question_surveys())
+
+    NEIGHBORS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(NEIGHBORS_FILE, index=False)
+    pd.DataFrame({
+        'question_id': [question_key(q) for q in sorted(index.ids)],
+        'cluster_id': [cluster_of.get(int(q)) for q in sorted(index.ids)],
+    }).to_csv(CLUSTER_IDS_FILE, index=False)
+    with open(CLUSTERS_FILE, 'w') as f:
+        json.dump(records, f, indent=2)
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description='ANN index over question embeddings')
+    parser.add_argument('--rebuild', action='store_true', help='Retrain the index from scratch')
+    parser.add_argument('--similar', type=int, default=5, help='similar_questions per question')
+    parser.add_argument('--threshold', type=float, default=CLUSTER_SIMILARITY, help='Cluster edge similarity')
+    parser.add_argument('--query', type=int, help='Print the neighbours of one question id')
+    args = parser.parse_args()
+
+    print("="*70)
+    print("QUESTION SIMILARITY INDEX")
+    print("="*70)
+    if not EMBEDDINGS_PATH.exists():
+        print(f"ERROR: {EMBEDDINGS_PATH} not found (run notebook 02 first)")
+        return
+
+    ids, embeddings, question_texts = load_embeddings()
+    texts = dict(zip(ids.tolist(), question_texts))
+    index, neighbors = update_index(ids, embeddings, max(SIMILAR_QUESTIONS, args.similar), rebuild=args.rebuild)
+
+    if args.query is not None:
+        row = index.positions(np.array([args.query]))[0]
+        if row < 0:
+            print(f"ERROR: question {args.query} is not indexed")
+            return
+        print(f"\n  {question_key(args.query)}: {texts.get(args.query)}")
+        for q, score in zip(neighbors.ids[row][:args.similar], neighbors.scores[row][:args.similar]):
+            if q >= 0:
+                print(f"    {score:.3f}  {question_key(q)}: {texts.get(int(q))}")
+        return
+
+    print(f"   Recall@5 against exact search ({min(RECALL_SAMPLE, len(index))} sampled): "
+          f"{sample_recall(index, neighbors):.1%}")
+
+    records = save_outputs(index, neighbors, texts, args.similar, args.threshold)
+    clustered = sum(r['cluster_size'] for r in records)
+    print(f"\n  {len(records):,} clusters covering {clustered:,} of {len(index):,} questions "
+          f"(mutual neighbours, similarity >= {args.threshold})")
+    for record in records[:5]:
+        print(f"    {record['cluster_id']} ({record['cluster_size']}): {record['canonical_question_text']}")
+    print(f"\n  ✓ {NEIGHBORS_FILE}")
+    print(f"  ✓ {CLUSTER_IDS_FILE}")
+    print(f"  ✓ {CLUSTERS_FILE}")
+    print(f"  ✓ {INDEX_FILE}")
+
+if __name__ == '__main__':
+    main()
@@ -3,13 +3,14 @@
 Re-run ONLY OpenAI categorization (Claude is complete).
 """
 
-import os
 import json
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
 from tqdm import tqdm
+from llm_providers import complete
+from llm_categorization import CATEGORIZATION_SCHEMA, resolve_off_taxonomy, print_snap_summary
+from taxonomy import load_taxonomy
 import time
 
 load_dotenv()
@@ -19,10 +20,6 @@ MAX_WORKERS = 6
 RESULTS_DIR = Path('../output/results')
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
-def load_taxonomy():
-    with open('../data/raw/census_survey_explorer_taxonomy.json', 'r') as f:
-        return json.load(f)['taxonomy']
-
 def load_questions():
     df = pd.read_csv('../data/raw/PublicSurveyQuestionsMap.csv')
     questions = []
@@ -71,39 +68,18 @@ Return a JSON array with one object per question, in the same order. Format:
 Return ONLY the JSON array, no other text."""
 
 def call_openai(batch, taxonomy, max_retries=5):
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
     prompt = create_prompt(batch, taxonomy)
     
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                model="gpt-5-mini",
-                messages=[
-                    {"role": "system", "content": "You are a precise data categorization assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            content = response.choices[0].message.content
-            result = json.loads(content)
-            
-            if not isinstance(result, list):
-                if isinstance(result, dict) and 'categorizations' in result:
-                    result = result['categorizations']
-                elif isinstance(result, dict) and len(result) == 1:
-                    result = list(result.values())[0]
-                else:
-                    return []
-            
-            if not isinstance(result, list):
-                return []
-            
-            return result
-            
+            reply = complete(prompt, schema=CATEGORIZATION_SCHEMA, model_role='categorize_openai',
+                             system="You are a precise data categorization assistant.")
+            return resolve_off_taxonomy(batch, reply['parsed'], taxonomy, 'categorize_openai',
+                                        system="You are a precise data categorization assistant.")
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
-                print(f"  Error: {e}. Retrying in {wait_time}s...")
+                print(f"  Error: {str(e)[:100]}. Retrying in {wait_time}s...")
                 time.sleep(wait_time)
             else:
                 print(f"  Failed after {max_retries} attempts: {e}")
@@ -140,5 +116,6 @@ for batch_idx in tqdm(range(len(batches)), desc="OpenAI"):
             for result in results:
                 f.write(json.dumps(result) + '\n')
 
+print_snap_summary('categorize_openai')
 print("\nOpenAI processing complete!")
 print(f"Results: {openai_file}")
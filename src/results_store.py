@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Typed, columnar store for the initial categorization results.
+
+The categorizers append results_{model}.jsonl; every analysis stage used to
+re-parse those line by line with json.loads. Here each JSONL file is parsed
+once with a vectorized JSON reader and saved next to it as
+results_{model}.parquet with a fixed schema:
+
+    id                  int32
+    primary_topic       category (dictionary)
+    primary_subtopic    category (dictionary)
+    confidence          float32
+    secondary_concepts  list<struct<topic, subtopic>>
+    reasoning           string
+
+The Parquet file is rebuilt whenever the JSONL is newer, and readers ask
+only for the columns they use. Without pyarrow the same typed frame is
+built from the JSONL on every call (no cache), so callers need not care.
+
+Usage:
+    python results_store.py          # Build/refresh the Parquet store
+"""
+
+import json
+import pandas as pd
+from pathlib import Path
+from typing import List
+from concept_codec import load_codec
+
+try:
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Configuration
+RESULTS_DIR = Path('../output/results')
+MODELS = ['openai', 'claude']
+COLUMNS = ['id', 'primary_topic', 'primary_subtopic', 'confidence', 'secondary_concepts', 'reasoning']
+CONFIDENCE_DECIMALS = 4  # Models report at most 2; rounding undoes float32 drift on read
+
+def jsonl_path(model: str) -> Path:
+    return RESULTS_DIR / f'results_{model}.jsonl'
+
+def parquet_path(model: str) -> Path:
+    return RESULTS_DIR / f'results_{model}.parquet'
+
+def _arrow_schema():
+    concept = pa.struct([('topic', pa.string()), ('subtopic', pa.string())])
+    return pa.schema([
+        ('id', pa.int32()),
+        ('primary_topic', pa.dictionary(pa.int32(), pa.string())),
+        ('primary_subtopic', pa.dictionary(pa.int32(), pa.string())),
+        ('confidence', pa.float32()),
+        ('secondary_concepts', pa.list_(concept)),
+        ('reasoning', pa.string()),
+    ])
+
+def _parse_jsonl_arrow(path: Path):
+    """Parse JSONL straight into an Arrow table with the store schema."""
+    schema = _arrow_schema()
+    # The JSON reader parses plain strings; dictionary-encode after
+    parse_schema = pa.schema([
+        pa.field(f.name, pa.string()) if pa.types.is_dictionary(f.type) else f for f in schema
+    ])
+    table = pa_json.read_json(
+        path,
+        parse_options=pa_json.ParseOptions(explicit_schema=parse_schema, unexpected_field_behavior='ignore')
+    )
+    return table.cast(schema)
+
+def _typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Apply the store dtypes to a frame parsed without pyarrow."""
+    for column in COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    df = df[COLUMNS]
+    return df.astype({
+        'id': 'int32',
+        'primary_topic': 'category',
+        'primary_subtopic': 'category',
+        'confidence': 'float32',
+        'reasoning': 'string',
+    })
+
+def build_store(model: str, force: bool = False) -> Path:
+    """Convert results_{model}.jsonl to Parquet if missing or stale; returns the Parquet path."""
+    source, target = jsonl_path(model), parquet_path(model)
+    if not force and target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+        return target
+    table = _parse_jsonl_arrow(source)
+    # Write-then-rename so a concurrent reader never sees a partial file
+    tmp = target.with_suffix('.parquet.tmp')
+    pq.write_table(table, tmp, compression='zstd')
+    tmp.replace(target)
+    return target
+
+def load_results(model: str, columns: List[str] = None) -> pd.DataFrame:
+    """
+    Typed results for one model, reading only `columns` (default: all).
+
+    secondary_concepts comes back as Python lists of {'topic', 'subtopic'}
+    dicts, as it was in the JSONL. confidence is float32 on disk but returned
+    as float64 rounded to CONFIDENCE_DECIMALS, so 0.9 is 0.9 again and tier
+    boundaries bin exactly as before.
+    """
+    columns = columns or COLUMNS
+    if pa is not None:
+        table = pq.read_table(build_store(model), columns=columns)
+        df = table.to_pandas()
+    else:
+        with open(jsonl_path(model), 'r') as f:
+            df = _typed_frame(pd.DataFrame([json.loads(line) for line in f]))[columns]
+    if 'confidence' in df.columns:
+        df['confidence'] = df['confidence'].astype('float64').round(CONFIDENCE_DECIMALS)
+    if 'secondary_concepts' in df.columns:
+        df['secondary_concepts'] = [list(v) if v is not None else [] for v in df['secondary_concepts']]
+    return df
+
+def merge_results(openai_df: pd.DataFrame, claude_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge the two models' results on id with _openai/_claude suffixes.
+
+    Topic and subtopic columns are re-coded onto the taxonomy codec first,
+    so openai-vs-claude comparisons work on shared integer codes. Results
+    are compared as the models returned them (snapping happens when they
+    are categorized, not here).
+    """
+    codec = load_codec()
+    if 'primary_topic' in openai_df.columns and 'primary_topic' in claude_df.columns:
+        openai_df['primary_topic'], claude_df['primary_topic'] = codec.encode_topics(
+            openai_df['primary_topic'], claude_df['primary_topic'])
+    if 'primary_subtopic' in openai_df.columns and 'primary_subtopic' in claude_df.columns:
+        openai_df['primary_subtopic'], claude_df['primary_subtopic'] = codec.encode_subtopics(
+            openai_df['primary_subtopic'], claude_df['primary_subtopic'])
+    return openai_df.merge(claude_df, on='id', suffixes=('_openai', '_claude'))
+
+def load_merged(columns: List[str] = None) -> pd.DataFrame:
+    """Both models' results (only `columns`, plus id) merged by merge_results()."""
+    columns = columns or COLUMNS
+    if 'id' not in columns:
+        columns = ['id'] + columns
+    return merge_results(load_results('openai', columns), load_results('claude', columns))
+
+def main():
+    if pa is None:
+        print("pyarrow is not installed; readers will parse the JSONL directly.")
+        return
+    for model in MODELS:
+        if not jsonl_path(model).exists():
+            print(f"  - {jsonl_path(model)} not found, skipping")
+            continue
+        path = build_store(model, force=True)
+        metadata = pq.read_metadata(path)
+        print(f"  ✓ {path} ({metadata.num_rows:,} rows, {path.stat().st_size / 1e6:.2f} MB)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Bounded concurrent executor with per-task retries for LLM calls.
+
+- At most max_in_flight calls run at once (one worker thread per slot)
+- A failed call is retried with exponential backoff, but the backoff wait
+  happens on a timer, not in a worker - the slot is free for sibling tasks
+  while the failed task waits
+- submit() returns a regular concurrent.futures.Future, so callers can use
+  as_completed() / add_done_callback() and chain follow-up work (e.g. QC on
+  a question as soon as its arbitration finishes)
+
+Usage:
+    with RetryingExecutor(max_in_flight=8) as executor:
+        future = executor.submit(call_api, row, description=f"question {row['id']}")
+"""
+
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Any
+
+MAX_IN_FLIGHT = 8
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0   # seconds; attempt k waits BACKOFF_BASE * 2**k
+BACKOFF_CAP = 60.0
+
+class RetryingExecutor:
+    """Thread pool with bounded in-flight calls and non-blocking retry backoff."""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP,
+                 verbose: bool = True):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.verbose = verbose
+
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None)
+        return False
+
+    def submit(self, fn: Callable[..., Any], *args, description: str = None, **kwargs) -> Future:
+        """
+        Schedule fn(*args, **kwargs), retrying on any exception.
+
+        The returned future resolves to fn's result, or raises the last
+        exception once max_retries attempts have failed.
+        """
+        outer = Future()
+        outer.set_running_or_notify_cancel()
+        with self._idle:
+            self._pending += 1
+        self._pool.submit(self._attempt, outer, fn, args, kwargs, description, 0)
+        return outer
+
+    def _attempt(self, outer: Future, fn, args, kwargs, description, attempt: int):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if attempt < self.max_retries - 1:
+                wait_time = min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+                wait_time *= random.uniform(0.8, 1.2)  # Jitter so retries don't re-collide
+                if self.verbose:
+                    label = f" on {description}" if description else ""
+                    print(f"  Error{label}: {str(e)[:100]}. Retrying in {wait_time:.1f}s...")
+                timer = threading.Timer(
+                    wait_time,
+                    self._pool.submit,
+                    args=(self._attempt, outer, fn, args, kwargs, description, attempt + 1)
+                )
+                timer.daemon = True
+                timer.start()
+                return
+            if self.verbose:
+                label = f" {description}" if description else ""
+                print(f"  Failed{label} after {self.max_retries} attempts")
+            outer.set_exception(e)
+        else:
+            outer.set_result(result)
+        self._task_done()
+
+    def _task_done(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self):
+        """Block until every submitted task (including scheduled retries) has settled."""
+        with self._idle:
+            while self._pending > 0:
+                self._idle.wait()
+
+    def shutdown(self, wait: bool = True):
+        """Wait for outstanding tasks and retries, then stop the worker threads."""
+        if wait:
+            self.wait_idle()
+        self._pool.shutdown(wait=wait)
@@ -16,14 +16,26 @@ Usage:
     python run_pipeline.py --clean     # Full clean re-run
     python run_pipeline.py --from 3    # Resume from step 3
     python run_pipeline.py --only 5    # Run only step 5
+    python run_pipeline.py --profile   # Flamegraph + top self-time per step
+
+Every LLM call made by a step is recorded by llm_telemetry.py under this
+run's id; a per-stage cost and throughput summary is printed at the end
+and exported to ../output/telemetry/llm_metrics.prom.
+
+With --profile / --profile-memory each step runs under stage_profiler.py;
+flamegraphs, self-time tables and peak RSS go to ../output/profiles/<run_id>/.
 """
 
 import argparse
+import os
 import subprocess
 import sys
 from pathlib import Path
 from datetime import datetime
 import shutil
+import json
+import pandas as pd
+from llm_telemetry import load_calls, summarize_calls, export_prometheus
 
 # Pipeline configuration
 STEPS = {
@@ -84,6 +96,9 @@ STEPS = {
     }
 }
 
+PROFILE_DIR = Path('../output/profiles')
+PROFILE_TOP_N = 8  # Functions per stage in the self-time summary
+
 def print_header(text):
     """Print formatted header."""
     print("\n" + "="*70)
@@ -149,8 +164,53 @@ def check_outputs(step_num):
     
     return True
 
-def run_step(step_num):
-    """Run a pipeline step."""
+def stage_name(step_num):
+    """Telemetry stage label for a step, e.g. '5_arbitrate_final'."""
+    return f"{step_num}_{Path(STEPS[step_num]['script']).stem}"
+
+def print_llm_summary(run_id, durations):
+    """Per-stage LLM cost and throughput for this run, from telemetry."""
+    calls = load_calls(run_id)
+    if len(calls) == 0:
+        return
+    
+    print_header("LLM COST & THROUGHPUT")
+    summary = summarize_calls(calls, run_id=run_id)
+    
+    print(f"{'Stage':<34} {'Calls':>7} {'Retry':>6} {'Fail':>5} {'Tokens in/out':>17} "
+          f"{'Cost':>9} {'p95 s':>6} {'Calls/min':>9}")
+    for _, row in summary.iterrows():
+        # Throughput over the stage's wall time when we ran it, else over its first-to-last call
+        wall = durations.get(row['stage']) or max(row['last_ts'] - row['first_ts'], 1e-9)
+        tokens = f"{row['input_tokens']/1000:,.0f}k/{row['output_tokens']/1000:,.0f}k"
+        print(f"{row['stage']:<34} {row['calls']:>7,} {row['retries']:>6,} {row['failed']:>5,} {tokens:>17} "
+              f"${row['cost_usd']:>8.2f} {row['p95_latency_s']:>6.1f} {row['calls'] / wall * 60:>9.1f}")
+    print(f"\n{'Total':<34} {summary['calls'].sum():>7,} {summary['retries'].sum():>6,} "
+          f"{summary['failed'].sum():>5,} {'':>17} ${summary['cost_usd'].sum():>8.2f}")
+    
+    prom_path = export_prometheus(calls, run_id=run_id)
+    print(f"\nMetrics: {prom_path}")
+
+def print_profile_summary(run_id):
+    """Peak RSS and top self-time functions per profiled step."""
+    run_dir = PROFILE_DIR / run_id
+    if not run_dir.exists():
+        return
+    
+    print_header("PROFILE SUMMARY")
+    for stage_dir in sorted(p for p in run_dir.iterdir() if (p / 'profile.json').exists()):
+        profile = json.loads((stage_dir / 'profile.json').read_text())
+        memory = f", traced peak {profile['peak_traced_mb']:,.1f} MB" if 'peak_traced_mb' in profile else ''
+        print(f"{stage_dir.name}: {profile['wall_s']:,.1f}s wall, "
+              f"peak RSS {profile['peak_rss_mb']:,.1f} MB{memory}")
+        
+        self_time = pd.read_csv(stage_dir / 'self_time.csv')
+        for _, row in self_time[self_time['self_samples'] > 0].head(PROFILE_TOP_N).iterrows():
+            print(f"    {row['self_pct']:>5.1f}%  {row['self_s']:>8.1f}s  {row['function']}")
+        print(f"    -> {stage_dir / 'flamegraph.svg'}\n")
+
+def run_step(step_num, run_id=None, durations=None, profile=False, profile_memory=False):
+    """Run a pipeline step (tagging its LLM telemetry with run_id and the step)."""
     step = STEPS[step_num]
     
     print(f"\n{'─'*70}")
@@ -169,17 +229,32 @@ def run_step(step_num):
     start_time = datetime.now()
     print(f"Started at: {start_time.strftime('%H:%M:%S')}\n")
     
+    env = dict(os.environ, PIPELINE_STAGE=stage_name(step_num))
+    if run_id:
+        env['PIPELINE_RUN_ID'] = run_id
+    
+    command = ['python', step['script']]
+    if profile or profile_memory:
+        profile_dir = PROFILE_DIR / (run_id or start_time.strftime('%Y%m%d-%H%M%S')) / stage_name(step_num)
+        command = ['python', 'stage_profiler.py', '--out', str(profile_dir), step['script']]
+        if profile_memory:
+            command.insert(2, '--memory')
+        print(f"Profiling to: {profile_dir}\n")
+    
     try:
         result = subprocess.run(
-            ['python', step['script']],
+            command,
             cwd=Path(__file__).parent,
             capture_output=False,
             text=True,
-            check=True
+            check=True,
+            env=env
         )
         
         end_time = datetime.now()
         duration = end_time - start_time
+        if durations is not None:
+            durations[stage_name(step_num)] = duration.total_seconds()
         
         print(f"\n✓ Step {step_num} complete!")
         print(f"  Duration: {duration}")
@@ -239,6 +314,7 @@ Examples:
   python run_pipeline.py --clean      # Clean re-run from scratch
   python run_pipeline.py --from 3     # Run from step 3 onwards
   python run_pipeline.py --only 4     # Run only step 4
+  python run_pipeline.py --only 5 --profile-memory
         """
     )
     
@@ -248,6 +324,10 @@ Examples:
                        help='Start from step N')
     parser.add_argument('--only', type=int, metavar='N',
                        help='Run only step N')
+    parser.add_argument('--profile', action='store_true',
+                       help='Run each step under the sampling profiler (flamegraph, self time, peak RSS)')
+    parser.add_argument('--profile-memory', action='store_true',
+                       help='As --profile, plus tracemalloc allocation tracing (slower)')
     
     args = parser.parse_args()
     
@@ -281,6 +361,8 @@ Examples:
     
     # Run pipeline
     start_time = datetime.now()
+    run_id = start_time.strftime('%Y%m%d-%H%M%S')
+    durations = {}
     completed_steps = []
     failed_steps = []
     
@@ -289,7 +371,8 @@ Examples:
             print(f"⚠️  Step {step_num} does not exist. Skipping...")
             continue
         
-        success = run_step(step_num)
+        success = run_step(step_num, run_id, durations,
+                           profile=args.profile, profile_memory=args.profile_memory)
         
         if success:
             completed_steps.append(step_num)
@@ -303,6 +386,8 @@ Examples:
     
     # Summary
     print_summary(completed_steps, failed_steps)
+    print_llm_summary(run_id, durations)
+    print_profile_summary(run_id)
     
     print(f"\nTotal pipeline duration: {total_duration}")
     print(f"Finished at: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Stratified, sequential QC sampling for arbitration decisions.
+
+Instead of validating a fixed random share of arbitrated questions, QC runs
+in rounds:
+
+1. Stratify arbitrated questions by decision type x confidence tier
+2. Validate a small proportional sample from every stratum (concurrently)
+   Questions validated while arbitration was still running count toward
+   this first round
+3. Estimate QC/arbitrator agreement with a stratified confidence interval
+4. Stop once the interval is narrower than the target width; otherwise
+   escalate with a larger round, allocated to the strata that contribute
+   most variance (Neyman allocation)
+
+Sampling stops early when agreement is clear-cut and only spends more
+validator calls when they can still move the conclusion.
+
+Confidence tiers are the pipeline's standard tiers (disagreement_resolution.py).
+"""
+
+import math
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+from typing import Callable, Dict, List, Any, Tuple
+from concurrent.futures import Future, as_completed
+from retrying_executor import RetryingExecutor
+from disagreement_resolution import assign_confidence_tiers
+
+# Defaults
+TARGET_CI_WIDTH = 0.10      # Full width of the agreement interval (10 points)
+CONFIDENCE_LEVEL = 0.95
+INITIAL_RATE = 0.05         # First round: 5% of arbitrated questions
+MAX_RATE = 0.30             # Never validate more than 30%
+MIN_PER_STRATUM = 2
+MIN_ROUND_SIZE = 10
+
+def build_strata(decisions: pd.Series, min_confidence: pd.Series) -> pd.Series:
+    """Label each question with its 'decision|tier' stratum."""
+    tiers = assign_confidence_tiers(min_confidence).astype(str)
+    return decisions.astype(str) + '|' + tiers
+
+def _smoothed_rate(agree: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Agreement rate with +1/+2 smoothing so 0% / 100% strata keep some variance."""
+    return (agree + 1) / (n + 2)
+
+def stratified_interval(stats: pd.DataFrame, confidence: float = CONFIDENCE_LEVEL) -> Tuple[float, float, float]:
+    """
+    Stratified agreement estimate and confidence interval.
+
+    Args:
+        stats: One row per stratum with columns N (population), n (validated),
+               agree (validated and agreeing)
+        confidence: Two-sided confidence level
+
+    Returns:
+        (estimate, ci_low, ci_high)
+    """
+    sampled = stats[stats['n'] > 0]
+    if len(sampled) == 0:
+        return np.nan, 0.0, 1.0
+
+    # Re-weight over strata we have observed so far
+    weights = sampled['N'] / sampled['N'].sum()
+    n = sampled['n'].to_numpy(dtype=float)
+    N = sampled['N'].to_numpy(dtype=float)
+    rate = sampled['agree'].to_numpy(dtype=float) / n
+    smoothed = _smoothed_rate(sampled['agree'].to_numpy(dtype=float), n)
+
+    estimate = float((weights * rate).sum())
+
+    # Finite population correction - a fully validated stratum adds no variance
+    fpc = np.clip(1 - n / N, 0, 1)
+    variance = float((weights ** 2 * smoothed * (1 - smoothed) / n * fpc).sum())
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    half_width = z * math.sqrt(variance)
+
+    return estimate, max(0.0, estimate - half_width), min(1.0, estimate + half_width)
+
+def allocate_round(stats: pd.DataFrame, round_size: int, proportional: bool = False) -> Dict[str, int]:
+    """
+    Split a round's sample size across strata.
+
+    First round uses proportional allocation with a per-stratum minimum,
+    net of anything already validated. Later rounds use Neyman allocation
+    (N_h * sd_h) so sampling goes where the interval is widest. Allocation
+    never exceeds what a stratum has left.
+    """
+    remaining = (stats['N'] - stats['n']).clip(lower=0)
+    if proportional:
+        target_total = round_size + stats['n'].sum()
+        scores = (stats['N'] / stats['N'].sum() * target_total - stats['n']).clip(lower=0)
+        allocation = np.minimum(remaining, (MIN_PER_STRATUM - stats['n']).clip(lower=0)).astype(int)
+    else:
+        smoothed = _smoothed_rate(stats['agree'].to_numpy(dtype=float), stats['n'].to_numpy(dtype=float))
+        scores = stats['N'] * np.sqrt(smoothed * (1 - smoothed))
+        allocation = pd.Series(0, index=stats.index)
+    scores = scores.where(remaining > 0, 0.0)
+
+    budget = min(round_size, int(remaining.sum())) - int(allocation.sum())
+
+    # Hand out the rest by score, re-distributing whatever capped strata can't absorb
+    while budget > 0:
+        open_scores = scores.where(allocation < remaining, 0.0)
+        if open_scores.sum() <= 0:
+            break
+        share = np.floor(open_scores / open_scores.sum() * budget).astype(int)
+        if share.sum() == 0:
+            # Round-off left a few slots: give them to the highest-score open strata
+            share[open_scores.nlargest(budget).index] = 1
+        share = np.minimum(share, remaining - allocation)
+        allocation = allocation + share
+        budget -= int(share.sum())
+
+    return {stratum: int(count) for stratum, count in allocation.items() if count > 0}
+
+class EarlySampler:
+    """
+    Stratified picks for QC started while arbitration is still running.
+
+    Each stratum is sampled systematically at `rate` with a random start,
+    so after k of its questions it has floor(k * rate + start) picks: the
+    same proportional split round 1 would draw, whatever order questions
+    arrive in. run_sequential_qc counts them against their strata and
+    tops up the rest.
+    """
+
+    def __init__(self, rate: float = INITIAL_RATE, random_state: int = 42):
+        self.rate = rate
+        self._rng = np.random.default_rng(random_state)
+        self._seen = {}
+        self._start = {}
+
+    def pick(self, stratum: str) -> bool:
+        """Record one more question in stratum; True if it should be validated now."""
+        start = self._start.setdefault(stratum, self._rng.random())
+        seen = self._seen.get(stratum, 0)
+        self._seen[stratum] = seen + 1
+        return math.floor((seen + 1) * self.rate + start) > math.floor(seen * self.rate + start)
+
+def _collect(futures: Dict[Any, Future]) -> List[Dict[str, Any]]:
+    """Wait for QC futures; calls that exhausted their retries become qc_failed rows."""
+    ids_by_future = {future: qid for qid, future in futures.items()}
+    results = []
+    for future in as_completed(ids_by_future):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append({'id': ids_by_future[future], 'qc_failed': True, 'error': str(e)})
+    return results
+
+def _tally(stats: pd.DataFrame, round_df: pd.DataFrame):
+    """Add a round's QC outcomes to the per-stratum counts (in place)."""
+    if 'qc_failed' in round_df:
+        failed = round_df['qc_failed'].fillna(False).astype(bool)
+    else:
+        failed = pd.Series(False, index=round_df.index)
+    if 'agrees_with_arbitrator' in round_df:
+        agrees = round_df['agrees_with_arbitrator'].fillna(False).astype(bool)
+    else:
+        agrees = pd.Series(False, index=round_df.index)
+
+    by_stratum = round_df.assign(agrees=agrees & ~failed, failed=failed).groupby('qc_stratum')
+    failed_counts = by_stratum['failed'].sum().reindex(stats.index, fill_value=0).astype(int)
+    observed = by_stratum.size().reindex(stats.index, fill_value=0) - failed_counts
+    stats['n'] += observed.astype(int)
+    stats['agree'] += by_stratum['agrees'].sum().reindex(stats.index, fill_value=0).astype(int)
+    stats['failed'] += failed_counts
+    # Failed rows are not re-drawn; shrink N so the remaining pool stays honest
+    stats['N'] -= failed_counts
+
+def run_sequential_qc(population: pd.DataFrame, strata: pd.Series,
+                      validate_row: Callable[[pd.Series], Dict[str, Any]],
+                      executor: RetryingExecutor,
+                      prevalidated: Dict[Any, Future] = None,
+                      target_width: float = TARGET_CI_WIDTH,
+                      confidence: float = CONFIDENCE_LEVEL,
+                      initial_rate: float = INITIAL_RATE,
+                      max_rate: float = MAX_RATE,
+                      random_state: int = 42) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Validate arbitration decisions in stratified rounds until agreement is established.
+
+    Args:
+        population: Arbitrated questions eligible for QC (must have 'id')
+        strata: Stratum label per row of population (see build_strata)
+        validate_row: Takes one question row, returns a result dict with 'id' and
+                      'agrees_with_arbitrator'; raises on failure
+        executor: Shared executor the validation calls are submitted to
+        prevalidated: id -> future for QC calls already started (e.g. while
+                      arbitration was still running); these are counted
+                      against their strata before round 1 is allocated
+        target_width: Stop when the full CI width is at or below this
+        confidence: Two-sided confidence level for the interval
+        initial_rate: Share of the population validated in round 1
+        max_rate: Hard cap on the share of the population validated
+        random_state: Seed for reproducible draws
+
+    Returns:
+        (qc_results DataFrame, summary dict with estimate/CI/rounds/stop reason/strata)
+    """
+    rng = np.random.default_rng(random_state)
+    population = population.assign(qc_stratum=strata.values)
+    stratum_by_id = dict(zip(population['id'], population['qc_stratum']))
+
+    stats = population.groupby('qc_stratum').size().to_frame('N')
+    stats['n'] = 0
+    stats['agree'] = 0
+    stats['failed'] = 0
+
+    max_total = max(1, math.ceil(len(population) * max_rate))
+    round_size = max(MIN_ROUND_SIZE, math.ceil(len(population) * initial_rate), MIN_PER_STRATUM * len(stats))
+    round_size = min(round_size, max_total)
+
+    prevalidated = {qid: f for qid, f in (prevalidated or {}).items() if qid in stratum_by_id}
+    sampled_ids = set(prevalidated)
+    qc_results = []
+    rounds = []
+    stop_reason = 'exhausted'
+
+    while True:
+        round_num = len(rounds) + 1
+        results = []
+        if round_num == 1 and prevalidated:
+            # Count early QC against its strata first, so round 1 is allocated net of it
+            results = _collect(prevalidated)
+            for result in results:
+                result['qc_stratum'] = stratum_by_id.get(result['id'])
+            _tally(stats, pd.DataFrame(results))
+        to_draw = max(round_size - len(results), 0)
+
+        # Round 1 still tops every stratum up to MIN_PER_STRATUM when early QC filled the round
+        allocation = allocate_round(stats, to_draw, proportional=(round_num == 1))
+        futures = {}
+        for stratum, count in allocation.items():
+            # Draw without replacement from what each stratum has left
+            pool = population[(population['qc_stratum'] == stratum) & ~population['id'].isin(sampled_ids)]
+            picked = pool.iloc[rng.choice(len(pool), size=min(count, len(pool)), replace=False)]
+            for _, row in picked.drop(columns='qc_stratum').iterrows():
+                futures[row['id']] = executor.submit(validate_row, row, description=f"QC question {row['id']}")
+            sampled_ids.update(picked['id'])
+        if not futures and not results:
+            break
+
+        drawn = _collect(futures)
+        for result in drawn:
+            result['qc_stratum'] = stratum_by_id.get(result['id'])
+        if drawn:
+            _tally(stats, pd.DataFrame(drawn))
+        results += drawn
+        for result in results:
+            result['qc_round'] = round_num
+        qc_results.extend(results)
+
+        estimate, ci_low, ci_high = stratified_interval(stats, confidence)
+        width = ci_high - ci_low
+        rounds.append({
+            'round': round_num,
+            'sampled': len(results),
+            'total_validated': int(stats['n'].sum()),
+            'estimate': estimate,
+            'ci_low': ci_low,
+            'ci_high': ci_high,
+            'ci_width': width
+        })
+        print(f"   Round {round_num}: +{len(results)} validated (total {int(stats['n'].sum())}), "
+              f"agreement {estimate*100:.1f}% [{ci_low*100:.1f}, {ci_high*100:.1f}]")
+
+        if width <= target_width:
+            stop_reason = 'converged'
+            break
+        if len(sampled_ids) >= max_total:
+            stop_reason = 'budget'
+            break
+        if (stats['N'] - stats['n']).sum() <= 0:
+            stop_reason = 'exhausted'
+            break
+
+        # Escalate: variance shrinks ~1/n, so size the next round to reach the target
+        validated = max(1, int(stats['n'].sum()))
+        needed = math.ceil(validated * (width / target_width) ** 2) - validated
+        round_size = min(max(needed, MIN_ROUND_SIZE, round_size), max_total - len(sampled_ids))
+
+    stats['agreement_rate'] = (stats['agree'] / stats['n'].replace(0, np.nan)).round(3)
+    summary = {
+        'estimate': rounds[-1]['estimate'] if rounds else np.nan,
+        'ci_low': rounds[-1]['ci_low'] if rounds else 0.0,
+        'ci_high': rounds[-1]['ci_high'] if rounds else 1.0,
+        'confidence': confidence,
+        'target_width': target_width,
+        'validated': int(stats['n'].sum()),
+        'population': len(population),
+        'stop_reason': stop_reason,
+        'rounds': pd.DataFrame(rounds),
+        'strata': stats.reset_index()
+    }
+
+    return pd.DataFrame(qc_results), summary
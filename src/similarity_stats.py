@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Per-question similarity mass statistics shared by the explore_similarity_* scripts.
+
+Each question's similarity scores against all taxonomy concepts are sorted
+and normalized to sum to 1, so we can ask how much of the mass the top-K
+concepts capture and how many concepts it takes to reach a threshold.
+"""
+
+import numpy as np
+from typing import Dict, List, Tuple
+
+TOP_K = [1, 2, 3, 5, 10]
+
+def normalize_similarity_distributions(similarity_matrix: np.ndarray,
+                                       top_k: List[int] = TOP_K) -> Tuple[np.ndarray, Dict[int, List[float]]]:
+    """
+    Sort and normalize each question's scores; track top-K cumulative mass.
+
+    Args:
+        similarity_matrix: questions x concepts similarity scores
+        top_k: K values to track
+
+    Returns:
+        (normalized_distributions questions x concepts, {k: [mass captured by top-k per question]})
+    """
+    n_questions = similarity_matrix.shape[0]
+
+    # For each question, normalize its similarity scores
+    normalized_distributions = []
+    top_k_stats = {k: [] for k in top_k}
+
+    for i in range(n_questions):
+        scores = similarity_matrix[i]
+
+        # Sort descending
+        sorted_scores = np.sort(scores)[::-1]
+
+        # Normalize to sum to 1
+        normalized = sorted_scores / sorted_scores.sum()
+        normalized_distributions.append(normalized)
+
+        # Cumulative for this question
+        cumulative = np.cumsum(normalized)
+
+        # Track what % of mass is captured by top-k
+        for k in top_k_stats.keys():
+            if k <= len(cumulative):
+                top_k_stats[k].append(cumulative[k-1])
+
+    return np.array(normalized_distributions), top_k_stats
+
+def concepts_needed_for_mass(normalized_distributions: np.ndarray, threshold: float) -> np.ndarray:
+    """Number of top concepts each question needs to reach `threshold` of its similarity mass."""
+    n_questions, n_concepts = normalized_distributions.shape
+
+    n_concepts_needed = []
+    for i in range(n_questions):
+        cumulative = np.cumsum(normalized_distributions[i])
+        n_needed = np.searchsorted(cumulative, threshold) + 1
+        n_concepts_needed.append(min(n_needed, n_concepts))
+
+    return np.array(n_concepts_needed)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Run one pipeline script under a sampling profiler (and optionally a memory tracer).
+
+Used by run_pipeline.py --profile / --profile-memory, but works standalone:
+
+    python stage_profiler.py --out ../output/profiles/manual compare_llm_results.py
+    python stage_profiler.py --out ../output/profiles/manual --memory arbitrate_and_qc.py
+
+The sampler is wall-clock: a background thread snapshots every thread's
+stack SAMPLE_HZ times a second, so time blocked in socket reads (LLM
+calls) shows up next to CSV parsing, iterrows and json work instead of
+disappearing as it would under a CPU-time profiler.
+
+Outputs (in --out):
+    stacks.folded     collapsed stacks (flamegraph.pl / speedscope / inferno input)
+    flamegraph.svg    self-contained flamegraph
+    self_time.csv     functions by self time (samples where the function is the leaf)
+    memory_top.csv    largest live allocation sites at exit (with --memory)
+    profile.json      wall time, samples, peak RSS, peak traced memory
+"""
+
+import argparse
+import json
+import resource
+import runpy
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+import pandas as pd
+from collections import Counter
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+# Configuration
+SAMPLE_HZ = 100
+MEMORY_TOP_N = 30
+SVG_WIDTH = 1200
+FRAME_HEIGHT = 16
+MIN_FRAME_PX = 0.5  # Skip flamegraph boxes narrower than this
+
+def frame_label(frame) -> str:
+    """'function (file.py:line)' for the code object's definition."""
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Background thread sampling all thread stacks into folded-stack counts."""
+
+    def __init__(self, hz: int = SAMPLE_HZ):
+        self.interval = 1.0 / hz
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stage-profiler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                # Threads first, so pool workers group under one root
+                root = 'MainThread' if names.get(ident) == 'MainThread' else 'worker-threads'
+                self.stacks[';'.join([root] + stack[::-1])] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+def self_time_table(stacks: Counter, seconds_per_tick: float) -> pd.DataFrame:
+    """
+    Per-function self samples (function was the leaf) and total samples (anywhere on the stack).
+
+    seconds_per_tick is measured wall time / sampler ticks, since the sampler
+    falls behind SAMPLE_HZ when the GIL is busy; self_s is thread-seconds.
+    """
+    self_counts = Counter()
+    total_counts = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')[1:]
+        if not frames:
+            continue
+        self_counts[frames[-1]] += count
+        for name in set(frames):
+            total_counts[name] += count
+
+    all_samples = sum(stacks.values()) or 1
+    df = pd.DataFrame({
+        'function': list(total_counts),
+        'self_samples': [self_counts[f] for f in total_counts],
+        'total_samples': list(total_counts.values()),
+    })
+    df['self_s'] = (df['self_samples'] * seconds_per_tick).round(3)
+    df['self_pct'] = (df['self_samples'] / all_samples * 100).round(1)
+    df['total_pct'] = (df['total_samples'] / all_samples * 100).round(1)
+    return df.sort_values('self_samples', ascending=False).reset_index(drop=True)
+
+def render_flamegraph(stacks: Counter, path: Path, title: str):
+    """Write a minimal static flamegraph SVG (root at the bottom, widths by sample count)."""
+    # Build the call tree
+    tree = {'count': 0, 'children': {}}
+    for stack, count in stacks.items():
+        node = tree
+        node['count'] += count
+        for name in stack.split(';'):
+            node = node['children'].setdefault(name, {'count': 0, 'children': {}})
+            node['count'] += count
+
+    def depth(node):
+        return 1 + max((depth(c) for c in node['children'].values()), default=0)
+
+    levels = depth(tree)
+    height = (levels + 2) * FRAME_HEIGHT
+    scale = SVG_WIDTH / max(tree['count'], 1)
+    boxes = []
+
+    def walk(node, name, x, level):
+        width = node['count'] * scale
+        if width < MIN_FRAME_PX:
+            return
+        y = height - (level + 1) * FRAME_HEIGHT
+        # Warm palette, stable per function name
+        hue = 10 + (zlib.crc32(name.encode('utf-8')) % 40)
+        pct = node['count'] / max(tree['count'], 1) * 100
+        chars = int(width / 7)  # ~7px per monospace character
+        label = escape(name if len(name) <= chars else name[:chars - 2] + '..') if chars > 3 else ''
+        boxes.append(
+            f'<g><title>{escape(name)} ({node["count"]} samples, {pct:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FRAME_HEIGHT - 1}" '
+            f'fill="hsl({hue},80%,60%)"/>'
+            f'<text x="{x + 3:.1f}" y="{y + FRAME_HEIGHT - 4}">{label}</text></g>'
+        )
+        child_x = x
+        for child_name, child in sorted(node['children'].items()):
+            walk(child, child_name, child_x, level + 1)
+            child_x += child['count'] * scale
+
+    walk(tree, 'all', 0.0, 0)
+    path.write_text(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}" '
+        f'font-family="monospace" font-size="11">'
+        f'<text x="4" y="14" font-size="13">{escape(title)}</text>'
+        + ''.join(boxes) + '</svg>\n'
+    )
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_profiled(script: str, out_dir: Path, memory: bool = False, hz: int = SAMPLE_HZ) -> int:
+    """Run script as __main__ under the profilers; write outputs to out_dir; return its exit code."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    sampler = StackSampler(hz)
+    if memory:
+        tracemalloc.start(10)
+
+    exit_code = 0
+    start = time.perf_counter()
+    sampler.start()
+    sys.argv = [script]
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        exit_code = 1
+        raise
+    finally:
+        sampler.stop()
+        wall = time.perf_counter() - start
+
+        (out_dir / 'stacks.folded').write_text(
+            ''.join(f"{stack} {count}\n" for stack, count in sampler.stacks.most_common())
+        )
+        render_flamegraph(sampler.stacks, out_dir / 'flamegraph.svg', f"{script} - {wall:.1f}s wall")
+        self_time_table(sampler.stacks, wall / max(sampler.samples, 1)).to_csv(out_dir / 'self_time.csv', index=False)
+
+        profile = {
+            'script': script,
+            'wall_s': round(wall, 3),
+            'samples': sampler.samples,
+            'sample_hz': hz,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'exit_code': exit_code,
+        }
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            profile['peak_traced_mb'] = round(traced_peak / 1e6, 1)
+            top = snapshot.statistics('lineno')[:MEMORY_TOP_N]
+            pd.DataFrame([{
+                'location': f"{Path(s.traceback[0].filename).name}:{s.traceback[0].lineno}",
+                'size_mb': round(s.size / 1e6, 2),
+                'blocks': s.count,
+            } for s in top]).to_csv(out_dir / 'memory_top.csv', index=False)
+        (out_dir / 'profile.json').write_text(json.dumps(profile, indent=2))
+
+    return exit_code
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile one pipeline script')
+    parser.add_argument('script', help='Script to run (relative to src/)')
+    parser.add_argument('--out', required=True, type=Path, help='Output directory')
+    parser.add_argument('--memory', action='store_true',
+                        help='Also trace allocations with tracemalloc (slower)')
+    parser.add_argument('--hz', type=int, default=SAMPLE_HZ, help='Samples per second')
+    args = parser.parse_args()
+
+    sys.exit(run_profiled(args.script, args.out, memory=args.memory, hz=args.hz))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Per-survey and per-topic statistics for the table and figure scripts.
+
+The reporting scripts used to loop over surveys (or topics) and re-filter
+the whole master frame for each one, with a value_counts() and mode()
+per group: O(groups × questions). Here every statistic comes from one
+grouped pass over integer codes:
+
+- ranked_counts() counts each (group, value) pair with one np.unique on
+  group_code * n_values + value_code, then ranks values within their
+  group by count, ties broken by first appearance (as value_counts()
+  orders them) or by label (as mode() picks them)
+- survey_profiles() turns those rankings into the per-survey columns the
+  tables need: question counts, primary topic, topic coverage string,
+  top concepts and unique concept/subtopic counts
+
+Cost is linear in the number of questions plus the number of distinct
+(group, value) pairs, however many surveys there are.
+"""
+
+import numpy as np
+import pandas as pd
+from concept_codec import load_codec
+
+def valid_categorized(master_df: pd.DataFrame) -> pd.DataFrame:
+    """Questions with a final topic other than 'Unknown'."""
+    return master_df[master_df['final_topic'].notna() & (master_df['final_topic'] != 'Unknown')]
+
+def ranked_counts(groups: pd.Series, values: pd.Series, tiebreak: str = 'first') -> pd.DataFrame:
+    """
+    Count of each value within each group, ranked within the group.
+
+    Rows are ordered by group label, then rank (0 = most common). Ties go
+    to the value seen first (tiebreak='first', like value_counts()) or to
+    the lower label (tiebreak='label', like mode()). Missing groups or
+    values are skipped.
+
+    Columns: group, value, count, rank.
+    """
+    group_cat = pd.Categorical(groups)
+    value_cat = pd.Categorical(values)
+    g = group_cat.codes.astype(np.int64)
+    v = value_cat.codes.astype(np.int64)
+    keep = (g >= 0) & (v >= 0)
+
+    width = max(len(value_cat.categories), 1)
+    keys, first, counts = np.unique(g[keep] * width + v[keep], return_index=True, return_counts=True)
+    g, v = keys // width, keys % width
+    if tiebreak == 'first':
+        order = np.lexsort((first, -counts, g))
+    elif tiebreak == 'label':
+        order = np.lexsort((v, -counts, g))
+    else:
+        raise ValueError(f"unknown tiebreak {tiebreak!r} (use 'first' or 'label')")
+    g, v, counts = g[order], v[order], counts[order]
+
+    # Position within each run of equal groups
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]]) if len(g) else np.array([], dtype=np.int64)
+    rank = np.arange(len(g)) - np.repeat(starts, np.diff(np.r_[starts, len(g)]))
+
+    return pd.DataFrame({
+        'group': np.asarray(group_cat.categories, dtype=object)[g],
+        'value': np.asarray(value_cat.categories, dtype=object)[v],
+        'count': counts,
+        'rank': rank,
+    })
+
+def group_counts(ranked: pd.DataFrame, group) -> pd.Series:
+    """One group's value counts from ranked_counts(), most common first."""
+    rows = ranked[ranked['group'] == group]
+    return pd.Series(rows['count'].to_numpy(), index=pd.Index(rows['value'].to_numpy(), dtype=object),
+                     name='count')
+
+def _joined(ranked: pd.DataFrame, labels: pd.Series, index: pd.Index) -> pd.Series:
+    """', '-joined labels per group (rows already in rank order), '' for groups without any."""
+    joined = labels.groupby(ranked['group'].to_numpy(), sort=False).agg(', '.join)
+    return joined.reindex(index, fill_value='')
+
+def survey_profiles(valid: pd.DataFrame, group: str = 'primary_survey',
+                    top_topics: int = 3, top_concepts: int = 5) -> pd.DataFrame:
+    """
+    Per-survey statistics of categorized questions, indexed by survey (sorted).
+
+    Columns:
+        questions         questions in the survey
+        primary_topic     most common topic (ties by label, as mode())
+        top_topic         most common topic (ties by first appearance)
+        top_topic_count   questions in top_topic
+        topic_coverage    'Topic (pct%), ...' for the top_topics topics
+        unique_concepts   distinct topic.subtopic concepts
+        unique_subtopics  distinct subtopic names
+        top_concepts      'Subtopic (n), ...' for the top_concepts concepts
+    """
+    codec = load_codec()
+    groups = valid[group]
+    concepts = codec.encode_concepts(valid['final_topic'], valid['final_subtopic'])
+
+    sizes = groups.value_counts().sort_index()
+    index = sizes.index
+
+    topics = ranked_counts(groups, valid['final_topic'])
+    modes = ranked_counts(groups, valid['final_topic'], tiebreak='label')
+    concept_ranks = ranked_counts(groups, concepts)
+    subtopic_ranks = ranked_counts(groups, valid['final_subtopic'])
+
+    top = topics[topics['rank'] == 0].set_index('group')
+    primary = modes[modes['rank'] == 0].set_index('group')['value']
+
+    coverage = topics[topics['rank'] < top_topics]
+    pct = (coverage['count'] / sizes.reindex(coverage['group']).to_numpy() * 100).round(1)
+    coverage_labels = coverage['value'].astype(str) + ' (' + pct.astype(str) + '%)'
+
+    best = concept_ranks[concept_ranks['rank'] < top_concepts]
+    concept_labels = pd.Series([f"{c.split('.')[1]} ({n})" for c, n in zip(best['value'], best['count'])],
+                               index=best.index, dtype=object)
+
+    return pd.DataFrame({
+        'questions': sizes,
+        'primary_topic': primary.reindex(index),
+        'top_topic': top['value'].reindex(index),
+        'top_topic_count': top['count'].reindex(index, fill_value=0),
+        'topic_coverage': _joined(coverage, coverage_labels, index),
+        'unique_concepts': concept_ranks['group'].value_counts().reindex(index, fill_value=0),
+        'unique_subtopics': subtopic_ranks['group'].value_counts().reindex(index, fill_value=0),
+        'top_concepts': _joined(best, concept_labels, index),
+    }, index=index).rename_axis(group)
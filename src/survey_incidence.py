@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Sparse question × survey incidence from every survey a question appears in.
+
+Loaders used to collapse each question to its first survey
+(primary_survey), so a question shared by five surveys counted for one
+of them. The survey map is a mostly-empty wide matrix; here it is read
+once (in row chunks) into a CSR matrix with one nonzero per
+question-survey pair and cached next to the outputs:
+
+    ../output/incidence/question_survey.npz   (rebuilt when the map is newer)
+
+Question ids are raw row positions, as everywhere else in the pipeline.
+Survey × concept counts are incidence.T @ assignment, where the
+assignment is the question × concept one-hot of the final categories,
+so the cost is linear in the nonzeros of both.
+
+Usage:
+    python survey_incidence.py        # Build/refresh the cache and print a summary
+"""
+
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+from scipy import sparse
+
+# Configuration
+RAW_QUESTIONS = Path('../data/raw/PublicSurveyQuestionsMap.csv')
+CACHE_FILE = Path('../output/incidence/question_survey.npz')
+CHUNK_ROWS = 2000
+
+class SurveyIncidence:
+    """CSR question × survey incidence (1 = question is asked in survey)."""
+
+    def __init__(self, matrix: sparse.csr_matrix, surveys: List[str]):
+        self.matrix = matrix.tocsr()
+        self.surveys = list(surveys)
+
+    @property
+    def n_questions(self) -> int:
+        return self.matrix.shape[0]
+
+    def survey_sizes(self, ids: pd.Series = None) -> pd.Series:
+        """Questions per survey (of questions `ids`, default all), counting every membership; empty surveys dropped."""
+        matrix = self.matrix if ids is None else self.matrix[np.asarray(ids, dtype=np.int64)]
+        sizes = pd.Series(np.asarray(matrix.sum(axis=0)).ravel(),
+                          index=pd.Index(self.surveys, name='survey'), name='questions')
+        return sizes[sizes > 0]
+
+    def assignment(self, ids: pd.Series, concepts: pd.Series) -> sparse.csr_matrix:
+        """Question × concept one-hot for categorical `concepts` of questions `ids` (missing concepts skipped)."""
+        codes = concepts.cat.codes.to_numpy()
+        ids = np.asarray(ids, dtype=np.int64)
+        keep = codes >= 0
+        if keep.any() and (ids[keep].min() < 0 or ids[keep].max() >= self.n_questions):
+            raise ValueError(f"question ids outside the survey map (0..{self.n_questions - 1})")
+        return sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int32), (ids[keep], codes[keep])),
+            shape=(self.n_questions, len(concepts.cat.categories))
+        )
+
+    def survey_concepts(self, ids: pd.Series, concepts: pd.Series) -> sparse.csr_matrix:
+        """Survey × concept question counts (sparse)."""
+        return (self.matrix.T.astype(np.int32) @ self.assignment(ids, concepts)).tocsr()
+
+def build_incidence(raw_path: Path = RAW_QUESTIONS) -> SurveyIncidence:
+    """Read the wide survey map chunk by chunk into a CSR incidence matrix."""
+    surveys = [c for c in pd.read_csv(raw_path, nrows=0).columns if c != 'Question']
+    rows, cols = [], []
+    offset = 0
+    for chunk in pd.read_csv(raw_path, usecols=surveys, dtype=str, chunksize=CHUNK_ROWS):
+        r, c = np.nonzero(chunk[surveys].notna().to_numpy())
+        rows.append(r + offset)
+        cols.append(c)
+        offset += len(chunk)
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.array([], dtype=np.int64)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                               shape=(offset, len(surveys)))
+    return SurveyIncidence(matrix, surveys)
+
+def save_incidence(incidence: SurveyIncidence, path: Path = CACHE_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp.npz')
+    m = incidence.matrix
+    np.savez_compressed(tmp, data=m.data, indices=m.indices, indptr=m.indptr,
+                        shape=np.array(m.shape), surveys=np.array(incidence.surveys, dtype=str))
+    tmp.replace(path)
+
+@lru_cache(maxsize=None)
+def load_incidence(raw_path: Path = RAW_QUESTIONS, cache: Path = CACHE_FILE) -> SurveyIncidence:
+    """Incidence for the survey map, from the cache unless the map is newer (once per process)."""
+    if cache.exists() and cache.stat().st_mtime >= raw_path.stat().st_mtime:
+        with np.load(cache, allow_pickle=False) as f:
+            matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            return SurveyIncidence(matrix, f['surveys'].tolist())
+    incidence = build_incidence(raw_path)
+    save_incidence(incidence, cache)
+    return incidence
+
+def main():
+    incidence = build_incidence()
+    save_incidence(incidence)
+    sizes = incidence.survey_sizes()
+    per_question = np.asarray(incidence.matrix.sum(axis=1)).ravel()
+    print(f"  ✓ {CACHE_FILE}")
+    print(f"    {incidence.n_questions:,} questions × {len(incidence.surveys)} surveys, "
+          f"{incidence.matrix.nnz:,} question-survey pairs")
+    print(f"    Questions in 2+ surveys: {(per_question >= 2).sum():,}")
+    print(f"    Largest surveys: " + ', '.join(f"{s} ({n})" for s, n in sizes.nlargest(3).items()))
+
+if __name__ == '__main__':
+    main()
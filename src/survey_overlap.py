@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Pairwise concept overlap between surveys, from one binary matrix product.
+
+Each survey is a row of a binary surveys × concepts matrix B (sparse).
+B @ B.T gives every pairwise intersection at once, and only for pairs
+that share at least one concept; set sizes are B's row sums. The
+similarity variants follow from those two:
+
+    jaccard  |A ∩ B| / |A ∪ B|
+    overlap  |A ∩ B| / min(|A|, |B|)
+    cosine   |A ∩ B| / sqrt(|A| |B|)
+
+top_pairs() scores only the nonzero intersections and keeps the best k
+above a threshold, so S² records are never built; similarity_matrix()
+is the dense S × S table for when it is wanted as an output.
+
+At thousands of surveys with rich sets (secondary concepts, question
+text) even the intersection product gets heavy, so MinHashLSH finds
+candidate pairs in sub-quadratic time: MINHASH_PERMUTATIONS min-hashes
+per set, split into bands; sets sharing any band are candidates. Bands
+are chosen so a pair at the Jaccard threshold is found with probability
+`recall`, and every candidate is re-scored exactly (lsh_pairs()).
+
+Usage:
+    python survey_overlap.py --threshold 0.5
+    python survey_overlap.py --threshold 0.3 --features questions --method lsh
+"""
+
+import argparse
+import zlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import List, Tuple
+from scipy import sparse
+
+# Configuration
+METRICS = ['jaccard', 'overlap', 'cosine']
+MINHASH_PERMUTATIONS = 128
+MINHASH_PRIME = (1 << 31) - 1  # Mersenne prime; a * x stays inside int64
+PERMUTATION_BLOCK = 16          # Permutations hashed at a time (bounds memory to block × nnz)
+DEFAULT_RECALL = 0.95
+SHINGLE_WORDS = 3
+
+def binary_matrix(matrix_df: pd.DataFrame) -> sparse.csr_matrix:
+    """Surveys × concepts 0/1 (has the concept or not) as CSR."""
+    return sparse.csr_matrix((matrix_df.to_numpy() > 0).astype(np.int32))
+
+def _score(intersection: np.ndarray, size_a: np.ndarray, size_b: np.ndarray, metric: str) -> np.ndarray:
+    intersection = intersection.astype(float)
+    if metric == 'jaccard':
+        denominator = size_a + size_b - intersection
+    elif metric == 'overlap':
+        denominator = np.minimum(size_a, size_b).astype(float)
+    elif metric == 'cosine':
+        denominator = np.sqrt(size_a.astype(float) * size_b)
+    else:
+        raise ValueError(f"unknown metric {metric!r} (use one of {METRICS})")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, intersection / denominator, 0.0)
+
+def similarity_matrix(binary: sparse.csr_matrix, labels: List[str], metric: str = 'jaccard') -> pd.DataFrame:
+    """Dense S × S similarity (diagonal 1.0)."""
+    sizes = np.asarray(binary.sum(axis=1)).ravel()
+    intersections = (binary @ binary.T).toarray()
+    scores = _score(intersections, sizes[:, None], sizes[None, :], metric)
+    np.fill_diagonal(scores, 1.0)
+    return pd.DataFrame(scores, index=labels, columns=labels)
+
+def top_pairs(binary: sparse.csr_matrix, threshold: float = 0.0, metric: str = 'jaccard',
+              k: int = None) -> pd.DataFrame:
+    """
+    Survey pairs (i < j) with similarity >= threshold, best first (at most k).
+
+    Columns: i, j, shared, size_i, size_j, score.
+    """
+    sizes = np.asarray(binary.sum(axis=1)).ravel()
+    intersections = sparse.triu(binary @ binary.T, k=1).tocoo()
+    i, j, shared = intersections.row, intersections.col, intersections.data
+    scores = _score(shared, sizes[i], sizes[j], metric)
+
+    keep = scores >= threshold
+    i, j, shared, scores = i[keep], j[keep], shared[keep], scores[keep]
+    if k is not None and len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        i, j, shared, scores = i[best], j[best], shared[best], scores[best]
+
+    # Best first; ties in (i, j) order
+    order = np.lexsort((j, i, -scores))
+    return pd.DataFrame({
+        'i': i[order], 'j': j[order], 'shared': shared[order],
+        'size_i': sizes[i[order]], 'size_j': sizes[j[order]], 'score': scores[order],
+    })
+
+def shared_columns(binary: sparse.csr_matrix, i: int, j: int) -> np.ndarray:
+    """Column indices both rows have."""
+    return np.intersect1d(binary[i].indices, binary[j].indices, assume_unique=True)
+
+def pairs_for(binary: sparse.csr_matrix, i: np.ndarray, j: np.ndarray, metric: str = 'jaccard') -> pd.DataFrame:
+    """Exact scores for given pairs (same columns as top_pairs, unsorted)."""
+    sizes = np.asarray(binary.sum(axis=1)).ravel()
+    shared = np.asarray(binary[i].multiply(binary[j]).sum(axis=1)).ravel().astype(np.int64)
+    return pd.DataFrame({
+        'i': i, 'j': j, 'shared': shared,
+        'size_i': sizes[i], 'size_j': sizes[j], 'score': _score(shared, sizes[i], sizes[j], metric),
+    })
+
+def candidate_probability(similarity: float, bands: int, rows: int) -> float:
+    """Chance LSH puts a pair with this Jaccard similarity into some common bucket."""
+    return 1 - (1 - similarity ** rows) ** bands
+
+def lsh_bands(threshold: float, num_perm: int = MINHASH_PERMUTATIONS, recall: float = DEFAULT_RECALL) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows <= num_perm that find a pair at `threshold`
+    with probability >= recall, using as many rows per band as possible
+    (fewest false candidates).
+    """
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if candidate_probability(threshold, bands, rows) >= recall:
+            return bands, rows
+    return num_perm, 1
+
+class MinHashLSH:
+    """MinHash signatures of a binary sets matrix (rows = sets) and their LSH buckets."""
+
+    def __init__(self, binary: sparse.csr_matrix, num_perm: int = MINHASH_PERMUTATIONS, seed: int = 42):
+        self.binary = binary.tocsr()
+        self.num_perm = num_perm
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MINHASH_PRIME, size=num_perm, dtype=np.int64)
+        self._b = rng.integers(0, MINHASH_PRIME, size=num_perm, dtype=np.int64)
+        self.signatures = self._signatures()
+
+    def _signatures(self) -> np.ndarray:
+        """num_perm × n_sets minimum hash of each set's columns (MINHASH_PRIME for empty sets)."""
+        binary = self.binary
+        n_sets = binary.shape[0]
+        signatures = np.full((self.num_perm, n_sets), MINHASH_PRIME, dtype=np.int64)
+        non_empty = np.flatnonzero(np.diff(binary.indptr))
+        if len(non_empty) == 0:
+            return signatures
+        columns = binary.indices.astype(np.int64) % MINHASH_PRIME
+        starts = binary.indptr[non_empty]
+        for block in range(0, self.num_perm, PERMUTATION_BLOCK):
+            a = self._a[block:block + PERMUTATION_BLOCK, None]
+            b = self._b[block:block + PERMUTATION_BLOCK, None]
+            hashed = (a * columns[None, :] + b) % MINHASH_PRIME
+            signatures[block:block + PERMUTATION_BLOCK, non_empty] = np.minimum.reduceat(hashed, starts, axis=1)
+        return signatures
+
+    def estimate(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """MinHash estimate of Jaccard for pairs (fraction of equal signature rows)."""
+        return (self.signatures[:, i] == self.signatures[:, j]).mean(axis=0)
+
+    def candidates(self, bands: int, rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairs (i < j) of non-empty sets sharing at least one band bucket."""
+        non_empty = np.flatnonzero(np.diff(self.binary.indptr))
+        keys = set()
+        n = self.binary.shape[0]
+        for band in range(bands):
+            band_rows = self.signatures[band * rows:(band + 1) * rows, non_empty].T
+            _, bucket = np.unique(band_rows, axis=0, return_inverse=True)
+            bucket = bucket.reshape(-1)
+            order = np.argsort(bucket, kind='stable')
+            bounds = np.flatnonzero(np.diff(bucket[order])) + 1
+            for members in np.split(non_empty[order], bounds):
+                if len(members) > 1:
+                    a, b = np.triu_indices(len(members), k=1)
+                    keys.update((members[a] * n + members[b]).tolist())
+        keys = np.fromiter(keys, dtype=np.int64, count=len(keys))
+        keys.sort()
+        return keys // n, keys % n
+
+def lsh_pairs(binary: sparse.csr_matrix, threshold: float, recall: float = DEFAULT_RECALL,
+              num_perm: int = MINHASH_PERMUTATIONS, k: int = None, seed: int = 42) -> pd.DataFrame:
+    """
+    Jaccard >= threshold pairs via MinHash/LSH candidates, re-scored exactly.
+
+    Same columns and order as top_pairs(); a pair can be missed with
+    probability about 1 - recall (lower recall, fewer candidates).
+    """
+    bands, rows = lsh_bands(threshold, num_perm, recall)
+    index = MinHashLSH(binary, num_perm, seed)
+    i, j = index.candidates(bands, rows)
+    scored = pairs_for(binary, i, j, 'jaccard')
+    scored = scored[scored['score'] >= threshold]
+    if k is not None:
+        scored = scored.nlargest(k, 'score', keep='first')
+    return scored.sort_values(['score', 'i', 'j'], ascending=[False, True, True]).reset_index(drop=True)
+
+def shingle_matrix(groups: pd.Series, texts: pd.Series, labels: List[str],
+                   words: int = SHINGLE_WORDS) -> sparse.csr_matrix:
+    """
+    Rows = labels (e.g. surveys), columns = word shingles of the texts in each
+    group (crc32 of `words` consecutive normalized words).
+    """
+    row_of = {label: r for r, label in enumerate(labels)}
+    rows, tokens = [], []
+    for group, text in zip(groups, texts):
+        if group not in row_of or not isinstance(text, str):
+            continue
+        terms = ''.join(c if c.isalnum() else ' ' for c in text.lower()).split()
+        grams = {' '.join(terms[p:p + words]) for p in range(max(len(terms) - words + 1, 1))}
+        rows.extend([row_of[group]] * len(grams))
+        tokens.extend(zlib.crc32(g.encode('utf-8')) for g in grams)
+    columns, _ = pd.factorize(np.array(tokens, dtype=np.int64))
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                               shape=(len(labels), columns.max() + 1 if len(columns) else 0))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+def main():
+    from analytics_store import read_table
+
+    parser = argparse.ArgumentParser(description='Survey pairs with overlapping concepts or question text')
+    parser.add_argument('--threshold', type=float, default=0.5, help='Minimum Jaccard similarity')
+    parser.add_argument('--features', choices=['concepts', 'questions'], default='concepts')
+    parser.add_argument('--method', choices=['exact', 'lsh'], default='exact')
+    parser.add_argument('--recall', type=float, default=DEFAULT_RECALL, help='LSH recall at the threshold')
+    parser.add_argument('--top', type=int, default=20, help='Pairs to print')
+    args = parser.parse_args()
+
+    matrix_df = pd.read_csv(Path('../output/final/survey_concept_matrix.csv'), index_col=0)
+    surveys = matrix_df.index.tolist()
+    if args.features == 'concepts':
+        binary = binary_matrix(matrix_df)
+    else:
+        master = read_table('master', ['question', 'primary_survey'])
+        binary = shingle_matrix(master['primary_survey'], master['question'], surveys)
+
+    if args.method == 'lsh':
+        pairs = lsh_pairs(binary, args.threshold, args.recall)
+    else:
+        pairs = top_pairs(binary, args.threshold, 'jaccard')
+    print(f"  {len(pairs):,} pairs with Jaccard >= {args.threshold} ({args.features}, {args.method})")
+    for pair in pairs.head(args.top).itertuples(index=False):
+        print(f"    {pair.score:.3f}  {surveys[pair.i]} ↔ {surveys[pair.j]} ({pair.shared} shared)")
+
+if __name__ == '__main__':
+    main()
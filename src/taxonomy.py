@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Census taxonomy: one shared loader plus a lookup index for model answers.
+
+Every script used to read the taxonomy JSON itself, and nothing checked
+that a returned (topic, subtopic) actually existed, so near misses
+('Employment', 'commute / commuting', 'Food Stamps') reached comparison
+and arbitration as disagreements.
+
+load_taxonomy() returns a Taxonomy: still the {topic: [subtopics]} dict
+the prompts embed, plus indexes built once per process:
+
+- exact pairs        set of (topic, subtopic), O(1) is_valid()
+- normalized names   case/whitespace/punctuation-folded subtopics, their
+                     slash and parenthetical parts, and SUBTOPIC_SYNONYMS
+- edit distance      every one-character deletion of each normalized name
+                     (symmetric delete), so typos within MAX_EDIT_DISTANCE
+                     are found by hash lookups, not a scan
+
+snap() maps an answer onto a taxonomy concept within the answer's topic,
+or returns None when it is unresolvable (unknown, ambiguous, or only a
+match under another topic); only those need to go back to a model.
+
+Usage:
+    python taxonomy.py "Economic" "employment"     # Show how an answer snaps
+"""
+
+import json
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+# Configuration
+TAXONOMY_PATH = Path('../data/raw/census_survey_explorer_taxonomy.json')
+MAX_EDIT_DISTANCE = 1
+MIN_FUZZY_LENGTH = 5  # Shorter names must match exactly ('Tax' is not 'Sex')
+
+# Common model phrasings -> taxonomy subtopic (keys are normalized)
+SUBTOPIC_SYNONYMS = {
+    'gender': 'Sex',
+    'marriage': 'Marital Status',
+    'employment': 'Employment Status',
+    'wages': 'Earnings',
+    'salary': 'Earnings',
+    'educational attainment': 'Education',
+    'internet': 'Computer & Internet Use',
+    'computer use': 'Computer & Internet Use',
+    'veteran status': 'Veterans',
+    'rent': 'Rental',
+    'mortgage': 'Costs (Mortgage, Taxes, Insurance)',
+    'taxes': 'Tax',
+}
+
+TOPIC_SYNONYMS = {
+    'demographics': 'Demographic',
+    'economy': 'Economic',
+    'economics': 'Economic',
+    'government finance': 'Government',
+    'governments': 'Government',
+}
+
+class Snap(NamedTuple):
+    topic: str
+    subtopic: str
+    method: str  # exact | normalized | edit_distance
+
+def normalize(text) -> str:
+    """Case-, whitespace- and punctuation-insensitive key ('Computer & Internet Use' -> 'computer and internet use')."""
+    if not isinstance(text, str):
+        return ''
+    text = text.casefold().replace('&', ' and ')
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text).split())
+
+def name_variants(subtopic: str) -> Set[str]:
+    """Normalized keys a subtopic answers to: the name, its slash parts, and its parenthetical ('SNAP')."""
+    variants = {normalize(subtopic)}
+    outside = re.sub(r'\(.*?\)', ' ', subtopic)
+    variants.add(normalize(outside))
+    for inside in re.findall(r'\((.*?)\)', subtopic):
+        if ',' not in inside:
+            variants.add(normalize(inside))
+    if ',' not in outside:
+        variants.update(normalize(part) for part in outside.split('/'))
+    variants.discard('')
+    return variants
+
+def deletes(key: str) -> Set[str]:
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+def edit_distance(a: str, b: str) -> int:
+    """Edit distance counting an adjacent transposition as one edit (optimal string alignment)."""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+class Taxonomy(dict):
+    """{topic: [subtopics]} with O(1) validation and snapping of near-miss answers."""
+
+    def __init__(self, tree: Dict[str, List[str]]):
+        super().__init__(tree)
+        self.pairs = frozenset((topic, subtopic) for topic, subtopics in tree.items() for subtopic in subtopics)
+        self.concepts = list(dict.fromkeys(
+            f"{topic}.{subtopic}" for topic, subtopics in tree.items() for subtopic in subtopics
+        ))
+
+        self._topics = {normalize(topic): topic for topic in tree}
+        self._topics.update({k: v for k, v in TOPIC_SYNONYMS.items() if v in tree})
+
+        # normalized name -> concepts it can mean
+        self._names: Dict[str, Set[Tuple[str, str]]] = {}
+        for topic, subtopic in self.pairs:
+            for key in name_variants(subtopic):
+                self._names.setdefault(key, set()).add((topic, subtopic))
+        for key, subtopic in SUBTOPIC_SYNONYMS.items():
+            for pair in self.pairs:
+                if pair[1] == subtopic:
+                    self._names.setdefault(key, set()).add(pair)
+
+        # one-character deletion -> names it came from
+        self._deletes: Dict[str, Set[str]] = {}
+        for key in self._names:
+            if len(key) >= MIN_FUZZY_LENGTH:
+                for variant in deletes(key) | {key}:
+                    self._deletes.setdefault(variant, set()).add(key)
+
+    def is_valid(self, topic, subtopic) -> bool:
+        return (topic, subtopic) in self.pairs
+
+    def snap_topic(self, topic) -> Optional[str]:
+        """Taxonomy topic for a model's topic answer (normalized or synonym), or None."""
+        return topic if topic in self else self._topics.get(normalize(topic))
+
+    def _fuzzy(self, key: str) -> Set[Tuple[str, str]]:
+        """Concepts whose name is within MAX_EDIT_DISTANCE of key (closest distance only)."""
+        if len(key) < MIN_FUZZY_LENGTH:
+            return set()
+        names = set()
+        for variant in deletes(key) | {key}:
+            names |= self._deletes.get(variant, set())
+        scored = [(edit_distance(key, name), name) for name in names]
+        scored = [(d, name) for d, name in scored if d <= MAX_EDIT_DISTANCE]
+        if not scored:
+            return set()
+        best = min(d for d, _ in scored)
+        return set().union(*(self._names[name] for d, name in scored if d == best))
+
+    def snap(self, topic, subtopic) -> Optional[Snap]:
+        """
+        Taxonomy concept for a model's (topic, subtopic), or None if unresolvable.
+
+        A valid (or synonym) topic is kept: the subtopic only snaps to a
+        concept under that topic, and a name that fits only another topic's
+        concept is unresolved, so it goes back to the model rather than
+        silently changing the topic. Without a recognizable topic, a name
+        that fits exactly one concept snaps to it.
+        """
+        if (topic, subtopic) in self.pairs:
+            return Snap(topic, subtopic, 'exact')
+
+        key = normalize(subtopic)
+        candidates, method = self._names.get(key, set()), 'normalized'
+        if not candidates:
+            candidates, method = self._fuzzy(key), 'edit_distance'
+        if not candidates:
+            return None
+
+        given_topic = self.snap_topic(topic)
+        if given_topic is not None:
+            candidates = {pair for pair in candidates if pair[0] == given_topic}
+        if len(candidates) == 1:
+            return Snap(*next(iter(candidates)), method)
+        return None
+
+@lru_cache(maxsize=None)
+def load_taxonomy(path: Path = TAXONOMY_PATH) -> Taxonomy:
+    """Census taxonomy (loaded and indexed once per process)."""
+    with open(path, 'r') as f:
+        return Taxonomy(json.load(f)['taxonomy'])
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        return
+    taxonomy = load_taxonomy()
+    snapped = taxonomy.snap(sys.argv[1], sys.argv[2])
+    if snapped is None:
+        print("  ✗ unresolvable")
+    else:
+        print(f"  ✓ {snapped.topic}.{snapped.subtopic} ({snapped.method})")
+
+if __name__ == '__main__':
+    main()
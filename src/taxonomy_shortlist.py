@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Embedding shortlist of taxonomy concepts per question, so categorization
+prompts carry a few candidate subtopics instead of the whole taxonomy.
+
+docs/lessons_learned_embedding_failure.md showed RoBERTa top-1 matching
+against bare labels fails: every question sits at ~0.99 cosine to every
+label. A shortlist only has to contain the right concept, not rank it
+first, and it is checked against labelled questions before it is used:
+
+- concept text is augmented: "Topic - Subtopic", the name variants and
+  synonyms taxonomy.py snaps on, and a description from
+  DESCRIPTIONS_PATH when one is written
+- concepts and questions are embedded on notebook 02's path (RoBERTa
+  mean pooling; stored question embeddings are reused), centred on the
+  question mean (removing the shared direction behind the 0.99s) and
+  normalized
+- with categorized questions available (master table), each concept
+  vector also gets the centroid of its questions (EXEMPLAR_WEIGHT) from
+  the fitting half of them; the deployed vectors are exactly the
+  calibrated ones
+- a question's shortlist is every concept scoring within `margin` of its
+  best one, and at least MIN_SHORTLIST. The margin is calibrated on
+  held-out labelled questions, as the RECALL_TARGET quantile of (best
+  score - true concept's score), and recall is measured on a further
+  held-out split
+- a question whose shortlist would exceed MAX_SHORTLIST, or any question
+  when there is no calibration, gets the full taxonomy
+
+Calibration: ../output/shortlist/calibration.json (and shortlist.npz)
+
+Usage:
+    python taxonomy_shortlist.py                         # Calibrate and report recall
+    python taxonomy_shortlist.py --question "What was your total income last year?"
+"""
+
+import argparse
+import json
+import pickle
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import analytics_store
+from taxonomy import SUBTOPIC_SYNONYMS, Taxonomy, load_taxonomy, name_variants
+
+# Configuration
+MODEL_PATH = Path('../models/roberta-large')
+MODEL_NAME = 'roberta-large'
+EMBEDDINGS_PATH = Path('../data/processed/embeddings/embeddings_with_metadata.pkl')
+DESCRIPTIONS_PATH = Path('../config/concept_descriptions.json')  # Optional {"Topic.Subtopic": "description"}
+SHORTLIST_FILE = Path('../output/shortlist/shortlist.npz')
+CALIBRATION_FILE = Path('../output/shortlist/calibration.json')
+
+RECALL_TARGET = 0.95      # Share of questions whose true concept must be in their shortlist
+MIN_SHORTLIST = 5         # Candidates always offered, however confident the margin
+MAX_SHORTLIST = 25        # Larger candidate sets fall back to the full taxonomy
+MIN_CALIBRATION = 200     # Labelled questions needed before a shortlist is trusted
+EXEMPLAR_WEIGHT = 1.0     # Weight of categorized questions' centroid in a concept vector
+EMBED_BATCH = 16
+SEED = 42
+
+def concept_texts(taxonomy: Taxonomy, descriptions: Dict[str, str] = None) -> List[str]:
+    """Description-augmented text per taxonomy concept (taxonomy.concepts order)."""
+    descriptions = descriptions or {}
+    texts = []
+    for concept in taxonomy.concepts:
+        topic, subtopic = concept.split('.', 1)
+        aliases = sorted(name_variants(subtopic) | {k for k, v in SUBTOPIC_SYNONYMS.items() if v == subtopic})
+        text = f"{topic} - {subtopic}. Survey questions about {', '.join(aliases)}."
+        if descriptions.get(concept):
+            text += ' ' + descriptions[concept]
+        texts.append(text)
+    return texts
+
+def load_descriptions() -> Dict[str, str]:
+    if not DESCRIPTIONS_PATH.exists():
+        return {}
+    with open(DESCRIPTIONS_PATH, 'r') as f:
+        return json.load(f)
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """RoBERTa-large mean-pooled embeddings (as notebook 02), from the local model when cached."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    source = str(MODEL_PATH) if MODEL_PATH.exists() else MODEL_NAME
+    tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=MODEL_PATH.exists())
+    model = AutoModel.from_pretrained(source, local_files_only=MODEL_PATH.exists())
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model.to(device).eval()
+
+    vectors = []
+    with torch.no_grad():
+        for start in range(0, len(texts), EMBED_BATCH):
+            inputs = tokenizer(texts[start:start + EMBED_BATCH], padding=True, truncation=True,
+                               max_length=512, return_tensors='pt').to(device)
+            hidden = model(**inputs).last_hidden_state
+            mask = inputs['attention_mask'].unsqueeze(-1).float()
+            vectors.append(((hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)).cpu().numpy())
+    return np.concatenate(vectors) if vectors else np.zeros((0, 1024), dtype=np.float32)
+
+def load_question_embeddings() -> Dict[str, np.ndarray]:
+    """Stored notebook 02 embeddings keyed by stripped question text."""
+    if not EMBEDDINGS_PATH.exists():
+        return {}
+    with open(EMBEDDINGS_PATH, 'rb') as f:
+        data = pickle.load(f)
+    return {str(t).strip(): v for t, v in zip(data['question_texts'], np.asarray(data['embeddings'], dtype=np.float32))}
+
+def question_vectors(texts: List[str], stored: Dict[str, np.ndarray] = None) -> np.ndarray:
+    """Embeddings of texts: stored ones reused, the rest embedded now."""
+    stored = load_question_embeddings() if stored is None else stored
+    keys = [str(t).strip() for t in texts]
+    missing = list(dict.fromkeys(k for k in keys if k not in stored))
+    if missing:
+        stored = dict(stored, **dict(zip(missing, embed_texts(missing))))
+    return np.stack([stored[k] for k in keys]).astype(np.float32) if keys else np.zeros((0, 0), np.float32)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+class Calibration(NamedTuple):
+    margin: float            # Shortlist = concepts scoring >= best - margin
+    recall: float            # Held-out share of true concepts in the shortlist (fallbacks count as covered)
+    shortlist_recall: float  # Held-out recall among shortlisted (non-fallback) questions
+    fallback_rate: float     # Held-out share of questions sent the full taxonomy
+    mean_size: float         # Held-out mean shortlist size (non-fallback)
+    calibrated_on: int
+    evaluated_on: int
+    fitted_on: int = 0       # Labelled questions whose centroids are in the concept vectors
+
+class ConceptShortlist:
+    """Centred, normalized concept vectors plus the calibrated margin (None = always fall back)."""
+
+    def __init__(self, concepts: List[str], vectors: np.ndarray, mean: np.ndarray,
+                 calibration: Calibration = None):
+        self.concepts = concepts
+        self.vectors = vectors
+        self.mean = mean
+        self.calibration = calibration
+
+    def scores(self, embeddings: np.ndarray) -> np.ndarray:
+        """Questions × concepts cosine, after centring."""
+        return _normalize(np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.vectors.T
+
+    def shortlist(self, embeddings: np.ndarray, margin: float = None) -> List[Optional[List[str]]]:
+        """Candidate concepts per question, best first, or None for the full taxonomy."""
+        margin = margin if margin is not None else (self.calibration.margin if self.calibration else None)
+        if margin is None:
+            return [None] * len(embeddings)
+        scores = self.scores(embeddings)
+        keep = scores >= scores.max(axis=1, keepdims=True) - margin
+        least = min(MIN_SHORTLIST, scores.shape[1])
+        if least > 0:
+            keep |= scores >= -np.partition(-scores, least - 1, axis=1)[:, [least - 1]]
+        shortlists = []
+        for row, mask in zip(scores, keep):
+            if mask.sum() > MAX_SHORTLIST:
+                shortlists.append(None)
+            else:
+                picked = np.flatnonzero(mask)
+                shortlists.append([self.concepts[c] for c in picked[np.argsort(-row[picked], kind='stable')]])
+        return shortlists
+
+    def save(self, path: Path = SHORTLIST_FILE):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp.npz')
+        np.savez(tmp, concepts=np.array(self.concepts, dtype=str), vectors=self.vectors, mean=self.mean)
+        tmp.replace(path)
+        with open(CALIBRATION_FILE, 'w') as f:
+            json.dump(self.calibration._asdict() if self.calibration else None, f, indent=2)
+
+    @classmethod
+    def load(cls, path: Path = SHORTLIST_FILE) -> 'ConceptShortlist':
+        with np.load(path, allow_pickle=False) as f:
+            concepts, vectors, mean = f['concepts'].tolist(), f['vectors'], f['mean']
+        calibration = None
+        if CALIBRATION_FILE.exists():
+            with open(CALIBRATION_FILE, 'r') as f:
+                stored = json.load(f)
+            calibration = Calibration(**stored) if stored else None
+        return cls(concepts, vectors, mean, calibration)
+
+def _concept_vectors(text_vectors: np.ndarray, mean: np.ndarray, exemplars: np.ndarray = None,
+                     labels: np.ndarray = None) -> np.ndarray:
+    """Centred concept text vectors, each plus EXEMPLAR_WEIGHT × the centroid of its labelled questions."""
+    vectors = _normalize(text_vectors - mean)
+    if exemplars is None or len(exemplars) == 0:
+        return vectors
+    centred = _normalize(exemplars - mean)
+    sums = np.zeros_like(vectors)
+    np.add.at(sums, labels, centred)
+    return _normalize(vectors + EXEMPLAR_WEIGHT * _normalize(sums))
+
+def _gaps(model: ConceptShortlist, embeddings: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """Best score minus the true concept's score, per question (0 when the true concept is best)."""
+    scores = model.scores(embeddings)
+    return scores.max(axis=1) - scores[np.arange(len(labels)), labels]
+
+def calibrate(text_vectors: np.ndarray, concepts: List[str], embeddings: np.ndarray, labels: np.ndarray,
+              mean: np.ndarray, target: float = RECALL_TARGET, seed: int = SEED) -> ConceptShortlist:
+    """
+    Shortlist model with a margin reaching `target` recall, measured without
+    reusing data: concept exemplars from one half of the labelled questions,
+    the margin from a quarter (split-conformal quantile), recall on the last
+    quarter. The returned model is the one calibrated, so the margin and
+    the reported recall hold for what is deployed.
+    """
+    order = np.random.default_rng(seed).permutation(len(labels))
+    fit, tune, test = np.array_split(order, [len(order) // 2, 3 * len(order) // 4])
+    model = ConceptShortlist(concepts, _concept_vectors(text_vectors, mean, embeddings[fit], labels[fit]), mean)
+
+    gaps = np.sort(_gaps(model, embeddings[tune], labels[tune]))
+    rank = min(int(np.ceil((len(gaps) + 1) * target)), len(gaps)) - 1
+    margin = float(gaps[rank]) + 1e-6
+
+    shortlists = model.shortlist(embeddings[test], margin)
+    covered = [s is None or concepts[l] in s for s, l in zip(shortlists, labels[test])]
+    listed = [(s, l) for s, l in zip(shortlists, labels[test]) if s is not None]
+    model.calibration = Calibration(
+        margin=margin,
+        recall=float(np.mean(covered)),
+        shortlist_recall=float(np.mean([concepts[l] in s for s, l in listed])) if listed else 0.0,
+        fallback_rate=float(np.mean([s is None for s in shortlists])),
+        mean_size=float(np.mean([len(s) for s, _ in listed])) if listed else 0.0,
+        calibrated_on=len(tune),
+        evaluated_on=len(test),
+        fitted_on=len(fit),
+    )
+    return model
+
+def labelled_questions(taxonomy: Taxonomy) -> Tuple[List[str], np.ndarray]:
+    """(question texts, concept index) of categorized questions in the master table."""
+    if not (analytics_store.has_table('master') or analytics_store.EXPORTS['master'].exists()):
+        return [], np.zeros(0, dtype=np.int64)
+    master = analytics_store.read_table('master', ['question', 'final_topic', 'final_subtopic'])
+    master = master.dropna()
+    position = {concept: i for i, concept in enumerate(taxonomy.concepts)}
+    concepts = (master['final_topic'].astype(str) + '.' + master['final_subtopic'].astype(str)).map(position)
+    known = concepts.notna()
+    return master.loc[known, 'question'].astype(str).tolist(), concepts[known].to_numpy(dtype=np.int64)
+
+def build_shortlist(taxonomy: Taxonomy = None) -> ConceptShortlist:
+    """Embed concepts, calibrate on categorized questions (when there are enough) and save."""
+    taxonomy = taxonomy or load_taxonomy()
+    stored = load_question_embeddings()
+    text_vectors = embed_texts(concept_texts(taxonomy, load_descriptions()))
+    texts, labels = labelled_questions(taxonomy)
+    embeddings = question_vectors(texts, stored) if texts else np.zeros((0, text_vectors.shape[1]), np.float32)
+
+    corpus = np.stack(list(stored.values())) if stored else embeddings
+    mean = corpus.mean(axis=0) if len(corpus) else np.zeros(text_vectors.shape[1], dtype=np.float32)
+
+    if len(labels) >= MIN_CALIBRATION:
+        model = calibrate(text_vectors, taxonomy.concepts, embeddings, labels, mean)
+    else:
+        model = ConceptShortlist(taxonomy.concepts, _concept_vectors(text_vectors, mean), mean)
+    model.save()
+    return model
+
+def load_shortlist() -> ConceptShortlist:
+    """Saved shortlist model (built on first use)."""
+    if SHORTLIST_FILE.exists():
+        return ConceptShortlist.load()
+    return build_shortlist()
+
+def shortlist_taxonomy(concepts: List[str], taxonomy: Taxonomy) -> Dict[str, List[str]]:
+    """{topic: [subtopics]} restricted to concepts, in taxonomy order (what a shortlist prompt embeds)."""
+    wanted = set(concepts)
+    restricted = {topic: [s for s in subtopics if f"{topic}.{s}" in wanted] for topic, subtopics in taxonomy.items()}
+    return {topic: subtopics for topic, subtopics in restricted.items() if subtopics}
+
+def shortlist_batches(questions: List[dict], taxonomy: Taxonomy, batch_size: int,
+                      model: ConceptShortlist = None) -> List[Tuple[List[dict], Optional[Dict[str, List[str]]]]]:
+    """
+    Batches of questions with the taxonomy their prompt should carry: the
+    union of the batch's shortlists, or None (full taxonomy) for batches of
+    questions that fell back. Shortlisted questions are grouped by their
+    best concept, so a batch's union stays close to one shortlist; fallback
+    questions are batched separately in their original order.
+    """
+    model = model or load_shortlist()
+    shortlists = model.shortlist(question_vectors([q['question'] for q in questions]))
+    listed = sorted(((q, s) for q, s in zip(questions, shortlists) if s is not None),
+                    key=lambda pair: pair[1][0])
+    fallback = [q for q, s in zip(questions, shortlists) if s is None]
+
+    batches = []
+    for start in range(0, len(listed), batch_size):
+        chunk = listed[start:start + batch_size]
+        concepts = [c for _, s in chunk for c in s]
+        batches.append(([q for q, _ in chunk], shortlist_taxonomy(concepts, taxonomy)))
+    for start in range(0, len(fallback), batch_size):
+        batches.append((fallback[start:start + batch_size], None))
+    return batches
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate or query the taxonomy shortlist')
+    parser.add_argument('--question', help='Show the shortlist for one question')
+    args = parser.parse_args()
+
+    print("="*70)
+    print("TAXONOMY SHORTLIST")
+    print("="*70)
+
+    if args.question:
+        model = load_shortlist()
+        shortlist = model.shortlist(question_vectors([args.question]))[0]
+        if shortlist is None:
+            print("  Uncertain: full taxonomy")
+        else:
+            print(f"  {len(shortlist)} candidates: " + ', '.join(shortlist))
+        return
+
+    model = build_shortlist()
+    calibration = model.calibration
+    if calibration is None:
+        print(f"  Fewer than {MIN_CALIBRATION} categorized questions: no calibration, prompts keep the full taxonomy")
+        return
+    print(f"  Margin: {calibration.margin:.4f} (target recall {RECALL_TARGET:.0%}, "
+          f"exemplars from {calibration.fitted_on:,} questions, calibrated on {calibration.calibrated_on:,})")
+    print(f"  Held-out ({calibration.evaluated_on:,} questions):")
+    print(f"    Recall (fallbacks covered): {calibration.recall:.1%}")
+    print(f"    Recall within shortlists:   {calibration.shortlist_recall:.1%}")
+    print(f"    Full-taxonomy fallbacks:    {calibration.fallback_rate:.1%}")
+    print(f"    Mean shortlist size:        {calibration.mean_size:.1f} of {len(model.concepts)} concepts")
+    print(f"\n  ✓ {SHORTLIST_FILE}")
+    print(f"  ✓ {CALIBRATION_FILE}")
+
+if __name__ == '__main__':
+    main()
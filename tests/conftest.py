@@ -0,0 +1,6 @@
+"""Tests import the pipeline scripts the way they import each other (flat, from src/)."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
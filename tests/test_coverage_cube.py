@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+from scipy import sparse
+
+from coverage_cube import (apply_delta, build_cube, changed_facts, orphaned_concepts, question_facts,
+                           undersampled_concepts)
+from survey_incidence import SurveyIncidence
+
+def incidence(rows, surveys=('A', 'B', 'C')):
+    """Incidence from {question id: [survey, ...]} over questions 0..max id."""
+    n = max(rows) + 1
+    pairs = [(q, surveys.index(s)) for q, names in rows.items() for s in names]
+    matrix = sparse.csr_matrix((np.ones(len(pairs)), tuple(zip(*pairs))), shape=(n, len(surveys)))
+    return SurveyIncidence(matrix, surveys)
+
+def master(rows):
+    """Master frame from {id: (primary_survey, topic, subtopic)}."""
+    return pd.DataFrame([
+        {'id': q, 'primary_survey': s, 'final_topic': t, 'final_subtopic': st, 'decision_method': 'agreement'}
+        for q, (s, t, st) in rows.items()
+    ])
+
+def cell(cube, survey, topic, subtopic, measure='memberships'):
+    match = cube[(cube['survey'] == survey) & (cube['topic'] == topic) & (cube['subtopic'] == subtopic)]
+    return int(match[measure].sum())
+
+def delta_cube(old_master, old_incidence, new_master, new_incidence):
+    old_facts = question_facts(old_master, old_incidence)
+    new_facts = question_facts(new_master, new_incidence)
+    removed, added = changed_facts(old_facts, new_facts)
+    return apply_delta(build_cube(old_facts), removed, added), build_cube(new_facts)
+
+def test_membership_change_matches_rebuild():
+    frame = master({0: ('A', 'T', 'S'), 1: ('B', 'T', 'S'), 2: ('C', 'T', 'U')})
+    before = incidence({0: ['A'], 1: ['B'], 2: ['C', 'A']})
+    after = incidence({0: ['B'], 1: ['B'], 2: ['C']})
+    frame_after = frame.assign(primary_survey=['B', 'B', 'C'])
+
+    delta, rebuilt = delta_cube(frame, before, frame_after, after)
+
+    pdt.assert_frame_equal(delta, rebuilt)
+    assert cell(delta, 'A', 'T', 'S') == 0
+    assert cell(delta, 'B', 'T', 'S') == 2
+    assert cell(delta, 'A', 'T', 'U') == 0
+
+def test_shrinking_survey_map_matches_rebuild():
+    frame = master({0: ('A', 'T', 'S'), 1: ('A', 'T', 'S'), 2: ('B', 'T', 'U')})
+    before = incidence({0: ['A'], 1: ['A', 'B'], 2: ['B']})
+    after = incidence({0: ['A'], 1: ['A']})
+
+    delta, rebuilt = delta_cube(frame, before, frame.iloc[:2], after)
+
+    pdt.assert_frame_equal(delta, rebuilt)
+    assert cell(delta, 'B', 'T', 'U') == 0
+
+def test_relabel_matches_rebuild():
+    surveys = incidence({0: ['A', 'B'], 1: ['B'], 2: ['A', 'C'], 3: ['C']})
+    frame = master({0: ('A', 'T', 'S'), 1: ('B', 'T', 'S'), 2: ('A', 'T', 'U'), 3: ('C', 'V', 'W')})
+    relabelled = frame.assign(final_subtopic=['U', 'S', 'U', 'W'])
+
+    delta, rebuilt = delta_cube(frame, surveys, relabelled, surveys)
+
+    pdt.assert_frame_equal(delta, rebuilt)
+
+def test_long_tail_rollups():
+    frame = master({0: ('A', 'T', 'S'), 1: ('A', 'T', 'S'), 2: ('B', 'T', 'U'), 3: ('B', 'Unknown', 'Unknown')})
+    cube = build_cube(question_facts(frame, incidence({0: ['A'], 1: ['A'], 2: ['B'], 3: ['B']})))
+
+    orphaned = orphaned_concepts(cube, ['T.S', 'T.U', 'V.X', 'T.Z'])
+    assert list(orphaned.columns) == ['concept', 'topic', 'subtopic', 'question_count']
+    assert orphaned['concept'].tolist() == ['T.Z', 'V.X']
+    assert orphaned['question_count'].tolist() == [0, 0]
+
+    undersampled = undersampled_concepts(cube, max_questions=1)
+    assert list(undersampled.columns) == ['concept', 'question_count', 'topic', 'subtopic']
+    assert undersampled.values.tolist() == [['T.U', 1, 'T', 'U']]
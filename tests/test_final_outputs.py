@@ -0,0 +1,39 @@
+import importlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import coverage_cube
+from survey_incidence import SurveyIncidence
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+def initial(rows):
+    """Initial results from {id: (openai (topic, subtopic), claude (topic, subtopic))}."""
+    return pd.DataFrame([
+        {'id': q, 'primary_topic_openai': o[0], 'primary_subtopic_openai': o[1],
+         'primary_topic_claude': c[0], 'primary_subtopic_claude': c[1]}
+        for q, (o, c) in rows.items()
+    ])
+
+def test_matrix_from_reconciled_output(monkeypatch):
+    monkeypatch.chdir(SRC)  # Pipeline scripts resolve ../data and ../output from src/
+    cfo = importlib.import_module('create_final_outputs')
+    age, income = ('Demographic', 'Age'), ('Economic', 'Income')
+    master_df = cfo.reconcile_categorizations(initial({0: (age, age), 1: (age, age), 2: (income, income),
+                                                       3: (age, income)}))
+    questions = pd.DataFrame({'id': [0, 1, 2, 3], 'primary_survey': ['A', 'B', 'A', 'C']})
+    monkeypatch.setattr(coverage_cube, 'load_incidence',
+                        lambda: SurveyIncidence(sparse.csr_matrix(np.array([[1, 1, 0], [0, 1, 0], [1, 0, 1],
+                                                                            [0, 0, 1]])), ['A', 'B', 'C']))
+
+    assert 'primary_survey' not in master_df.columns
+    matrix = cfo.create_survey_concept_matrix(master_df, questions)
+
+    assert matrix.loc['A', 'Demographic.Age'] == 1
+    assert matrix.loc['B', 'Demographic.Age'] == 2
+    assert matrix.loc['C', 'Economic.Income'] == 1
+    assert matrix.loc['A', 'Economic.Income'] == 1
+    assert matrix.to_numpy().sum() == 5  # Unresolved question 3 is left out
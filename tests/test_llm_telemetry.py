@@ -0,0 +1,35 @@
+import pandas as pd
+
+from llm_telemetry import COLUMNS, export_prometheus, summarize_calls
+
+def attempt(run_id, provider, prompt_hash, outcome='ok', cost=1.0):
+    row = dict.fromkeys(COLUMNS, 0)
+    row.update(run_id=run_id, stage='5_arbitrate', model_role='arbitrator', provider=provider,
+               model='claude-sonnet-4-5', prompt_hash=prompt_hash, outcome=outcome, cost_usd=cost,
+               latency_s=1.0, ts=0.0, error=None)
+    return row
+
+CALLS = pd.DataFrame([
+    attempt('run-1', 'anthropic', 1, outcome='rate_limited'),
+    attempt('run-1', 'anthropic', 1),
+    attempt('run-1', 'anthropic', 2),
+    attempt('run-1', 'mock', 3, cost=0.0),
+    attempt('bench', 'mock', 4, cost=0.0),
+    attempt('run-0', 'anthropic', 5, cost=5.0),
+])
+
+def test_summary_scoped_to_run():
+    summary = summarize_calls(CALLS, by=['model_role'], run_id='run-1').iloc[0]
+    assert (summary['calls'], summary['attempts'], summary['retries']) == (3, 4, 1)
+    assert summary['cost_usd'] == 3.0
+
+def test_summary_scoped_to_provider():
+    summary = summarize_calls(CALLS, by=['model_role'], run_id='run-1', provider='anthropic').iloc[0]
+    assert (summary['calls'], summary['attempts']) == (2, 3)
+    assert summarize_calls(CALLS, provider=['openai']).empty
+
+def test_prometheus_export_scoped_to_run(tmp_path):
+    path = export_prometheus(CALLS, tmp_path / 'llm.prom', run_id='bench')
+    text = path.read_text()
+    assert 'provider="mock"' in text
+    assert 'provider="anthropic"' not in text
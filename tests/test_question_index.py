@@ -0,0 +1,20 @@
+import numpy as np
+
+from question_index import sample_recall, update_index
+
+def test_incremental_update_recall_matches_rebuild(tmp_path):
+    rng = np.random.default_rng(0)
+    ids = np.arange(700)
+    embeddings = rng.normal(size=(700, 16)) + rng.normal(size=(8, 16))[rng.integers(0, 8, 700)] * 2
+    update_index(ids[:500], embeddings[:500], k=5, n_probe=1000, path=tmp_path / 'index.npz')
+
+    # Grow by 180, drop 20 and re-embed 10; n_probe covers every list so searches are exact
+    current = np.setdiff1d(ids[:680], ids[100:120])
+    changed = embeddings.copy()
+    changed[200:210] = rng.normal(size=(10, 16))
+    incremental = update_index(current, changed[current], k=5, n_probe=1000, path=tmp_path / 'index.npz')
+    rebuilt = update_index(current, changed[current], k=5, n_probe=1000, rebuild=True,
+                           path=tmp_path / 'rebuilt.npz')
+
+    assert len(incremental[0]) == len(rebuilt[0]) == len(current)
+    assert sample_recall(*incremental, sample=len(current)) == sample_recall(*rebuilt, sample=len(current)) == 1.0
@@ -0,0 +1,51 @@
+from concurrent.futures import Future
+
+import pandas as pd
+
+from retrying_executor import RetryingExecutor
+from sequential_qc import MIN_PER_STRATUM, EarlySampler, allocate_round, run_sequential_qc
+
+def done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def population(sizes):
+    """Questions numbered 0.. with the stratum of each, strata sized as in `sizes`."""
+    strata = [name for name, size in sizes.items() for _ in range(size)]
+    return pd.DataFrame({'id': range(len(strata))}), pd.Series(strata)
+
+def agree(row):
+    return {'id': row['id'], 'agrees_with_arbitrator': True}
+
+def test_prevalidated_rows_count_against_their_stratum():
+    questions, strata = population({'A': 50, 'B': 50, 'C': 50, 'D': 50})
+    early = {qid: done(agree({'id': qid})) for qid in range(10)}  # All in stratum A
+
+    with RetryingExecutor(max_in_flight=2, verbose=False) as executor:
+        results, summary = run_sequential_qc(questions, strata, agree, executor, prevalidated=early,
+                                             target_width=1.0)
+
+    first = results[results['qc_round'] == 1]
+    per_stratum = first['qc_stratum'].value_counts()
+    assert per_stratum['A'] == 10  # Early picks filled A; nothing more drawn there
+    for stratum in ['B', 'C', 'D']:
+        assert per_stratum[stratum] >= MIN_PER_STRATUM
+    assert set(early) <= set(first['id'])
+    assert summary['strata'].set_index('qc_stratum').loc['A', 'n'] == 10
+
+def test_proportional_allocation_is_net_of_validated():
+    stats = pd.DataFrame({'N': [100, 100], 'n': [10, 0], 'agree': [10, 0]}, index=['A', 'B'])
+    allocation = allocate_round(stats, 10, proportional=True)
+    assert allocation == {'B': 10}
+
+def test_early_sampler_is_proportional_per_stratum():
+    sampler = EarlySampler(rate=0.05, random_state=0)
+    arrivals = ['A'] * 300 + ['B'] * 100 + ['C'] * 10
+    picks = {}
+    for stratum in arrivals:
+        if sampler.pick(stratum):
+            picks[stratum] = picks.get(stratum, 0) + 1
+    assert picks['A'] in (15, 16)
+    assert picks['B'] in (5, 6)
+    assert picks.get('C', 0) in (0, 1)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+import survey_incidence
+from coverage_cube import build_cube, question_facts, survey_concept_matrix
+from survey_incidence import build_incidence, load_incidence
+
+# Wide survey map: a question counts in every survey with a non-empty cell
+SURVEY_MAP = pd.DataFrame({
+    'Question': [f"Q{i}" for i in range(8)],
+    'ACS':  ['x', 'x', None, 'x', None, 'x', None, 'x'],
+    'CPS':  ['x', None, 'x', 'x', None, None, None, 'x'],
+    'SIPP': [None, 'x', 'x', 'x', None, 'x', 'x', None],
+    'AHS':  [None, None, None, None, None, None, 'x', 'x'],
+})
+CONCEPTS = pd.Series(['Economic.Income', 'Economic.Income', 'Demographic.Age', 'Economic.Income',
+                      'Demographic.Age', None, 'Housing.Rental', 'Demographic.Age'], dtype='category')
+
+def brute_force(survey_map, ids, concepts):
+    """Survey × concept counts by walking every question's surveys."""
+    counts = {}
+    for qid, concept in zip(ids, concepts):
+        if pd.isna(concept):
+            continue
+        row = survey_map.iloc[qid]
+        for survey in survey_map.columns.drop('Question'):
+            if pd.notna(row[survey]):
+                counts[(survey, concept)] = counts.get((survey, concept), 0) + 1
+    matrix = pd.Series(counts).unstack(fill_value=0)
+    matrix.index.name, matrix.columns.name = 'survey', 'concept'
+    return matrix.sort_index().sort_index(axis=1)
+
+def cube_matrix(incidence, ids, concepts):
+    """Survey × concept matrix the pipeline builds: memberships rollup of the coverage cube."""
+    parts = concepts.astype(object).str.split('.', n=1, expand=True)
+    master = pd.DataFrame({'id': ids.to_numpy(), 'primary_survey': 'ACS', 'final_topic': parts[0].to_numpy(),
+                           'final_subtopic': parts[1].to_numpy(), 'decision_method': 'agreement'})
+    return survey_concept_matrix(build_cube(question_facts(master, incidence)))
+
+def test_multi_survey_counts_match_brute_force(tmp_path, monkeypatch):
+    path = tmp_path / 'map.csv'
+    SURVEY_MAP.to_csv(path, index=False)
+    monkeypatch.setattr(survey_incidence, 'CHUNK_ROWS', 3)  # Rows span chunk boundaries
+
+    incidence = build_incidence(path)
+    ids = pd.Series(range(len(SURVEY_MAP)))
+    per_question = np.asarray(incidence.matrix.sum(axis=1)).ravel()
+    assert per_question.tolist() == [2, 2, 2, 3, 0, 2, 2, 3]
+
+    matrix = cube_matrix(incidence, ids, CONCEPTS)
+    pdt.assert_frame_equal(matrix, brute_force(SURVEY_MAP, ids, CONCEPTS), check_dtype=False)
+    assert matrix.loc['ACS', 'Economic.Income'] == 3
+    assert matrix.loc['SIPP', 'Economic.Income'] == 2
+
+def test_subset_and_order_of_ids(tmp_path):
+    path = tmp_path / 'map.csv'
+    SURVEY_MAP.to_csv(path, index=False)
+    incidence = load_incidence(path, tmp_path / 'incidence.npz')
+
+    ids = pd.Series([7, 3, 1, 6])
+    concepts = CONCEPTS.iloc[[7, 3, 1, 6]].reset_index(drop=True)
+    matrix = cube_matrix(incidence, ids, concepts)
+    pdt.assert_frame_equal(matrix, brute_force(SURVEY_MAP, ids, concepts), check_dtype=False)
+
+    cached = load_incidence.__wrapped__(path, tmp_path / 'incidence.npz')
+    assert (cached.matrix != incidence.matrix).nnz == 0
+    assert cached.surveys == incidence.surveys
@@ -0,0 +1,24 @@
+from taxonomy import Taxonomy
+
+TREE = {
+    'Demographic': ['Age'],
+    'Economic': ['Income', 'Employment Status', 'Food Stamps (SNAP)'],
+    'Government': ['Pension'],
+    'Social': ['Household', 'Income'],
+}
+
+def test_valid_topic_snaps_within_topic():
+    taxonomy = Taxonomy(TREE)
+    assert taxonomy.snap('Economic', 'employment') == ('Economic', 'Employment Status', 'normalized')
+    assert taxonomy.snap('economy', 'Incme') == ('Economic', 'Income', 'edit_distance')
+    assert taxonomy.snap('Economic', 'SNAP') == ('Economic', 'Food Stamps (SNAP)', 'normalized')
+
+def test_cross_topic_match_is_unresolved():
+    taxonomy = Taxonomy(TREE)
+    assert taxonomy.snap('Economic', 'Pension') is None
+    assert taxonomy.snap('Demographic', 'household') is None
+
+def test_unknown_topic_snaps_unique_name_only():
+    taxonomy = Taxonomy(TREE)
+    assert taxonomy.snap('Finance', 'pension') == ('Government', 'Pension', 'normalized')
+    assert taxonomy.snap('Finance', 'income') is None  # Economic.Income or Social.Income